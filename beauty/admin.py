@@ -1,39 +1,79 @@
 from django.contrib import admin
+from import_export import resources, fields, widgets
 from import_export.admin import ImportExportModelAdmin
+from import_export.resources import modelresource_factory
 
 from beauty.models.about import Faq, About, AboutImage
-from beauty.models.booking import Time, WorkingDays, Booking
+from beauty.models.booking import Time, WorkingDays, Booking, MasterDailyStats
 from beauty.models.favorite import Favorite, Saved, ShopSaved, ShopFavorite
+from beauty.models.outbox import EmailOutbox
 from beauty.models.region import Region, District, Mahalla
 from beauty.models.service import Category, Service, Shop, Blog
+from beauty.response_cache import batched_response_invalidation
+from beauty.serializers.fields import parse_hour_minute_duration, format_hour_minute_duration
+
+
+class HourMinuteDurationWidget(widgets.Widget):
+    def clean(self, value, row=None, **kwargs):
+        if not value:
+            return None
+        return parse_hour_minute_duration(value)
+
+    def render(self, value, obj=None):
+        if value is None:
+            return ""
+        return format_hour_minute_duration(value)
+
+
+class ReferenceDataResource(resources.ModelResource):
+    """
+    Imports retire the cached responses of the model once, not once per row (see reference_data_changed).
+    """
+
+    def import_data(self, *args, **kwargs):
+        with batched_response_invalidation():
+            return super().import_data(*args, **kwargs)
+
+
+class ReferenceDataAdmin(ImportExportModelAdmin):
+    def get_resource_classes(self):
+        return [modelresource_factory(self.model, resource_class=ReferenceDataResource)]
+
+
+class ServiceResource(resources.ModelResource):
+    duration = fields.Field(attribute='duration', column_name='duration', widget=HourMinuteDurationWidget())
+
+    class Meta:
+        model = Service
 
 
 @admin.register(Region)
-class RegionModelAdmin(ImportExportModelAdmin):
+class RegionModelAdmin(ReferenceDataAdmin):
     list_display = ("id", "name")
     filter = ("name",)
     ordering = ("id",)
 
 
 @admin.register(District)
-class DistrictModelAdmin(ImportExportModelAdmin):
+class DistrictModelAdmin(ReferenceDataAdmin):
     list_display = ("id", "name", "region")
     ordering = ("id",)
 
 
 @admin.register(Mahalla)
-class MahallaModelAdmin(ImportExportModelAdmin):
+class MahallaModelAdmin(ReferenceDataAdmin):
     list_display = ("id", "name", "district")
     ordering = ("id",)
 
 
 @admin.register(Category)
-class CategoryModelAdmin(ImportExportModelAdmin):
+class CategoryModelAdmin(ReferenceDataAdmin):
     list_display = ("id", "name", "image")
 
 
 @admin.register(Service)
 class CategoryModelAdmin(ImportExportModelAdmin):
+    resource_classes = [ServiceResource]
     list_display = ("id", "name", "price", "duration", "description", "category", "user")
 
 
@@ -65,20 +105,29 @@ class BookingModelAdmin(ImportExportModelAdmin):
     ordering = ("id",)
 
 
+@admin.register(MasterDailyStats)
+class MasterDailyStatsModelAdmin(ImportExportModelAdmin):
+    list_display = ("id", "master", "date", "status", "bookings", "revenue")
+    list_filter = ("status",)
+    list_select_related = ("master",)
+    date_hierarchy = "date"
+    ordering = ("-date", "master")
+
+
 @admin.register(Faq)
-class FaqModelAdmin(ImportExportModelAdmin):
+class FaqModelAdmin(ReferenceDataAdmin):
     list_display = ("id", "question", "answer")
     ordering = ("id",)
 
 
 @admin.register(About)
-class AboutModelAdmin(ImportExportModelAdmin):
+class AboutModelAdmin(ReferenceDataAdmin):
     list_display = ("id", "title", "description")
     ordering = ("id",)
 
 
 @admin.register(AboutImage)
-class AboutImageModelAdmin(ImportExportModelAdmin):
+class AboutImageModelAdmin(ReferenceDataAdmin):
     list_display = ("id", "image")
     ordering = ("id",)
 
@@ -105,3 +154,10 @@ class ShopFavoriteModelAdmin(ImportExportModelAdmin):
 class BlogModelAdmin(ImportExportModelAdmin):
     list_display = ("id", "title", "description", "image1", "image2", "image3", "image4", "created_at", "view")
     ordering = ("id",)
+
+
+@admin.register(EmailOutbox)
+class EmailOutboxModelAdmin(admin.ModelAdmin):
+    list_display = ("id", "subject", "to", "status", "attempts", "available_at", "created_at", "sent_at")
+    list_filter = ("status",)
+    ordering = ("-id",)
@@ -1,6 +1,12 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class BeautyConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'beauty'
+
+    def ready(self):
+        from beauty import signals  # noqa: F401
+        from beauty.search import install_postgresql_search
+        post_migrate.connect(install_postgresql_search, sender=self)
@@ -0,0 +1,362 @@
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.core.cache import cache
+from django.db import transaction
+
+from beauty.cache import get_versions, bump_version, ignore_cache_errors
+from beauty.holds import held_intervals, is_held, slot_starts
+from beauty.models.booking import Booking, Time
+from beauty.models.service import Service
+
+SLOT_MINUTES = 5
+SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES
+BITMAP_SIZE = SLOTS_PER_DAY // 8
+BITMAP_TIMEOUT = 60 * 60 * 24
+
+
+def working_day_index(date):
+    return date.weekday()
+
+
+def time_to_minutes(value):
+    return value.hour * 60 + value.minute
+
+
+def duration_to_minutes(value):
+    return int(value.total_seconds() // 60)
+
+
+def format_minutes(value):
+    return f'{value // 60:02d}:{value % 60:02d}'
+
+
+def merge_intervals(intervals):
+    merged = []
+    for start, end in sorted(intervals):
+        if start >= end:
+            continue
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def subtract_intervals(intervals, busy):
+    """
+    Remove every busy interval from the given intervals.
+    Both lists are half-open [start, end) intervals in minutes.
+    """
+    busy = merge_intervals(busy)
+    result = []
+    for start, end in merge_intervals(intervals):
+        for busy_start, busy_end in busy:
+            if busy_end <= start or busy_start >= end:
+                continue
+            if busy_start > start:
+                result.append((start, busy_start))
+            start = max(start, busy_end)
+            if start >= end:
+                break
+        if start < end:
+            result.append((start, end))
+    return result
+
+
+def intersect_intervals(first, second):
+    first, second = merge_intervals(first), merge_intervals(second)
+    result = []
+    i = j = 0
+    while i < len(first) and j < len(second):
+        start = max(first[i][0], second[j][0])
+        end = min(first[i][1], second[j][1])
+        if start < end:
+            result.append((start, end))
+        if first[i][1] < second[j][1]:
+            i += 1
+        else:
+            j += 1
+    return result
+
+
+def split_into_slots(intervals, duration):
+    """
+    Start times of consecutive ``duration`` long slots that fit into the intervals.
+    """
+    slots = []
+    if duration <= 0:
+        return slots
+    for start, end in intervals:
+        while start + duration <= end:
+            slots.append(start)
+            start += duration
+    return slots
+
+
+def intervals_to_bitmap(intervals):
+    """
+    Pack intervals into a day bitmap with one bit per SLOT_MINUTES; partially
+    covered slots are left unset.
+    """
+    bits = 0
+    for start, end in merge_intervals(intervals):
+        first = -(-max(start, 0) // SLOT_MINUTES)
+        last = min(end, 24 * 60) // SLOT_MINUTES
+        if first < last:
+            bits |= ((1 << (last - first)) - 1) << first
+    return bits.to_bytes(BITMAP_SIZE, 'little')
+
+
+def bitmap_to_intervals(bitmap):
+    bits = int.from_bytes(bitmap, 'little')
+    intervals = []
+    slot = 0
+    while bits:
+        skip = (bits & -bits).bit_length() - 1
+        bits >>= skip
+        slot += skip
+        run = (~bits & (bits + 1)).bit_length() - 1
+        intervals.append((slot * SLOT_MINUTES, (slot + run) * SLOT_MINUTES))
+        bits >>= run
+        slot += run
+    return intervals
+
+
+def and_bitmaps(bitmaps):
+    bits = (1 << SLOTS_PER_DAY) - 1
+    for bitmap in bitmaps:
+        bits &= int.from_bytes(bitmap, 'little')
+    return bits.to_bytes(BITMAP_SIZE, 'little')
+
+
+def _version_name(master_id):
+    return f'availability:{master_id}'
+
+
+def _bitmap_key(master_id, version, date):
+    return f'availability:{master_id}:{version}:{date.isoformat()}'
+
+
+_batch = threading.local()
+
+
+def invalidate_master(master_id):
+    """
+    Drop the cached bitmaps of every date of a master, e.g. after working hours change.
+
+    The drop is repeated once the surrounding transaction commits, so a bitmap
+    rebuilt from not yet committed data cannot outlive the change.
+    """
+    pending = getattr(_batch, 'master_ids', None)
+    if pending is not None:
+        pending.add(master_id)
+        return
+    bump_version(_version_name(master_id))
+    transaction.on_commit(lambda: bump_version(_version_name(master_id)))
+
+
+@contextmanager
+def batched_invalidation():
+    """
+    Collect the invalidate_master calls made inside the block and run each master's once at the end.
+    """
+    if getattr(_batch, 'master_ids', None) is not None:
+        yield
+        return
+    _batch.master_ids = set()
+    try:
+        yield
+    finally:
+        master_ids, _batch.master_ids = _batch.master_ids, None
+        for master_id in master_ids:
+            invalidate_master(master_id)
+
+
+def invalidate_master_days(master_ids, dates):
+    def drop():
+        versions = get_versions([_version_name(master_id) for master_id in master_ids])
+        with ignore_cache_errors('dropping availability bitmaps'):
+            cache.delete_many([_bitmap_key(master_id, versions[_version_name(master_id)], date)
+                               for master_id in master_ids for date in dates
+                               if versions[_version_name(master_id)] is not None])
+
+    master_ids, dates = list(master_ids), list(dates)
+    if master_ids and dates:
+        drop()
+        transaction.on_commit(drop)
+
+
+class AvailabilityEngine:
+    """
+    Free time of the masters behind a set of services.
+
+    Services, working hours and bookings are fetched in one query each, no matter
+    how many services, masters or dates are involved; the rest is interval
+    arithmetic over minutes since midnight.
+
+    Every (master, date) pair is cached as two day bitmaps, working time and
+    free time, so repeated lookups only cost cache round trips. Slots held
+    during checkout (see beauty.holds) are read right after and count as busy.
+    """
+
+    def __init__(self, services):
+        self.services = {service.id: service for service in services}
+        self.master_ids = sorted({service.user_id for service in self.services.values()})
+        self.duration = sum(duration_to_minutes(service.duration) for service in self.services.values())
+        self._windows = None
+        self._busy = {}
+        self._bitmaps = {}
+        self._holds = {}
+
+    @classmethod
+    def from_service_ids(cls, service_ids):
+        services = Service.objects.filter(id__in=set(service_ids)).only('id', 'user_id', 'duration')
+        return cls(services)
+
+    def missing_service_ids(self, service_ids):
+        return [service_id for service_id in service_ids if service_id not in self.services]
+
+    def load(self, dates):
+        """
+        Fetch working hours and bookings of all masters for the given dates.
+        """
+        self._load_windows()
+        self._load_bookings(dates)
+
+    def _load_windows(self):
+        if self._windows is not None:
+            return
+        self._windows = defaultdict(lambda: defaultdict(list))
+        times = Time.objects.filter(user_id__in=self.master_ids).values_list(
+            'user_id', 'day_id', 'start_time', 'end_time')
+        for user_id, day_id, start_time, end_time in times:
+            self._windows[user_id][day_id].append((time_to_minutes(start_time), time_to_minutes(end_time)))
+
+    def _load_bookings(self, dates):
+        dates = [date for date in dates if date not in self._busy]
+        if not dates:
+            return
+        for date in dates:
+            self._busy[date] = defaultdict(list)
+
+        rows = (Booking.service.through.objects
+                .filter(booking__date__in=dates, booking__service__user_id__in=self.master_ids)
+                .exclude(booking__status=Booking.StatusChoices.REJECTED)
+                .values_list('booking_id', 'booking__date', 'booking__time', 'service_id', 'service__user_id',
+                             'service__duration')
+                .distinct())
+
+        bookings = {}
+        for booking_id, date, time, _, master_id, duration in rows:
+            booking = bookings.setdefault(booking_id, {'date': date, 'time': time, 'masters': set(), 'duration': 0})
+            booking['masters'].add(master_id)
+            booking['duration'] += duration_to_minutes(duration)
+
+        for booking in bookings.values():
+            start = time_to_minutes(booking['time'])
+            for master_id in booking['masters']:
+                self._busy[booking['date']][master_id].append((start, start + booking['duration']))
+
+    def working_windows(self, master_id, date):
+        self._load_windows()
+        return merge_intervals(self._windows[master_id][working_day_index(date)])
+
+    def busy_intervals(self, master_id, date):
+        self._load_bookings([date])
+        return merge_intervals(self._busy[date][master_id])
+
+    def day_bitmaps(self, dates):
+        """
+        (working, free) bitmaps of every master for the given dates.
+
+        The masters' current holds inside their free time on those dates are read
+        right after, in one more cache round trip.
+        """
+        dates = [date for date in dates if any((master_id, date) not in self._bitmaps
+                                               for master_id in self.master_ids)]
+        if not dates or not self.master_ids:
+            return self._bitmaps
+
+        versions = get_versions([_version_name(master_id) for master_id in self.master_ids])
+        keys = {_bitmap_key(master_id, versions[_version_name(master_id)], date): (master_id, date)
+                for master_id in self.master_ids for date in dates}
+        cached = {}
+        with ignore_cache_errors('reading availability bitmaps'):
+            cached = cache.get_many(list(keys))
+        for key, pair in keys.items():
+            if key in cached:
+                self._bitmaps[pair] = cached[key]
+
+        missing = {key: pair for key, pair in keys.items() if key not in cached}
+        if missing:
+            self.load(sorted({date for _, date in missing.values()}))
+            built = {}
+            for key, (master_id, date) in missing.items():
+                working = self.working_windows(master_id, date)
+                free = subtract_intervals(working, self.busy_intervals(master_id, date))
+                built[key] = self._bitmaps[master_id, date] = (intervals_to_bitmap(working),
+                                                               intervals_to_bitmap(free))
+            with ignore_cache_errors('storing availability bitmaps'):
+                cache.set_many({key: value for key, value in built.items()
+                                if versions[_version_name(missing[key][0])] is not None}, timeout=BITMAP_TIMEOUT)
+
+        self._holds.update(held_intervals({
+            pair: [minute for start, end in bitmap_to_intervals(self._bitmaps[pair][1])
+                   for minute in slot_starts(start, end)]
+            for pair in keys.values()}))
+        return self._bitmaps
+
+    def is_booked(self, date, start):
+        """
+        Whether any master already has a booking overlapping a slot starting at ``start``.
+
+        Unlike the bitmap lookups this always reads bookings from the database.
+        """
+        start = time_to_minutes(start)
+        slot = [(start, start + max(self.duration, 1))]
+        return any(intersect_intervals(slot, self.busy_intervals(master_id, date)) for master_id in self.master_ids)
+
+    def has_working_hours(self, date):
+        return all(self.working_windows(master_id, date) for master_id in self.master_ids)
+
+    def fits_working_hours(self, date, start):
+        """
+        Whether a slot starting at ``start`` ends inside one working window of every master.
+        """
+        start = time_to_minutes(start)
+        end = start + self.duration
+        return all(any(window_start <= start and end <= window_end
+                       for window_start, window_end in self.working_windows(master_id, date))
+                   for master_id in self.master_ids)
+
+    def is_held(self, date, start, token=None, user_id=None):
+        """
+        Whether a slot starting at ``start`` is held by anyone but the owner of ``token`` or ``user_id``.
+        """
+        start = time_to_minutes(start)
+        return is_held(self.master_ids, date, start, start + max(self.duration, 1), token, user_id)
+
+    def is_free(self, date, start):
+        start = time_to_minutes(start)
+        end = start + self.duration
+        return any(free_start <= start and end <= free_end for free_start, free_end in self.free_intervals(date))
+
+    def is_working_day(self, date):
+        bitmaps = self.day_bitmaps([date])
+        return all(any(bitmaps[master_id, date][0]) for master_id in self.master_ids)
+
+    def free_intervals(self, date):
+        """
+        Intervals in which every master involved is at work, not booked and not held.
+        """
+        if not self.master_ids:
+            return []
+        bitmaps = self.day_bitmaps([date])
+        free = bitmap_to_intervals(and_bitmaps(bitmaps[master_id, date][1] for master_id in self.master_ids))
+        held = [interval for master_id in self.master_ids for interval in self._holds.get((master_id, date), [])]
+        return subtract_intervals(free, held) if held else free
+
+    def free_slots(self, date):
+        return [format_minutes(start) for start in split_into_slots(self.free_intervals(date), self.duration)]
@@ -0,0 +1,99 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+# Namespaces whose bump did not reach the cache; retried before the next version read or bump.
+_unbumped = set()
+_unbumped_lock = threading.Lock()
+
+
+def _version_key(name):
+    return f'version:{name}'
+
+
+def _initial_version():
+    # A lost version key must never come back with a number that was already used.
+    return int(time.time() * 1000)
+
+
+@contextmanager
+def ignore_cache_errors(action):
+    """
+    Log and swallow errors of the cache calls made inside the block.
+
+    The cache only ever speeds things up, so an unreachable cache must not fail
+    the request or the model write that uses it.
+    """
+    try:
+        yield
+    except Exception:
+        logger.warning('Cache unavailable while %s', action, exc_info=True)
+
+
+def _incr_version(name):
+    key = _version_key(name)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.add(key, _initial_version(), timeout=None)
+        return cache.get(key)
+
+
+def _retry_unbumped():
+    if not _unbumped:
+        return
+    with _unbumped_lock:
+        names = list(_unbumped)
+        _unbumped.clear()
+    for index, name in enumerate(names):
+        try:
+            _incr_version(name)
+        except Exception:
+            with _unbumped_lock:
+                _unbumped.update(names[index:])
+            raise
+
+
+def get_versions(names):
+    """
+    Current version numbers of the given namespaces, fetched in one cache round trip.
+
+    Every version is None while the cache cannot be reached; callers skip the
+    cache for those namespaces instead of failing.
+    """
+    versions = dict.fromkeys(names)
+    with ignore_cache_errors('reading versions'):
+        _retry_unbumped()
+        keys = {_version_key(name): name for name in names}
+        versions.update((keys[key], value) for key, value in cache.get_many(list(keys)).items())
+        for name in names:
+            if versions[name] is None:
+                cache.add(_version_key(name), _initial_version(), timeout=None)
+                versions[name] = cache.get(_version_key(name))
+    return versions
+
+
+def get_version(name):
+    return get_versions([name])[name]
+
+
+def bump_version(name):
+    """
+    Move a namespace to a new version, orphaning everything cached under the old one.
+
+    A bump that cannot reach the cache is remembered and retried by this process,
+    so entries cached before an outage are not served again once the cache is back.
+    """
+    try:
+        _retry_unbumped()
+        return _incr_version(name)
+    except Exception:
+        logger.warning('Cache unavailable while bumping version %s', name, exc_info=True)
+        with _unbumped_lock:
+            _unbumped.add(name)
+        return None
@@ -0,0 +1,194 @@
+import secrets
+import time as clock
+from datetime import datetime, timedelta, timezone
+from itertools import groupby
+
+from django.core import signing
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Max, Q
+
+from beauty.cache import ignore_cache_errors
+from beauty.models.booking import Booking
+from users.models import User
+
+TOKEN_SALT = 'beauty.calendar'
+ICS_CONTENT_TYPE = 'text/calendar; charset=utf-8'
+CHUNK_SIZE = 2000
+
+EVENT_STATUS = {
+    Booking.StatusChoices.PENDING: 'TENTATIVE',
+    Booking.StatusChoices.APPROVED: 'CONFIRMED',
+    Booking.StatusChoices.REJECTED: 'CANCELLED',
+}
+
+
+def calendar_token(master):
+    return signing.dumps([master.id, master.calendar_key], salt=TOKEN_SALT, compress=True)
+
+
+def read_calendar_token(token):
+    """
+    (master id, calendar key) signed into a feed token, or None when the token was tampered with.
+
+    Tokens issued before calendar keys existed carry only the id and stand for the empty key.
+    """
+    try:
+        payload = signing.loads(token, salt=TOKEN_SALT)
+    except signing.BadSignature:
+        return None
+    if isinstance(payload, int):
+        return payload, ''
+    master_id, key = payload
+    return master_id, key
+
+
+def rotate_calendar_key(master):
+    """
+    Give the master a new calendar key, which revokes every feed URL handed out so far.
+    """
+    master.calendar_key = secrets.token_urlsafe(16)
+    master.save(update_fields=['calendar_key'])
+
+
+def _changed_key(master_id):
+    return f'calendar:{master_id}:changed'
+
+
+def calendar_changed(master_ids):
+    """
+    Record that the feeds of the given masters changed without any of their bookings' rows
+    changing, e.g. after a service was renamed.
+
+    The record is repeated once the surrounding transaction commits, so a feed
+    rendered from not yet committed data cannot keep the new validators.
+    """
+    def touch():
+        with ignore_cache_errors('recording calendar changes'):
+            cache.set_many(dict.fromkeys(keys, clock.time()), timeout=None)
+
+    keys = [_changed_key(master_id) for master_id in set(master_ids)]
+    if keys:
+        touch()
+        transaction.on_commit(touch)
+
+
+def _changed_at(master_id):
+    # A lost record counts as a change now; None while the cache cannot be reached.
+    key = _changed_key(master_id)
+    with ignore_cache_errors('reading calendar changes'):
+        changed_at = cache.get(key)
+        if changed_at is None:
+            cache.add(key, clock.time(), timeout=None)
+            changed_at = cache.get(key)
+        return changed_at
+    return None
+
+
+def calendar_state(master_id, key):
+    """
+    (ETag, Last-Modified) of a master's feed, or None when ``key`` is not the master's current calendar key.
+
+    The key check and the booking aggregate are one query. The booking count is part
+    of the ETag so that deleted bookings change it too; everything else shown in the
+    feed is covered by calendar_changed. Both validators are None while the cache
+    cannot be reached.
+    """
+    state = (User.objects.filter(pk=master_id, calendar_key=key).values('pk')
+             .annotate(count=Count('services__booking', distinct=True),
+                       last_modified=Max('services__booking__updated_at'))
+             .first())
+    if state is None:
+        return None
+    changed_at = _changed_at(master_id)
+    if changed_at is None:
+        return None, None
+    last_modified = datetime.fromtimestamp(changed_at, timezone.utc)
+    if state['last_modified'] and state['last_modified'] > last_modified:
+        last_modified = state['last_modified']
+    stamp = int(state['last_modified'].timestamp() * 1000000) if state['last_modified'] else 0
+    return f'"{master_id}-{state["count"]}-{stamp}-{int(changed_at * 1000000)}"', last_modified
+
+
+def escape_text(value):
+    return (str(value).replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+            .replace('\r\n', '\\n').replace('\n', '\\n'))
+
+
+def fold_line(line):
+    """
+    Split a content line into 75 octet pieces as RFC 5545 requires, without breaking UTF-8 sequences.
+    """
+    encoded = line.encode()
+    if len(encoded) <= 75:
+        return line + '\r\n'
+    parts, start, limit = [], 0, 75
+    while start < len(encoded):
+        end = min(start + limit, len(encoded))
+        while end < len(encoded) and (encoded[end] & 0xC0) == 0x80:
+            end -= 1
+        parts.append(encoded[start:end].decode())
+        start, limit = end, 74
+    return '\r\n '.join(parts) + '\r\n'
+
+
+def format_local(value):
+    return value.strftime('%Y%m%dT%H%M%S')
+
+
+def format_utc(value):
+    return value.strftime('%Y%m%dT%H%M%SZ')
+
+
+def _booking_rows(master_id):
+    """
+    The master's booking services in (booking, service) order, fetched in keyset chunks
+    of CHUNK_SIZE rows so that memory stays flat without a server-side cursor.
+    """
+    rows = (Booking.service.through.objects
+            .filter(service__user_id=master_id)
+            .order_by('booking_id', 'service_id')
+            .values_list('booking_id', 'booking__date', 'booking__time', 'booking__status', 'booking__updated_at',
+                         'booking__user__full_name', 'service__name', 'service__duration', 'service_id'))
+    after = Q()
+    while True:
+        chunk = list(rows.filter(after)[:CHUNK_SIZE])
+        yield from chunk
+        if len(chunk) < CHUNK_SIZE:
+            return
+        booking_id, service_id = chunk[-1][0], chunk[-1][8]
+        after = Q(booking_id__gt=booking_id) | Q(booking_id=booking_id, service_id__gt=service_id)
+
+
+def iter_calendar(master_id, host):
+    """
+    Yield the master's bookings as an iCalendar document, one event per booking.
+
+    Booking times are local wall-clock times, so events use floating date-times.
+    """
+    yield fold_line('BEGIN:VCALENDAR')
+    yield fold_line('VERSION:2.0')
+    yield fold_line('PRODID:-//Aura//Bookings//EN')
+    yield fold_line('CALSCALE:GREGORIAN')
+    yield fold_line('X-WR-CALNAME:Aura bookings')
+
+    for booking_id, group in groupby(_booking_rows(master_id), key=lambda row: row[0]):
+        group = list(group)
+        _, date, time, status, updated_at, customer, _, _, _ = group[0]
+        start = datetime.combine(date, time)
+        end = start + sum((row[7] for row in group), timedelta())
+        lines = [
+            'BEGIN:VEVENT',
+            f'UID:booking-{booking_id}@{host}',
+            f'DTSTAMP:{format_utc(updated_at)}',
+            f'LAST-MODIFIED:{format_utc(updated_at)}',
+            f'DTSTART:{format_local(start)}',
+            f'DTEND:{format_local(end)}',
+            f'SUMMARY:{escape_text(", ".join(row[6] for row in group))}',
+            f'DESCRIPTION:{escape_text(customer)}',
+            f'STATUS:{EVENT_STATUS.get(status, "TENTATIVE")}',
+            'END:VEVENT',
+        ]
+        yield ''.join(fold_line(line) for line in lines)
+
+    yield fold_line('END:VCALENDAR')
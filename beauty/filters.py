@@ -0,0 +1,56 @@
+from django import forms
+from django_filters import rest_framework as filters
+from rest_framework.filters import OrderingFilter
+
+from beauty.models.service import Service
+from beauty.serializers.fields import parse_hour_minute_duration
+
+
+class HourMinuteDurationFormField(forms.DurationField):
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        duration = parse_hour_minute_duration(value)
+        if duration is None:
+            raise forms.ValidationError('Enter a duration as "HH:MM".', code='invalid')
+        return duration
+
+
+class HourMinuteDurationFilter(filters.Filter):
+    field_class = HourMinuteDurationFormField
+
+
+class ServiceFilter(filters.FilterSet):
+    """
+    Catalog filters; every combination is applied together. The category and
+    master filters pair with the composite indexes declared on Service.
+    """
+    id = filters.NumberFilter(field_name='id')
+    user_id = filters.NumberFilter(field_name='user_id')
+    category_id = filters.NumberFilter(field_name='category_id')
+    price_min = filters.NumberFilter(field_name='price', lookup_expr='gte')
+    price_max = filters.NumberFilter(field_name='price', lookup_expr='lte')
+    duration_min = HourMinuteDurationFilter(field_name='duration', lookup_expr='gte')
+    duration_max = HourMinuteDurationFilter(field_name='duration', lookup_expr='lte')
+
+    class Meta:
+        model = Service
+        fields = ['id', 'user_id', 'category_id', 'price_min', 'price_max', 'duration_min', 'duration_max']
+
+
+class CatalogOrderingFilter(OrderingFilter):
+    """
+    ``?ordering=`` by price, -price, newest or popularity. Each alias ends with an id
+    tiebreaker so that rows sharing a price or a like count keep a stable order.
+    Without an ordering, search results stay ordered by relevance (see CatalogCursorPagination).
+    """
+    aliases = {
+        'price': ['price', 'id'],
+        '-price': ['-price', '-id'],
+        'newest': ['-id'],
+        'popularity': ['-favorites_count', '-id'],
+    }
+
+    def remove_invalid_fields(self, queryset, fields, view, request):
+        fields = [term for field in fields for term in self.aliases.get(field, [field])]
+        return super().remove_invalid_fields(queryset, fields, view, request)
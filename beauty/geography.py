@@ -0,0 +1,182 @@
+import bisect
+import gzip
+import hashlib
+import json
+import time
+from array import array
+
+from django.core.cache import cache
+
+from beauty.cache import ignore_cache_errors
+from beauty.models.region import District, Mahalla, Region
+from beauty.response_cache import model_versions
+
+BUNDLE_MODELS = (Region, District, Mahalla)
+BUNDLE_TIMEOUT = 60 * 60 * 24 * 30
+# How long a process trusts its GeographyIndex before looking at the model versions again.
+INDEX_CHECK_INTERVAL = 5
+
+
+class GeographyBundle:
+    """
+    The whole Region -> District -> Mahalla tree as gzipped JSON and the hash of that JSON.
+    """
+
+    def __init__(self, content_hash, compressed):
+        self.content_hash = content_hash
+        self.compressed = compressed
+
+    @classmethod
+    def build(cls):
+        """
+        Three queries however many rows; the output is byte for byte stable for the same data.
+        """
+        mahallas, districts = {}, {}
+        for pk, name, district_id in Mahalla.objects.order_by('id').values_list('id', 'name', 'district_id'):
+            mahallas.setdefault(district_id, []).append({'id': pk, 'name': name})
+        for pk, name, region_id in District.objects.order_by('id').values_list('id', 'name', 'region_id'):
+            districts.setdefault(region_id, []).append({'id': pk, 'name': name, 'mahallas': mahallas.get(pk, [])})
+        tree = [{'id': pk, 'name': name, 'districts': districts.get(pk, [])}
+                for pk, name in Region.objects.order_by('id').values_list('id', 'name')]
+        content = json.dumps(tree, ensure_ascii=False, separators=(',', ':')).encode()
+        return cls(hashlib.sha256(content).hexdigest()[:16], gzip.compress(content, mtime=0))
+
+    def content(self):
+        return gzip.decompress(self.compressed)
+
+
+def _identity():
+    """
+    The versions of BUNDLE_MODELS as one string, or None while the cache cannot be reached.
+    """
+    versions = model_versions(BUNDLE_MODELS)
+    if None in versions.values():
+        return None
+    return '|'.join(f'{name}={versions[name]}' for name in sorted(versions))
+
+
+_current = None
+
+
+def get_bundle():
+    """
+    The current bundle. It is rebuilt only after Region, District or Mahalla changed
+    (see reference_data_changed); until then it comes from this process or the cache.
+    While the versions cannot be read it is built from the database on every call.
+    """
+    global _current
+    identity = _identity()
+    if identity is None:
+        return GeographyBundle.build()
+    if _current is not None and _current[0] == identity:
+        return _current[1]
+    key = f'geography:{hashlib.sha1(identity.encode()).hexdigest()}'
+    bundle = None
+    with ignore_cache_errors('reading the geography bundle'):
+        bundle = cache.get(key)
+    if bundle is None:
+        bundle = GeographyBundle.build()
+        with ignore_cache_errors('caching the geography bundle'):
+            cache.set(key, bundle, timeout=BUNDLE_TIMEOUT)
+    _current = (identity, bundle)
+    return bundle
+
+
+class GeographyTable:
+    """
+    Sorted ids with the names and parent ids at the same positions; lookups bisect the ids.
+    """
+
+    def __init__(self, rows):
+        rows = sorted(rows)
+        self.ids = array('q', [pk for pk, _, _ in rows])
+        self.names = tuple(name for _, name, _ in rows)
+        self.parents = array('q', [parent_id or 0 for _, _, parent_id in rows])
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _position(self, pk):
+        position = bisect.bisect_left(self.ids, pk)
+        if position < len(self.ids) and self.ids[position] == pk:
+            return position
+        return None
+
+    def __contains__(self, pk):
+        return self._position(pk) is not None
+
+    def name(self, pk):
+        position = self._position(pk)
+        return None if position is None else self.names[position]
+
+    def parent(self, pk):
+        position = self._position(pk)
+        return None if position is None else self.parents[position]
+
+
+class GeographyIndex:
+    """
+    Immutable in-memory copy of Region, District and Mahalla for rendering and
+    validating addresses without queries.
+    """
+
+    def __init__(self, regions, districts, mahallas):
+        self.regions = GeographyTable(regions)
+        self.districts = GeographyTable(districts)
+        self.mahallas = GeographyTable(mahallas)
+
+    @classmethod
+    def build(cls):
+        return cls([(pk, name, None) for pk, name in Region.objects.values_list('id', 'name')],
+                   District.objects.values_list('id', 'name', 'region_id'),
+                   Mahalla.objects.values_list('id', 'name', 'district_id'))
+
+    def knows(self, region_id, district_id, mahalla_id):
+        return region_id in self.regions and district_id in self.districts and mahalla_id in self.mahallas
+
+    def address_errors(self, region_id, district_id, mahalla_id):
+        """
+        {field: message} for ids that do not exist or do not belong to each other.
+        """
+        errors = {}
+        for field, table, pk in (('region', self.regions, region_id), ('district', self.districts, district_id),
+                                 ('mahalla', self.mahallas, mahalla_id)):
+            if pk not in table:
+                errors[field] = f'Invalid pk "{pk}" - object does not exist.'
+        if not errors and self.districts.parent(district_id) != region_id:
+            errors['district'] = 'The district is not in the region.'
+        if not errors and self.mahallas.parent(mahalla_id) != district_id:
+            errors['mahalla'] = 'The mahalla is not in the district.'
+        return errors
+
+
+_index = None
+
+
+def get_index(require=()):
+    """
+    The process wide GeographyIndex, rebuilt with three queries after Region,
+    District or Mahalla changed. The versions are looked at every
+    INDEX_CHECK_INTERVAL seconds, or right away when the (region, district,
+    mahalla) ids in ``require`` are unknown, e.g. a mahalla added a moment ago.
+    While the versions cannot be read, every such look rebuilds the index from the database.
+    """
+    global _index
+    now = time.monotonic()
+    if _index is not None and now - _index[1] < INDEX_CHECK_INTERVAL and (not require or _index[2].knows(*require)):
+        return _index[2]
+    identity = _identity()
+    if identity is None or _index is None or _index[0] != identity:
+        _index = (identity, now, GeographyIndex.build())
+    else:
+        _index = (identity, now, _index[2])
+    return _index[2]
+
+
+def expire_index():
+    """
+    Make this process look at the versions on its next get_index call.
+    """
+    global _index
+    if _index is not None:
+        _index = (_index[0], float('-inf'), _index[2])
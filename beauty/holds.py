@@ -0,0 +1,102 @@
+import time
+import uuid
+
+from django.core.cache import cache
+
+from beauty.cache import ignore_cache_errors
+
+HOLD_TIMEOUT = 5 * 60
+HOLD_SLOT_MINUTES = 5
+
+
+def _slot_key(master_id, date, minute):
+    return f'hold:{master_id}:{date.isoformat()}:{minute}'
+
+
+def _hold_key(token):
+    return f'hold:{token}'
+
+
+def slot_starts(start, end):
+    """
+    Starts of the HOLD_SLOT_MINUTES slots that cover [start, end) minutes.
+    """
+    return range(start - start % HOLD_SLOT_MINUTES, end, HOLD_SLOT_MINUTES)
+
+
+def _slot_keys(master_ids, date, start, end):
+    return [_slot_key(master_id, date, minute) for master_id in sorted(master_ids) for minute in slot_starts(start, end)]
+
+
+def _release_keys(keys, token):
+    owned = [key for key, (owner, _) in cache.get_many(keys).items() if owner == token]
+    cache.delete_many(owned)
+
+
+def acquire_hold(user_id, master_ids, date, start, end, timeout=HOLD_TIMEOUT):
+    """
+    Reserve [start, end) minutes of ``date`` with every master for ``timeout`` seconds.
+
+    Every HOLD_SLOT_MINUTES slot is claimed with an atomic add (SET NX with a TTL on
+    Redis), so overlapping holds cannot both succeed. The slot keys are the only
+    record of who holds what; free time lists read them directly (see held_intervals).
+    Returns the hold, or None when part of the interval is already held.
+    """
+    token = uuid.uuid4().hex
+    acquired = []
+    for key in _slot_keys(master_ids, date, start, end):
+        if not cache.add(key, (token, user_id), timeout=timeout):
+            _release_keys(acquired, token)
+            return None
+        acquired.append(key)
+
+    expires = time.time() + timeout
+    hold = {'token': token, 'user_id': user_id, 'master_ids': sorted(master_ids), 'date': date, 'start': start,
+            'end': end, 'expires': expires}
+    cache.set(_hold_key(token), hold, timeout=timeout)
+    return hold
+
+
+def get_hold(token):
+    with ignore_cache_errors('reading a slot hold'):
+        return cache.get(_hold_key(token))
+    return None
+
+
+def release_hold(token):
+    hold = get_hold(token)
+    if hold is None:
+        return False
+    with ignore_cache_errors('releasing a slot hold'):
+        _release_keys(_slot_keys(hold['master_ids'], hold['date'], hold['start'], hold['end']), token)
+        cache.delete(_hold_key(token))
+    return True
+
+
+def is_held(master_ids, date, start, end, token=None, user_id=None):
+    """
+    Whether any part of [start, end) is held by someone other than the owner of ``token``
+    or the user ``user_id``, in one cache round trip.
+    """
+    with ignore_cache_errors('reading slot holds'):
+        owners = cache.get_many(_slot_keys(master_ids, date, start, end)).values()
+        return any(owner != token and owner_id != user_id for owner, owner_id in owners)
+    return False
+
+
+def held_intervals(slots):
+    """
+    Held parts of the given slots, read straight from the slot keys in one cache round trip.
+
+    ``slots`` maps (master_id, date) pairs to HOLD_SLOT_MINUTES slot starts; the
+    result maps the same pairs to the (start, end) minutes held by anyone.
+    """
+    keys = {_slot_key(master_id, date, minute): (master_id, date, minute)
+            for (master_id, date), minutes in slots.items() for minute in minutes}
+    held = {pair: [] for pair in slots}
+    if keys:
+        with ignore_cache_errors('reading slot holds'):
+            for key in cache.get_many(list(keys)):
+                master_id, date, minute = keys[key]
+                held[master_id, date].append((minute, minute + HOLD_SLOT_MINUTES))
+    return held
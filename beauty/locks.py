@@ -0,0 +1,26 @@
+from django.db import connection
+
+from users.models import User
+
+
+def _advisory_key(master_id, date):
+    return (master_id << 20) | date.toordinal()
+
+
+def lock_master_days(pairs):
+    """
+    Serialize booking writes for the given (master_id, date) pairs until the current transaction ends.
+
+    PostgreSQL takes one transaction-level advisory lock per pair, so bookings of
+    other masters or other days never wait on each other. Other databases fall
+    back to locking the masters' user rows. Locks are always taken in the same
+    order to keep concurrent batches from deadlocking.
+    """
+    keys = sorted({_advisory_key(master_id, date) for master_id, date in pairs})
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            for key in keys:
+                cursor.execute('SELECT pg_advisory_xact_lock(%s)', [key])
+    else:
+        master_ids = {key >> 20 for key in keys}
+        list(User.objects.select_for_update().filter(pk__in=master_ids).order_by('pk').values_list('pk', flat=True))
@@ -0,0 +1,121 @@
+import threading
+import time as timer
+import uuid
+from datetime import time, timedelta
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand
+from django.db import connection, DatabaseError
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from beauty.availability import working_day_index
+from beauty.models.booking import Booking, Time, WorkingDays
+from beauty.models.service import Category, Service
+from beauty.serializers.booking import BookingSerializer
+from users.models import User
+
+SLOT = timedelta(minutes=15)
+
+
+class Command(BaseCommand):
+    help = ('Create bookings from many threads at once: first all of them for one slot of one master, '
+            'then spread over many masters. Reports winners and throughput, then removes its data.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--masters', type=int, default=20)
+        parser.add_argument('--attempts', type=int, default=400)
+
+    def handle(self, *args, **options):
+        fixture = self.create_fixture(options['masters'])
+        try:
+            services = fixture['services']
+            attempts = options['attempts']
+
+            winners = self.run('single slot', options['threads'],
+                               [(services[0], time(10, 0)) for _ in range(attempts)], fixture)
+            if winners != 1:
+                self.stderr.write(self.style.ERROR(f'Expected exactly one winner, got {winners}'))
+            Booking.objects.filter(user=fixture['customer']).delete()
+
+            slots = [(services[i % len(services)], self.slot_time(i // len(services))) for i in range(attempts)]
+            self.run('many masters', options['threads'], slots, fixture)
+        finally:
+            self.drop_fixture(fixture)
+
+    @staticmethod
+    def slot_time(index):
+        minutes = 15 * (index % 95)
+        return time(minutes // 60, minutes % 60)
+
+    def create_fixture(self, masters):
+        tag = uuid.uuid4().hex[:8]
+        date = timezone.now().date() + timedelta(days=7)
+        day, day_created = WorkingDays.objects.get_or_create(id=working_day_index(date),
+                                                             defaults={'day': date.strftime('%A')})
+        category = Category.objects.create(name=f'benchmark-{tag}')
+        customer = User.objects.create(username=f'bench-customer-{tag}', email=f'customer-{tag}@bench.local')
+
+        services = []
+        for i in range(masters):
+            master = User.objects.create(username=f'bench-master-{tag}-{i}', email=f'master-{tag}-{i}@bench.local',
+                                         is_master=True)
+            Time.objects.create(day=day, start_time=time(0, 0), end_time=time(23, 59), user=master)
+            services.append(Service.objects.create(name=f'benchmark-{tag}', price=10, duration=SLOT,
+                                                   category=category, user=master))
+        return {'date': date, 'day': day, 'day_created': day_created, 'category': category, 'customer': customer,
+                'services': services}
+
+    @staticmethod
+    def drop_fixture(fixture):
+        Booking.objects.filter(user=fixture['customer']).delete()
+        User.objects.filter(pk__in=[service.user_id for service in fixture['services']]).delete()
+        fixture['customer'].delete()
+        fixture['category'].delete()
+        if fixture['day_created']:
+            fixture['day'].delete()
+
+    def run(self, name, threads, slots, fixture):
+        request = SimpleNamespace(user=fixture['customer'])
+        results = {'won': 0, 'rejected': 0, 'errors': 0}
+        results_lock = threading.Lock()
+        queue = list(reversed(slots))
+
+        def worker():
+            try:
+                while True:
+                    with results_lock:
+                        if not queue:
+                            return
+                        service, start = queue.pop()
+                    data = {'date': fixture['date'], 'time': start, 'service_ids': [service.id]}
+                    serializer = BookingSerializer(data=data, context={'request': request})
+                    try:
+                        outcome = 'rejected'
+                        if serializer.is_valid():
+                            serializer.save()
+                            outcome = 'won'
+                    except ValidationError:
+                        outcome = 'rejected'
+                    except DatabaseError:
+                        outcome = 'errors'
+                    with results_lock:
+                        results[outcome] += 1
+            finally:
+                connection.close()
+
+        pool = [threading.Thread(target=worker) for _ in range(threads)]
+        started = timer.perf_counter()
+        for thread in pool:
+            thread.start()
+        for thread in pool:
+            thread.join()
+        elapsed = timer.perf_counter() - started
+
+        self.stdout.write(
+            f'{name}: {len(slots)} attempts from {threads} threads in {elapsed:.2f}s '
+            f'({len(slots) / elapsed:.1f} attempts/s) - won {results["won"]}, '
+            f'rejected {results["rejected"]}, errors {results["errors"]}'
+        )
+        return results['won']
@@ -0,0 +1,62 @@
+import re
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+TIME_RE = re.compile(r'^\s*(?P<hours>\d{1,2})[:.](?P<minutes>\d{2})(?::\d{2})?\s*$')
+MINUTES_RE = re.compile(r'^\s*(?P<minutes>\d+)\s*(?:m|min|mins|minutes?)?\s*$', re.IGNORECASE)
+
+COLUMNS = (
+    ('time', 'start_time', 'time'),
+    ('time', 'end_time', 'time'),
+    ('booking', 'time', 'time'),
+    ('service', 'duration', 'duration'),
+)
+
+
+def normalize(value, kind):
+    match = TIME_RE.match(value)
+    if match:
+        hours, minutes = int(match['hours']), int(match['minutes'])
+        if kind == 'time' and (hours > 23 or minutes > 59):
+            return None
+        return f'{hours:02d}:{minutes:02d}:00'
+    match = MINUTES_RE.match(value)
+    if match and kind == 'duration':
+        minutes = int(match['minutes'])
+        return f'{minutes // 60:02d}:{minutes % 60:02d}:00'
+    return None
+
+
+class Command(BaseCommand):
+    help = ('Rewrite legacy "HH:MM" text values of Time, Booking and Service into a canonical form '
+            'before their columns are migrated to native time/interval types.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        invalid = 0
+        with transaction.atomic(), connection.cursor() as cursor:
+            for table, column, kind in COLUMNS:
+                cursor.execute(f'SELECT id, {column} FROM {table}')
+                rows = cursor.fetchall()
+                updates = []
+                for pk, value in rows:
+                    if not isinstance(value, str):
+                        continue
+                    normalized = normalize(value, kind)
+                    if normalized is None:
+                        invalid += 1
+                        self.stderr.write(f'{table}.{column} id={pk}: cannot convert {value!r}')
+                    elif normalized != value:
+                        updates.append((normalized, pk))
+
+                self.stdout.write(f'{table}.{column}: {len(updates)} of {len(rows)} rows to rewrite')
+                if updates and not options['dry_run']:
+                    cursor.executemany(f'UPDATE {table} SET {column} = %s WHERE id = %s', updates)
+
+        if invalid:
+            self.stderr.write(self.style.WARNING(f'{invalid} values must be fixed by hand before migrating'))
+        else:
+            self.stdout.write(self.style.SUCCESS('All values can be migrated'))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils.dateparse import parse_date
+
+from beauty.stats import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Recompute the per master daily booking statistics from the bookings, e.g. after a backfill.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='date_from', type=parse_date, help='First day, YYYY-MM-DD')
+        parser.add_argument('--to', dest='date_to', type=parse_date, help='Last day, YYYY-MM-DD')
+        parser.add_argument('--master', dest='master_ids', type=int, action='append', help='Only this master')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            rows = rebuild(options['date_from'], options['date_to'], options['master_ids'])
+        self.stdout.write(f'Wrote {rows} daily rows')
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from beauty.search import SPECS, install_postgresql_search, is_postgresql, refresh_documents
+
+
+class Command(BaseCommand):
+    help = 'Recompute the full-text search documents of services, shops and blogs (PostgreSQL only).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        using = options['database']
+        if not is_postgresql(using):
+            raise CommandError('Search documents are only stored on PostgreSQL.')
+        install_postgresql_search(using)
+        for model in SPECS:
+            count = refresh_documents(model.objects.using(using).all())
+            self.stdout.write(f'{model.__name__}: {count} documents rebuilt')
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from beauty.models.favorite import Favorite, ShopFavorite
+from beauty.models.service import Service, Shop
+
+
+def actual_favorites(model, field):
+    counts = (model.objects
+              .filter(**{field: OuterRef('pk')})
+              .order_by()
+              .values(field)
+              .annotate(count=Count('pk'))
+              .values('count'))
+    return Coalesce(Subquery(counts, output_field=IntegerField()), Value(0))
+
+
+class Command(BaseCommand):
+    help = 'Repair Service.favorites_count and Shop.favorites_count where they drifted from the favorite rows.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only report the drifted rows')
+
+    def handle(self, *args, **options):
+        for counted, model, field in ((Service, Favorite, 'service'), (Shop, ShopFavorite, 'product')):
+            actual = actual_favorites(model, field)
+            drifted = list(counted.objects.annotate(actual=actual).exclude(favorites_count=F('actual'))
+                           .values_list('pk', flat=True))
+            if drifted and not options['dry_run']:
+                # Recount while writing, so favorites made since the check are not lost.
+                counted.objects.filter(pk__in=drifted).update(favorites_count=actual)
+            self.stdout.write(f'{counted.__name__}: {len(drifted)} drifted counters'
+                              f'{" found" if options["dry_run"] else " repaired"}')
@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from beauty.outbox import BATCH_SIZE, MAX_ATTEMPTS, queue_stats, send_batch
+
+
+class Command(BaseCommand):
+    help = ('Send queued emails in batches over one connection per batch, retrying failures with backoff. '
+            'Runs until the queue is drained, or forever with --loop.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument('--max-attempts', type=int, default=MAX_ATTEMPTS)
+        parser.add_argument('--loop', action='store_true', help='Keep polling for new messages')
+        parser.add_argument('--interval', type=float, default=5, help='Seconds to sleep when the queue is empty')
+        parser.add_argument('--stats', action='store_true', help='Only report the queue depth')
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            self.report_queue()
+            return
+
+        while True:
+            stats = send_batch(options['batch_size'], options['max_attempts'])
+            if stats['claimed']:
+                self.stdout.write(
+                    f'sent {stats["sent"]}, failed {stats["failed"]} in {stats["send_seconds"]:.2f}s '
+                    f'({stats["send_seconds"] / stats["claimed"] * 1000:.0f}ms per message), '
+                    f'longest wait {stats["max_wait_seconds"]:.1f}s'
+                )
+                continue
+            self.report_queue()
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
+
+    def report_queue(self):
+        stats = queue_stats()
+        self.stdout.write(f'queue depth {stats["depth"]}, oldest pending {stats["oldest_seconds"]:.1f}s')
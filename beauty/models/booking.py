@@ -1,3 +1,5 @@
+from datetime import time
+
 from django.db.models import *
 
 from users.models import User
@@ -17,14 +19,15 @@ class WorkingDays(Model):
 
 class Time(Model):
     day = ForeignKey(WorkingDays, on_delete=CASCADE, related_name='time_day')
-    start_time = CharField(max_length=10, default='10:00')
-    end_time = CharField(max_length=10, default='18:00')
+    start_time = TimeField(default=time(10, 0))
+    end_time = TimeField(default=time(18, 0))
     user = ForeignKey(User, on_delete=CASCADE, related_name='time_user')
 
     class Meta:
         verbose_name = 'Time'
         verbose_name_plural = 'Times'
         db_table = 'time'
+        indexes = [Index(fields=['user', 'day', 'start_time'])]
 
     def __str__(self):
         return f'{self.day} {self.start_time} - {self.end_time}'
@@ -37,15 +40,34 @@ class Booking(Model):
         REJECTED = 'rejected', 'Rejected'
 
     date = DateField()
-    time = CharField(max_length=10)
+    time = TimeField()
     service = ManyToManyField('Service', related_name='booking')
     user = ForeignKey('users.User', on_delete=CASCADE, related_name='booking')
     status = CharField(max_length=10, choices=StatusChoices.choices, default=StatusChoices.PENDING)
+    updated_at = DateTimeField(auto_now=True)
 
     class Meta:
         verbose_name = 'Booking'
         verbose_name_plural = 'Bookings'
         db_table = 'booking'
+        indexes = [Index(fields=['date', 'time'])]
 
     def __str__(self):
         return f'{self.date} {self.service} {self.user}'
+
+
+class MasterDailyStats(Model):
+    master = ForeignKey('users.User', on_delete=CASCADE, related_name='daily_stats')
+    date = DateField()
+    status = CharField(max_length=10, choices=Booking.StatusChoices.choices)
+    bookings = IntegerField(default=0)
+    revenue = DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name = 'Master Daily Stats'
+        verbose_name_plural = 'Master Daily Stats'
+        db_table = 'master_daily_stats'
+        constraints = [UniqueConstraint(fields=['master', 'date', 'status'], name='master_daily_stats_unique')]
+
+    def __str__(self):
+        return f'{self.master_id} {self.date} {self.status}: {self.bookings}'
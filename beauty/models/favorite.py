@@ -1,4 +1,30 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
+
+from beauty.models.service import Service, Shop
+
+
+def _set_like(model, counted, counted_id, lookup, like):
+    """
+    Create, update or (for ``like is False``) delete a favorite row and move the
+    favorites counter of the liked object by the number of rows added or removed,
+    in one transaction.
+
+    Returns the favorite row, or None after a delete.
+    """
+    with transaction.atomic():
+        if like is False:
+            deleted, _ = model.objects.filter(**lookup).delete()
+            instance, delta = None, -deleted
+        else:
+            instance, created = model.objects.get_or_create(**lookup, defaults={'like': like})
+            if not created and instance.like != like:
+                instance.like = like
+                instance.save(update_fields=['like'])
+            delta = int(created)
+        if delta:
+            counted.objects.filter(pk=counted_id).update(favorites_count=F('favorites_count') + delta)
+    return instance
 
 
 class Favorite(models.Model):
@@ -22,6 +48,10 @@ class Favorite(models.Model):
     def get_total_likes(cls):
         return cls.objects.filter(like=True).count()
 
+    @classmethod
+    def set_like(cls, service_id, user, like):
+        return _set_like(cls, Service, service_id, {'service_id': service_id, 'user': user}, like)
+
 
 class Saved(models.Model):
     service = models.ForeignKey('Service', on_delete=models.CASCADE)
@@ -50,6 +80,10 @@ class ShopFavorite(models.Model):
     def __str__(self):
         return f'{self.user.username} - {self.product.name}'
 
+    @classmethod
+    def set_like(cls, product_id, user, like):
+        return _set_like(cls, Shop, product_id, {'product_id': product_id, 'user': user}, like)
+
 
 class ShopSaved(models.Model):
     product = models.ForeignKey('Shop', on_delete=models.CASCADE)
@@ -0,0 +1,47 @@
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.html import strip_tags
+from django.db.models import *
+
+
+class EmailOutbox(Model):
+    class StatusChoices(TextChoices):
+        PENDING = 'pending', 'Pending'
+        SENT = 'sent', 'Sent'
+        FAILED = 'failed', 'Failed'
+
+    subject = CharField(max_length=255)
+    body = TextField()
+    html_body = TextField(blank=True)
+    from_email = CharField(max_length=255)
+    to = JSONField(default=list)
+    status = CharField(max_length=10, choices=StatusChoices.choices, default=StatusChoices.PENDING)
+    attempts = PositiveSmallIntegerField(default=0)
+    last_error = TextField(blank=True)
+    available_at = DateTimeField(default=timezone.now)
+    created_at = DateTimeField(auto_now_add=True)
+    sent_at = DateTimeField(blank=True, null=True)
+
+    class Meta:
+        verbose_name = 'Email'
+        verbose_name_plural = 'Email outbox'
+        db_table = 'email_outbox'
+        indexes = [Index(fields=['status', 'available_at'])]
+
+    def __str__(self):
+        return f'{self.subject} -> {", ".join(self.to)}'
+
+    @classmethod
+    def build(cls, subject, template_name, context, to, from_email):
+        """
+        Render an html template into an unsaved message; the text part is the html without tags.
+        """
+        html_content = render_to_string(template_name, context)
+        return cls(subject=subject, body=strip_tags(html_content), html_body=html_content, from_email=from_email,
+                   to=list(to))
+
+    @classmethod
+    def enqueue(cls, subject, template_name, context, to, from_email):
+        message = cls.build(subject, template_name, context, to, from_email)
+        message.save()
+        return message
@@ -1,4 +1,5 @@
 from ckeditor.fields import RichTextField
+from django.contrib.postgres.search import SearchVectorField
 from django.db.models import *
 from mptt.fields import TreeForeignKey
 from mptt.models import MPTTModel
@@ -17,19 +18,45 @@ class Category(Model):
         return self.name
 
 
+class ServiceQuerySet(QuerySet):
+    def for_listing(self, user):
+        """
+        Services with everything the list serializer shows: the master and category joined
+        and whether ``user`` liked or saved each service.
+        """
+        from beauty.models.favorite import Favorite, Saved
+
+        queryset = self.select_related('user', 'category')
+        if user is None or not user.is_authenticated:
+            return queryset.annotate(is_like=Value(False), is_saved=Value(False))
+        return queryset.annotate(
+            is_like=Exists(Favorite.objects.filter(service=OuterRef('pk'), user=user)),
+            is_saved=Exists(Saved.objects.filter(service=OuterRef('pk'), user=user)),
+        )
+
+
 class Service(Model):
     name = CharField(max_length=255)
     price = DecimalField(max_digits=10, decimal_places=2)
-    duration = CharField(max_length=10)
+    duration = DurationField()
     description = TextField(null=True, blank=True)
     category = ForeignKey(Category, on_delete=CASCADE, related_name='services')
     user = ForeignKey('users.User', on_delete=CASCADE, related_name='services')
     image = ImageField(upload_to='service/')
+    favorites_count = IntegerField(default=0)
+    search_document = SearchVectorField(null=True, editable=False)
+
+    objects = ServiceQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'Service'
         verbose_name_plural = 'Services'
         db_table = 'service'
+        indexes = [
+            Index(fields=['category', 'price'], name='service_category_price_idx'),
+            Index(fields=['category', 'favorites_count'], name='service_category_favorites_idx'),
+            Index(fields=['user', 'category'], name='service_user_category_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -45,6 +72,7 @@ class Shop(Model):
     price = DecimalField(max_digits=10, decimal_places=2)
     discount = DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     view = IntegerField(default=0)
+    favorites_count = IntegerField(default=0)
     availability = BooleanField(default=True)
 
 
@@ -57,6 +85,7 @@ class Shop(Model):
     size = CharField(max_length=50, null=True, blank=True)
     grams = IntegerField(null=True, blank=True)
     color = CharField(max_length=50, null=True, blank=True)
+    search_document = SearchVectorField(null=True, editable=False)
 
 
     class Meta:
@@ -77,6 +106,7 @@ class Blog(Model):
     image4 = ImageField(upload_to='blog/', null=True, blank=True)
     created_at = DateTimeField(auto_now_add=True)
     view = IntegerField(default=0)
+    search_document = SearchVectorField(null=True, editable=False)
 
     class Meta:
         verbose_name = 'Blog'
@@ -0,0 +1,112 @@
+import logging
+import time as timer
+from datetime import timedelta
+
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.db.models import Count, F, Min
+from django.utils import timezone
+
+from beauty.models.outbox import EmailOutbox
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 50
+MAX_ATTEMPTS = 5
+RETRY_DELAY = timedelta(minutes=1)
+MAX_RETRY_DELAY = timedelta(hours=1)
+# A claimed message is hidden from other workers this long; if its worker dies
+# it becomes available again afterwards.
+CLAIM_TIMEOUT = timedelta(minutes=5)
+
+
+def retry_delay(attempts):
+    return min(RETRY_DELAY * 2 ** (attempts - 1), MAX_RETRY_DELAY)
+
+
+def claim_batch(batch_size=BATCH_SIZE):
+    """
+    Take up to ``batch_size`` due messages. Rows locked by another worker are skipped,
+    so several workers can drain the queue side by side.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        messages = list(EmailOutbox.objects
+                        .select_for_update(skip_locked=True)
+                        .filter(status=EmailOutbox.StatusChoices.PENDING, available_at__lte=now)
+                        .order_by('available_at', 'id')[:batch_size])
+        if messages:
+            EmailOutbox.objects.filter(pk__in=[message.pk for message in messages]).update(
+                available_at=now + CLAIM_TIMEOUT)
+    return messages
+
+
+def send_batch(batch_size=BATCH_SIZE, max_attempts=MAX_ATTEMPTS):
+    """
+    Claim one batch and send it over a single connection.
+
+    Returns a dict with the number of sent and failed messages, the time spent
+    talking to the mail server and the longest time a sent message waited in the queue.
+    """
+    messages = claim_batch(batch_size)
+    stats = {'claimed': len(messages), 'sent': 0, 'failed': 0, 'send_seconds': 0.0, 'max_wait_seconds': 0.0}
+    if not messages:
+        return stats
+
+    started = timer.perf_counter()
+    sent, failed = [], []
+    connection = get_connection()
+    try:
+        connection.open()
+        for message in messages:
+            email = EmailMultiAlternatives(subject=message.subject, body=message.body, from_email=message.from_email,
+                                           to=message.to, connection=connection)
+            if message.html_body:
+                email.attach_alternative(message.html_body, 'text/html')
+            try:
+                email.send()
+            except Exception as exc:
+                logger.warning('Sending email %s failed: %s', message.pk, exc)
+                message.last_error = str(exc)
+                failed.append(message)
+            else:
+                sent.append(message)
+    except Exception as exc:
+        logger.warning('Mail connection failed: %s', exc)
+        done = {message.pk for message in sent + failed}
+        for message in messages:
+            if message.pk not in done:
+                message.last_error = str(exc)
+                failed.append(message)
+    finally:
+        try:
+            connection.close()
+        except Exception:
+            logger.exception('Closing the mail connection failed')
+    stats['send_seconds'] = timer.perf_counter() - started
+
+    now = timezone.now()
+    if sent:
+        EmailOutbox.objects.filter(pk__in=[message.pk for message in sent]).update(
+            status=EmailOutbox.StatusChoices.SENT, sent_at=now, attempts=F('attempts') + 1, last_error='')
+        stats['max_wait_seconds'] = max((now - message.created_at).total_seconds() for message in sent)
+    for message in failed:
+        message.attempts += 1
+        if message.attempts >= max_attempts:
+            message.status = EmailOutbox.StatusChoices.FAILED
+        else:
+            message.available_at = now + retry_delay(message.attempts)
+    EmailOutbox.objects.bulk_update(failed, ['attempts', 'status', 'available_at', 'last_error'])
+
+    stats['sent'], stats['failed'] = len(sent), len(failed)
+    return stats
+
+
+def queue_stats():
+    """
+    Number of messages waiting to be sent and the age of the oldest one in seconds.
+    """
+    pending = EmailOutbox.objects.filter(status=EmailOutbox.StatusChoices.PENDING).aggregate(
+        depth=Count('id'), oldest=Min('created_at'))
+    oldest = (timezone.now() - pending['oldest']).total_seconds() if pending['oldest'] else 0.0
+    return {'depth': pending['depth'], 'oldest_seconds': oldest}
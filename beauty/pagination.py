@@ -0,0 +1,29 @@
+from rest_framework.pagination import CursorPagination
+from rest_framework.settings import api_settings
+
+
+class BookingCursorPagination(CursorPagination):
+    ordering = ('-date', '-time', '-id')
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class CatalogCursorPagination(CursorPagination):
+    """
+    Keyset pagination for catalog lists: pages are fetched by id, never by offset.
+    Search results (annotated with ``search_rank``) are paged by relevance instead,
+    unless the client asked for an ``?ordering=`` the view supports.
+    """
+    ordering = ('id',)
+    ranked_ordering = ('-search_rank', 'id')
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    def get_ordering(self, request, queryset, view):
+        ordering_requested = (request.query_params.get(api_settings.ORDERING_PARAM)
+                              and any(hasattr(backend, 'get_ordering') for backend in view.filter_backends))
+        if 'search_rank' in queryset.query.annotations and not ordering_requested:
+            return self.ranked_ordering
+        return super().get_ordering(request, queryset, view)
@@ -0,0 +1,72 @@
+import logging
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+
+def get_query_budget(view_func):
+    """
+    The ``query_budget`` declared on the view class behind a resolved view function, if any.
+
+    A budget is the most SQL queries one request to the view may run, authentication
+    included, whatever the page size or the amount of data; cold caches included too.
+    """
+    return getattr(getattr(view_func, 'view_class', None), 'query_budget', None)
+
+
+class QueryCounter:
+    """
+    Database execute wrapper counting the queries run through it and the time they took.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += time.perf_counter() - start
+
+
+@contextmanager
+def count_queries():
+    counter = QueryCounter()
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(counter))
+        yield counter
+
+
+class QueryBudgetMiddleware:
+    """
+    Logs the query count and SQL time of every request per view, and warns when a view
+    goes over its query_budget. Enabled with the QUERY_BUDGET_LOG setting. Queries run
+    while a streaming response is consumed are not counted.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'QUERY_BUDGET_LOG', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with count_queries() as counter:
+            response = self.get_response(request)
+        match = getattr(request, 'resolver_match', None)
+        if match is None:
+            return response
+        budget = get_query_budget(match.func)
+        over = budget is not None and counter.count > budget
+        logger.log(logging.WARNING if over else logging.INFO, '%s %s: %d queries (budget %s) in %.1f ms',
+                   request.method, match.view_name, counter.count,
+                   '-' if budget is None else budget, counter.duration * 1000)
+        return response
@@ -0,0 +1,111 @@
+import hashlib
+import threading
+from contextlib import contextmanager
+
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import parse_etags, quote_etag
+
+from beauty.cache import get_versions, bump_version, ignore_cache_errors
+
+RESPONSE_TIMEOUT = 60 * 60 * 24 * 7
+
+
+def _version_name(model):
+    return f'model:{model._meta.label_lower}'
+
+
+def model_versions(models):
+    """
+    {version name: number} of the given models, in one cache round trip; numbers are None
+    while the cache cannot be reached.
+    """
+    return get_versions([_version_name(model) for model in models])
+
+
+_batch = threading.local()
+
+
+def invalidate_responses(model):
+    """
+    Retire every cached response built from ``model``, now and again once the transaction commits.
+    """
+    pending = getattr(_batch, 'models', None)
+    if pending is not None:
+        pending.add(model)
+        return
+    bump_version(_version_name(model))
+    transaction.on_commit(lambda: bump_version(_version_name(model)))
+
+
+@contextmanager
+def batched_response_invalidation():
+    """
+    Collect the invalidate_responses calls made inside the block and run each model's once at the end.
+    """
+    if getattr(_batch, 'models', None) is not None:
+        yield
+        return
+    _batch.models = set()
+    try:
+        yield
+    finally:
+        models, _batch.models = _batch.models, None
+        for model in models:
+            invalidate_responses(model)
+
+
+class CachedResponseMixin:
+    """
+    GET responses of read-mostly public views, cached fully rendered.
+
+    The cache key and ETag are derived from the request URL, the negotiated
+    format and the versions of ``cache_models``, which signals bump on every
+    change. A hit or a matching If-None-Match costs two cache reads and no SQL;
+    for that the views do not authenticate, so only use this on AllowAny views
+    whose output does not depend on the user. While the cache is down responses
+    are built every time and carry no ETag.
+    """
+    cache_models = ()
+    authentication_classes = ()
+
+    def get_response_cache_identity(self, request):
+        versions = model_versions(self.cache_models)
+        if None in versions.values():
+            return None, None
+        identity = '|'.join([request.build_absolute_uri(), request.accepted_renderer.format]
+                            + [f'{name}={versions[name]}' for name in sorted(versions)])
+        digest = hashlib.sha1(identity.encode()).hexdigest()
+        return f'response:{digest}', quote_etag(digest)
+
+    def get(self, request, *args, **kwargs):
+        if request.accepted_renderer.format == 'api':
+            # The browsable API page carries per-user parts such as the CSRF token.
+            return super().get(request, *args, **kwargs)
+        key, etag = self.get_response_cache_identity(request)
+        if key is None:
+            return super().get(request, *args, **kwargs)
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            response = HttpResponseNotModified()
+        else:
+            cached = None
+            with ignore_cache_errors('reading a cached response'):
+                cached = cache.get(key)
+            if cached is None:
+                self._response_cache_key = key
+                response = super().get(request, *args, **kwargs)
+            else:
+                content, content_type = cached
+                response = HttpResponse(content, content_type=content_type)
+        response['ETag'] = etag
+        return response
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        key = getattr(self, '_response_cache_key', None)
+        if key and response.status_code == 200:
+            response.render()
+            with ignore_cache_errors('caching a response'):
+                cache.set(key, (response.content, response['Content-Type']), timeout=RESPONSE_TIMEOUT)
+        return response
@@ -0,0 +1,262 @@
+import difflib
+import hashlib
+import logging
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, TrigramSimilarity
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.db import connections, transaction
+from django.db.models import Case, F, FloatField, Func, IntegerField, OuterRef, Q, Subquery, TextField, Value, When
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Cast, Coalesce
+from rest_framework.filters import SearchFilter
+
+from beauty.cache import bump_version, get_version, ignore_cache_errors
+from beauty.models.service import Blog, Service, Shop
+
+logger = logging.getLogger(__name__)
+
+CONFIG = 'simple'
+# Relevance is stored as an integer so that cursor pagination can compare it exactly.
+RANK_SCALE = 1000000
+# Same weights as PostgreSQL's ts_rank defaults for D, C, B and A.
+WEIGHTS = {'A': 1.0, 'B': 0.4, 'C': 0.2, 'D': 0.1}
+# difflib ratios run higher than trigram similarity (pg_trgm matches from 0.3).
+IN_PROCESS_SIMILARITY = 0.6
+# In-process ranking is meant for development databases; it never scores more rows than this.
+IN_PROCESS_ROW_LIMIT = 10000
+CATALOG_VERSION = 'catalog'
+SEARCH_CACHE_TIMEOUT = 60 * 60
+# Only this many best matches of a query are cached and served.
+SEARCH_RESULT_LIMIT = 500
+APOSTROPHES = str.maketrans({'\u2018': "'", '\u2019': "'", '\u02bb': "'", '\u02bc': "'", '`': "'", '\u00b4': "'"})
+
+
+class SearchSpec:
+    """
+    What to search in a model: weighted fields (one level of foreign keys allowed), the
+    field compared by trigram similarity so that typos still match and the fields
+    the model's list can be filtered by, which cached results depend on too.
+    """
+
+    def __init__(self, model, fields, similar_field, filter_fields=()):
+        self.model = model
+        self.fields = fields
+        self.similar_field = similar_field
+        self.filter_fields = filter_fields
+
+    def _expression(self, path):
+        if '__' not in path:
+            return F(path)
+        relation, attribute = path.split('__', 1)
+        field = self.model._meta.get_field(relation)
+        return Subquery(field.related_model.objects.filter(pk=OuterRef(field.attname)).values(attribute)[:1])
+
+    def document(self):
+        """
+        The tsvector expression stored in ``search_document``.
+        """
+        vector = None
+        for path, weight in self.fields:
+            part = SearchVector(Coalesce(self._expression(path), Value(''), output_field=TextField()),
+                                weight=weight, config=CONFIG)
+            vector = part if vector is None else vector + part
+        return vector
+
+
+SPECS = {
+    Service: SearchSpec(Service, [('name', 'A'), ('category__name', 'B'), ('user__full_name', 'B'),
+                                  ('user__username', 'C'), ('description', 'D')], 'name',
+                         filter_fields=['user', 'user_id', 'category', 'category_id', 'price', 'duration']),
+    Shop: SearchSpec(Shop, [('name', 'A'), ('brand', 'B'), ('description', 'D')], 'name'),
+    Blog: SearchSpec(Blog, [('title', 'A'), ('description', 'C')], 'title'),
+}
+
+
+def is_postgresql(using='default'):
+    return connections[using].vendor == 'postgresql'
+
+
+_trigram = {}
+
+
+def has_trigram(using='default'):
+    """
+    Whether pg_trgm is installed; without it PostgreSQL search falls back to full-text matches only.
+    """
+    if using not in _trigram:
+        with connections[using].cursor() as cursor:
+            cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+            _trigram[using] = cursor.fetchone() is not None
+    return _trigram[using]
+
+
+def refresh_documents(queryset):
+    """
+    Recompute ``search_document`` of the given rows with one UPDATE. Only PostgreSQL stores documents.
+    """
+    if not is_postgresql(queryset.db):
+        return 0
+    return queryset.update(search_document=SPECS[queryset.model].document())
+
+
+def normalize_query(text):
+    """
+    Case-folded, single spaced text with the apostrophe variants of Uzbek Latin (o‘, g‘, ʼ) unified.
+    """
+    return ' '.join((text or '').casefold().translate(APOSTROPHES).split())
+
+
+def invalidate_catalog():
+    """
+    Retire every cached search result, now and again once the surrounding transaction commits.
+
+    Rows deleted since a result was cached drop out of it on their own, so only saves of
+    searched or filtered fields call this.
+    """
+    bump_version(CATALOG_VERSION)
+    transaction.on_commit(lambda: bump_version(CATALOG_VERSION))
+
+
+def search(queryset, text):
+    """
+    Rows of ``queryset`` matching ``text``, annotated with an integer ``search_rank``.
+
+    Rows are ranked within ``queryset``, so apply filters before searching. The ranked
+    ids are cached, so a repeated search costs one query by primary key. See ranked_ids.
+    """
+    text = normalize_query(text)
+    if not text:
+        return queryset
+    ranks = ranked_ids(queryset, text)
+    if is_postgresql(queryset.db):
+        ids = [pk for pk, _ in ranks]
+        return (queryset.filter(pk__in=RawSQL('SELECT unnest(%s::bigint[])', (ids,)))
+                .annotate(search_rank=RankOf(ranks)))
+    return queryset.filter(pk__in=[pk for pk, _ in ranks]).annotate(search_rank=Case(
+        *[When(pk=pk, then=Value(rank)) for pk, rank in ranks],
+        default=Value(0), output_field=IntegerField(),
+    ))
+
+
+class RankOf(Func):
+    """
+    A row's rank looked up in cached [pk, rank] pairs, which are sent as two array
+    parameters, so the statement does not grow with the number of results. PostgreSQL only.
+    """
+    output_field = IntegerField()
+
+    def __init__(self, ranks):
+        self.ranks = ranks
+        super().__init__(F('pk'))
+
+    def as_sql(self, compiler, connection, **extra_context):
+        pk, params = compiler.compile(self.source_expressions[0])
+        return (f'(%s::integer[])[array_position(%s::bigint[], {pk})]',
+                [[rank for _, rank in self.ranks], [pk for pk, _ in self.ranks], *params])
+
+
+def ranked_ids(queryset, text):
+    """
+    [pk, rank] pairs of the best SEARCH_RESULT_LIMIT rows of ``queryset`` matching the normalized ``text``.
+
+    PostgreSQL matches the weighted full-text document or a trigram similar
+    name, both served by GIN indexes. Other databases score the rows in Python.
+    Results are cached per catalog version, text and the queryset's filters; the
+    cache is skipped while it cannot be reached.
+    """
+    rows = queryset.order_by().values('pk')
+    try:
+        sql, params = rows.query.sql_with_params()
+    except EmptyResultSet:
+        return []
+    digest = hashlib.sha1(repr((text, sql, params)).encode()).hexdigest()
+    version = get_version(CATALOG_VERSION)
+    key = f'search:{queryset.model._meta.label_lower}:{version}:{digest}'
+    ranks = None
+    if version is not None:
+        with ignore_cache_errors('reading search results'):
+            ranks = cache.get(key)
+    if ranks is None:
+        rank = _rank_postgresql if is_postgresql(queryset.db) else _rank_in_process
+        ranks = rank(queryset.order_by(), SPECS[queryset.model], text)[:SEARCH_RESULT_LIMIT]
+        if version is not None:
+            with ignore_cache_errors('caching search results'):
+                cache.set(key, ranks, timeout=SEARCH_CACHE_TIMEOUT)
+    return ranks
+
+
+def _rank_postgresql(queryset, spec, text):
+    query = SearchQuery(text, search_type='websearch', config=CONFIG)
+    condition = Q(search_document=query)
+    score = Coalesce(SearchRank(F('search_document'), query), Value(0.0), output_field=FloatField())
+    if has_trigram(queryset.db):
+        condition |= Q(**{f'{spec.similar_field}__trigram_similar': text})
+        score += TrigramSimilarity(spec.similar_field, text)
+    return [list(row) for row in (queryset.filter(condition)
+                                  .annotate(search_rank=Cast(score * RANK_SCALE, IntegerField()))
+                                  .order_by('-search_rank', 'pk')
+                                  .values_list('pk', 'search_rank')[:SEARCH_RESULT_LIMIT])]
+
+
+def _score(spec, values, terms, text):
+    fields = {path: normalize_query(value) for (path, _), value in zip(spec.fields, values)}
+    matched = sum(WEIGHTS[weight] for path, weight in spec.fields for term in terms if term in fields[path])
+    similarity = difflib.SequenceMatcher(None, text, fields[spec.similar_field]).ratio()
+    if not matched and similarity < IN_PROCESS_SIMILARITY:
+        return 0
+    return matched + similarity
+
+
+def _rank_in_process(queryset, spec, text):
+    terms = text.split()
+    ranks = []
+    rows = queryset.order_by('pk').values_list('pk', *[path for path, _ in spec.fields])
+    for count, (pk, *values) in enumerate(rows[:IN_PROCESS_ROW_LIMIT + 1].iterator()):
+        if count == IN_PROCESS_ROW_LIMIT:
+            logger.warning('In-process search of %s stopped after %d rows; use PostgreSQL for larger tables.',
+                           spec.model._meta.label, IN_PROCESS_ROW_LIMIT)
+            break
+        score = _score(spec, values, terms, text)
+        if score:
+            ranks.append([pk, int(score * RANK_SCALE)])
+    return sorted(ranks, key=lambda row: (-row[1], row[0]))
+
+
+class RankedSearchFilter(SearchFilter):
+    """
+    ``?search=`` over the model's SearchSpec, ordered by relevance by CatalogCursorPagination.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        text = ' '.join(self.get_search_terms(request))
+        return search(queryset, text) if text else queryset
+
+
+DOCUMENT_INDEX = 'CREATE INDEX IF NOT EXISTS {table}_search_document_gin ON {table} USING gin (search_document)'
+TRIGRAM_INDEX = 'CREATE INDEX IF NOT EXISTS {table}_{field}_trgm ON {table} USING gin ({field} gin_trgm_ops)'
+
+
+def install_postgresql_search(using='default', **kwargs):
+    """
+    post_migrate hook: create pg_trgm where available, the GIN indexes and the missing documents.
+
+    Migrations are generated per deployment, so this PostgreSQL only DDL lives here
+    instead of in a migration. Every statement is idempotent.
+    """
+    if not is_postgresql(using):
+        return
+    with connections[using].cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+        if cursor.fetchone():
+            cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        else:
+            logger.warning('pg_trgm is not available, search will not match misspelled names.')
+        _trigram.pop(using, None)
+        statements = [DOCUMENT_INDEX] + ([TRIGRAM_INDEX] if has_trigram(using) else [])
+        for model, spec in SPECS.items():
+            for statement in statements:
+                cursor.execute(statement.format(table=model._meta.db_table,
+                                                field=model._meta.get_field(spec.similar_field).column))
+    for model in SPECS:
+        refresh_documents(model.objects.using(using).filter(search_document__isnull=True))
@@ -1,16 +1,23 @@
-from datetime import datetime, timedelta
+from datetime import timedelta
 
-from django.core.mail import send_mail, EmailMultiAlternatives
-from django.template.loader import render_to_string
+from django.db import transaction
+from django.db.models import F
 from django.utils import timezone
-from django.utils.html import strip_tags
+from drf_yasg.utils import swagger_serializer_method
 from rest_framework import serializers
 from rest_framework.exceptions import PermissionDenied
 from rest_framework.fields import HiddenField, CurrentUserDefault
 
-from beauty.models.booking import Time, Booking, WorkingDays
-from beauty.models.region import Address
+from beauty.availability import (AvailabilityEngine, invalidate_master_days, time_to_minutes, batched_invalidation,
+                                 invalidate_master)
+from beauty.holds import acquire_hold, get_hold, release_hold
+from beauty.locks import lock_master_days
+from beauty.models.booking import Time, Booking, WorkingDays, MasterDailyStats
+from beauty.models.outbox import EmailOutbox
 from beauty.models.service import Service
+from beauty.serializers.fields import HourMinuteDurationField
+from beauty.serializers.region import AddressSerializer as BaseAddressSerializer
+from beauty.stats import apply_deltas, contributions, difference
 from beauty.serializers.service import ServiceModelSerializer
 from root import settings
 from users.models import User
@@ -23,12 +30,63 @@ class WorkingDaySerializer(serializers.ModelSerializer):
         fields = ('id', 'day')
 
 
+class WorkingDayField(serializers.PrimaryKeyRelatedField):
+    """
+    Looks the seven working days up with one query per serializer instead of one per value.
+    """
+
+    def to_internal_value(self, data):
+        if not hasattr(self, '_days'):
+            self._days = self.get_queryset().in_bulk()
+        try:
+            day = self._days.get(int(data))
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        if day is None:
+            self.fail('does_not_exist', pk_value=data)
+        return day
+
+
+class TimeListSerializer(serializers.ListSerializer):
+    def validate(self, attrs):
+        windows = list(attrs)
+        if attrs and not self.context.get('replace'):
+            # New windows are added to the week, so they must not overlap the stored ones either.
+            windows += [{'day': time.day, 'start_time': time.start_time, 'end_time': time.end_time}
+                        for time in Time.objects.filter(user=attrs[0]['user']).select_related('day')]
+        windows.sort(key=lambda item: (item['day'].id, item['start_time']))
+        for previous, current in zip(windows, windows[1:]):
+            if previous['day'] == current['day'] and current['start_time'] < previous['end_time']:
+                raise serializers.ValidationError(
+                    f"Working hours {previous['start_time']:%H:%M}-{previous['end_time']:%H:%M} and "
+                    f"{current['start_time']:%H:%M}-{current['end_time']:%H:%M} on {current['day']} overlap")
+        return attrs
+
+    def create(self, validated_data):
+        times = Time.objects.bulk_create([Time(**attrs) for attrs in validated_data])
+        for master_id in {time.user_id for time in times}:
+            invalidate_master(master_id)
+        return times
+
+    @transaction.atomic
+    def replace(self, user):
+        """
+        Make the validated list the user's whole week: one delete and one insert, one cache invalidation.
+        """
+        with batched_invalidation():
+            Time.objects.filter(user=user).delete()
+            self.instance = self.create(self.validated_data)
+        return self.instance
+
+
 class TimeSerializer(serializers.ModelSerializer):
+    day = WorkingDayField(queryset=WorkingDays.objects.all())
     user = HiddenField(default=CurrentUserDefault())
 
     class Meta:
         model = Time
         fields = ('id', 'day', 'start_time', 'end_time', 'user')
+        list_serializer_class = TimeListSerializer
 
     def validate(self, attrs):
         day = attrs.get('day')
@@ -64,76 +122,131 @@ class MasterFreeTimeSerializer(serializers.Serializer):
         if not service_ids:
             raise serializers.ValidationError("No service id provided")
 
-        for service_id in service_ids:
-            try:
-                Service.objects.get(id=service_id)
-            except Service.DoesNotExist:
-                raise serializers.ValidationError(f"Service with ID {service_id} not found")
-
-        day_index = date.weekday()
-        days = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
-        day = days[day_index]
+        engine = AvailabilityEngine.from_service_ids(service_ids)
+        missing_ids = engine.missing_service_ids(service_ids)
+        if missing_ids:
+            raise serializers.ValidationError(f"Service with ID {missing_ids[0]} not found")
 
-        for service_id in service_ids:
-            service = Service.objects.get(id=service_id)
-            master_working_time = Time.objects.filter(user=service.user, day=day_index)
+        if not engine.is_working_day(date):
+            raise serializers.ValidationError("The requested date is not a working day for the master")
 
-            if not master_working_time.exists():
-                raise serializers.ValidationError("The requested date is not a working day for the master")
+        self.engine = engine
         return attrs
 
     def get_free_times(self):
-        date = self.validated_data['date']
-        service_ids = self.validated_data['service_ids']
-        day_index = date.weekday()
-        total_duration = timedelta()
+        return self.engine.free_slots(self.validated_data['date'])
+
 
-        for service_id in service_ids:
-            service = Service.objects.get(id=service_id)
-            hours, minutes = map(int, service.duration.split(":"))
-            total_duration += timedelta(hours=hours, minutes=minutes)
+class MasterFreeTimeRangeSerializer(serializers.Serializer):
+    MAX_DAYS = 31
 
-        time_slots = []
-        for service_id in service_ids:
-            service = Service.objects.get(id=service_id)
-            time_slots.extend(service.user.time_user.filter(day=day_index))
+    date_from = serializers.DateField()
+    date_to = serializers.DateField()
+    service_ids = serializers.ListField(child=serializers.IntegerField())
+
+    def validate(self, attrs):
+        date_from = attrs.get('date_from')
+        date_to = attrs.get('date_to')
+        service_ids = attrs.get('service_ids')
+
+        if date_from < timezone.now().date():
+            raise serializers.ValidationError("The date cannot be in the past")
+        if date_to < date_from:
+            raise serializers.ValidationError("The end date must not be before the start date")
+        if (date_to - date_from).days >= self.MAX_DAYS:
+            raise serializers.ValidationError(f"The date range cannot be longer than {self.MAX_DAYS} days")
+
+        if not service_ids:
+            raise serializers.ValidationError("No service id provided")
+
+        engine = AvailabilityEngine.from_service_ids(service_ids)
+        missing_ids = engine.missing_service_ids(service_ids)
+        if missing_ids:
+            raise serializers.ValidationError(f"Service with ID {missing_ids[0]} not found")
+
+        self.engine = engine
+        return attrs
+
+    def get_days(self):
+        date_from = self.validated_data['date_from']
+        dates = [date_from + timedelta(days=i) for i in range((self.validated_data['date_to'] - date_from).days + 1)]
+        self.engine.day_bitmaps(dates)
+
+        days = []
+        for date in dates:
+            free_times = self.engine.free_slots(date) if self.engine.is_working_day(date) else []
+            days.append({'date': date, 'available': bool(free_times), 'free_times': free_times})
+        return days
+
+
+class SlotHoldSerializer(serializers.Serializer):
+    """
+    Reserve a slot for a few minutes while the customer completes the booking.
+    """
+    date = serializers.DateField()
+    time = serializers.TimeField()
+    service_ids = serializers.ListField(child=serializers.IntegerField(), allow_empty=False)
+    token = serializers.CharField(read_only=True)
+    expires_in = serializers.IntegerField(read_only=True)
+
+    def validate(self, attrs):
+        date = attrs.get('date')
+        time = attrs.get('time')
+        service_ids = attrs.get('service_ids')
 
-        bookings = Booking.objects.filter(date=date)
+        if date < timezone.now().date() or (date == timezone.now().date() and time < timezone.now().time()):
+            raise serializers.ValidationError("The time cannot be in the past")
 
-        booked_times = set()
+        engine = AvailabilityEngine.from_service_ids(service_ids)
+        missing_ids = engine.missing_service_ids(service_ids)
+        if missing_ids:
+            raise serializers.ValidationError(f"Service with ID {missing_ids[0]} not found")
 
-        for booking in bookings:
-            booked_times.add(booking.time)
+        # Cached free time already excludes bookings and other holds, so a slot
+        # taken since the customer loaded the list is refused without touching the database.
+        if not engine.is_free(date, time):
+            raise serializers.ValidationError("The requested time is no longer available")
 
-        free_times = set()
+        self.engine = engine
+        return attrs
 
-        for time_slot in time_slots:
-            start_time = datetime.strptime(time_slot.start_time, "%H:%M").time()
-            end_time = datetime.strptime(time_slot.end_time, "%H:%M").time()
-            start = datetime.combine(date, start_time)
-            end = datetime.combine(date, end_time)
-            num_intervals = int((end - start) / total_duration)
+    def create(self, validated_data):
+        start = time_to_minutes(validated_data['time'])
+        hold = acquire_hold(self.context['request'].user.id, self.engine.master_ids, validated_data['date'], start,
+                            start + self.engine.duration)
+        if hold is None:
+            raise serializers.ValidationError("The requested time is no longer available")
+        return {**validated_data, 'token': hold['token'],
+                'expires_in': int(hold['expires'] - timezone.now().timestamp())}
 
-            for i in range(num_intervals):
-                interval_start = start + i * total_duration
-                interval_end = interval_start + total_duration
 
-                interval_start_time = interval_start.time().strftime("%H:%M")
-                if interval_start_time not in booked_times:
-                    free_times.add(interval_start_time)
+class BookingListSerializer(serializers.ListSerializer):
+    @transaction.atomic
+    def create(self, validated_data):
+        lock_master_days((service.user_id, attrs['date']) for attrs in validated_data for service in attrs['services'])
 
-        free_times_list = sorted(list(free_times))
+        bookings, errors = [], []
+        for attrs in validated_data:
+            try:
+                bookings.append(self.child.create(attrs))
+                errors.append({})
+            except serializers.ValidationError as exc:
+                errors.append(serializers.as_serializer_error(exc))
 
-        return free_times_list
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        return bookings
 
 
 class BookingSerializer(serializers.ModelSerializer):
     user = serializers.HiddenField(default=serializers.CurrentUserDefault())
     service_ids = serializers.ListField(child=serializers.IntegerField(), write_only=True)
+    hold = serializers.CharField(write_only=True, required=False)
 
     class Meta:
         model = Booking
-        fields = ('id', 'date', 'time', 'service_ids', 'user', 'status')
+        fields = ('id', 'date', 'time', 'service_ids', 'user', 'status', 'hold')
+        list_serializer_class = BookingListSerializer
 
     def validate(self, attrs):
         date = attrs.get('date')
@@ -147,25 +260,34 @@ class BookingSerializer(serializers.ModelSerializer):
         if not all(isinstance(service_id, int) for service_id in service_ids):
             raise serializers.ValidationError({"service_ids": ["All service IDs must be integers"]})
 
-        services = Service.objects.filter(pk__in=service_ids)
+        services = list(Service.objects.filter(pk__in=service_ids))
 
         if len(services) != len(service_ids):
             raise serializers.ValidationError({"service_ids": ["One or more services do not exist"]})
 
-        if Booking.objects.filter(date=date, time=time, service__in=services).exists():
-            raise serializers.ValidationError("The requested date, time, and service combination is already booked")
-
         if date < current_date:
             raise serializers.ValidationError("The date cannot be in the past")
-        if date == current_date and datetime.strptime(time, "%H:%M").time() < current_time:
+        if date == current_date and time < current_time:
             raise serializers.ValidationError("The time cannot be in the past")
 
-        day_index = date.weekday()
-        for service in services:
-            master_working_time = Time.objects.filter(user=service.user, day=day_index)
-            if not master_working_time.exists():
-                raise serializers.ValidationError("The requested date is not a working day for the master")
+        engine = AvailabilityEngine(services)
+        if not engine.has_working_hours(date):
+            raise serializers.ValidationError("The requested date is not a working day for the master")
+        if not engine.fits_working_hours(date, time):
+            raise serializers.ValidationError("The requested time does not fit into the master's working hours")
+
+        token = attrs.get('hold')
+        hold = get_hold(token) if token else None
+        if hold and (hold['user_id'] != attrs['user'].id or hold['date'] != date
+                     or hold['start'] != time_to_minutes(time) or hold['master_ids'] != engine.master_ids):
+            raise serializers.ValidationError({"hold": ["The hold does not match the requested booking"]})
+        if engine.is_held(date, time, token, attrs['user'].id):
+            raise serializers.ValidationError("The requested time is held by another customer")
+
+        if engine.is_booked(date, time):
+            raise serializers.ValidationError("The requested date, time, and service combination is already booked")
 
+        attrs['services'] = services
         return attrs
 
     def to_representation(self, instance):
@@ -173,14 +295,29 @@ class BookingSerializer(serializers.ModelSerializer):
         representation['service'] = ServiceModelSerializer(instance.service.all(), many=True).data
         return representation
 
+    @transaction.atomic
     def create(self, validated_data):
-        service_ids = validated_data.pop('service_ids', [])
-        booking = Booking.objects.create(**validated_data)
-
-        for service_id in service_ids:
-            service = Service.objects.get(pk=service_id)
-            booking.service.add(service)
+        validated_data.pop('service_ids', None)
+        services = validated_data.pop('services')
+        token = validated_data.pop('hold', None)
+
+        # Validation ran without locks; repeat the overlap check while holding the
+        # masters' lock for this date so that concurrent requests cannot both win.
+        engine = AvailabilityEngine(services)
+        lock_master_days((master_id, validated_data['date']) for master_id in engine.master_ids)
+        if engine.is_booked(validated_data['date'], validated_data['time']):
+            raise serializers.ValidationError("The requested date, time, and service combination is already booked")
 
+        booking = Booking.objects.create(**validated_data)
+        Booking.service.through.objects.bulk_create(
+            [Booking.service.through(booking=booking, service=service) for service in services]
+        )
+        # bulk_create skips m2m_changed, so the signals see neither of these.
+        invalidate_master_days(engine.master_ids, [booking.date])
+        apply_deltas(contributions((booking.id, booking.date, booking.status, service.user_id, service.price)
+                                   for service in services))
+        if token:
+            transaction.on_commit(lambda: release_hold(token))
         return booking
 
 
@@ -198,24 +335,19 @@ class BookingUpdateSerializer(serializers.ModelSerializer):
         return attrs
 
     @staticmethod
-    def send_booking_status_email(instance):
-        print("send_booking_status_email method has been called")
+    def build_booking_status_email(instance):
         user = instance.user
-        subject = f"Booking {instance.status.capitalize()}"
-        html_content = render_to_string('booking_email_template.html',
-                                        {'status': instance.status, 'user': user, 'booking_status': instance.status})
-        text_content = strip_tags(html_content)
-        from_email = f"AURA TEAM <{settings.EMAIL_HOST_USER}>"
-        email = EmailMultiAlternatives(
-            subject=subject,
-            body=text_content,
-            from_email=from_email,
-            to=[user.email]
+        return EmailOutbox.build(
+            subject=f"Booking {instance.status.capitalize()}",
+            template_name='booking_email_template.html',
+            context={'status': instance.status, 'user': user, 'booking_status': instance.status},
+            to=[user.email],
+            from_email=f"AURA TEAM <{settings.EMAIL_HOST_USER}>",
         )
-        email.attach_alternative(html_content, "text/html")
-        print("Sending email...")
-        email.send()
-        print("Email sent.")
+
+    @classmethod
+    def send_booking_status_email(cls, instance):
+        cls.build_booking_status_email(instance).save()
 
     def update(self, instance, validated_data):
         instance = super().update(instance, validated_data)
@@ -232,27 +364,91 @@ class BookingUpdateSerializer(serializers.ModelSerializer):
     #     return super().update(instance, validated_data)
 
 
+class BookingBulkStatusSerializer(serializers.Serializer):
+    MAX_BOOKINGS = 500
+
+    booking_ids = serializers.ListField(child=serializers.IntegerField(), allow_empty=False, max_length=MAX_BOOKINGS)
+    status = serializers.ChoiceField(choices=Booking.StatusChoices.choices)
+
+    @transaction.atomic
+    def save(self, **kwargs):
+        """
+        Move the request master's bookings to the new status with one UPDATE and queue
+        the emails in one INSERT. Either every booking belongs to the master or none is changed.
+        """
+        booking_ids = set(self.validated_data['booking_ids'])
+        status = self.validated_data['status']
+        master = self.context['request'].user
+
+        # One row per booking service: the bookings, their customers and all of their masters at once.
+        rows = (Booking.service.through.objects
+                .filter(booking_id__in=booking_ids)
+                .select_related('booking__user')
+                .annotate(master_id=F('service__user_id'), price=F('service__price')))
+        bookings, masters, owned, services = {}, set(), set(), []
+        for row in rows:
+            bookings[row.booking_id] = row.booking
+            masters.add(row.master_id)
+            services.append((row.booking_id, row.master_id, row.price))
+            if row.master_id == master.id:
+                owned.add(row.booking_id)
+
+        missing_ids = sorted(booking_ids - owned)
+        if missing_ids:
+            raise serializers.ValidationError({"booking_ids": [f"Booking with ID {missing_ids[0]} not found"]})
+
+        changed = [booking for booking in bookings.values() if booking.status != status]
+        before = contributions((booking_id, bookings[booking_id].date, bookings[booking_id].status, master_id, price)
+                               for booking_id, master_id, price in services)
+        Booking.objects.filter(pk__in=booking_ids).update(status=status, updated_at=timezone.now())
+        for booking in changed:
+            booking.status = status
+        after = contributions((booking_id, bookings[booking_id].date, status, master_id, price)
+                              for booking_id, master_id, price in services)
+
+        # UPDATE bypasses the model signals, so the cache and the daily stats are kept up to date here.
+        apply_deltas(difference(after, before))
+        EmailOutbox.objects.bulk_create([BookingUpdateSerializer.build_booking_status_email(booking)
+                                         for booking in changed])
+        invalidate_master_days(masters, {booking.date for booking in changed})
+        return changed
+
+
+class MasterDailyStatsSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = MasterDailyStats
+        fields = ('date', 'status', 'bookings', 'revenue')
+
+
+class MasterStatsRangeSerializer(serializers.Serializer):
+    MAX_DAYS = 366
+    DEFAULT_DAYS = 30
+
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+
+    def validate(self, attrs):
+        attrs.setdefault('date_to', timezone.now().date())
+        attrs.setdefault('date_from', attrs['date_to'] - timedelta(days=self.DEFAULT_DAYS - 1))
+        if attrs['date_to'] < attrs['date_from']:
+            raise serializers.ValidationError("The end date must not be before the start date")
+        if (attrs['date_to'] - attrs['date_from']).days >= self.MAX_DAYS:
+            raise serializers.ValidationError(f"The date range cannot be longer than {self.MAX_DAYS} days")
+        return attrs
+
+
 class ServiceSerializer(serializers.ModelSerializer):
+    duration = HourMinuteDurationField()
+
     class Meta:
         model = Service
         fields = ('id', 'name', 'duration', 'price')
 
 
-class AddressSerializer(serializers.ModelSerializer):
-    class Meta:
-        model = Address
-        fields = ('id', 'region', 'district', 'mahalla', 'house')
+class AddressSerializer(BaseAddressSerializer):
+    class Meta(BaseAddressSerializer.Meta):
         ref_name = 'BookingAddress'
 
-    def to_representation(self, instance):
-        return {
-            'id': instance.id,
-            'region': instance.region.name,
-            'district': instance.district.name,
-            'mahalla': instance.mahalla.name,
-            'house': instance.house
-        }
-
 
 class UserServiceSerializer(serializers.ModelSerializer):
     address = AddressSerializer()
@@ -263,9 +459,20 @@ class UserServiceSerializer(serializers.ModelSerializer):
 
 
 class MyBookingSerializer(serializers.ModelSerializer):
+    """
+    A booking seen by one of its sides: customers get the master, masters get the customer.
+    Expects ``service`` to be prefetched.
+    """
     service = ServiceSerializer(many=True)
-    user = UserModelSerializer(read_only=True)
+    user = serializers.SerializerMethodField()
 
     class Meta:
         model = Booking
         fields = ('id', 'date', 'time', 'service', 'status', 'user')
+
+    @swagger_serializer_method(serializer_or_field=UserServiceSerializer)
+    def get_user(self, obj):
+        if obj.user_id != self.context['request'].user.id:
+            return UserServiceSerializer(obj.user).data
+        services = obj.service.all()
+        return UserServiceSerializer(services[0].user).data if services else None
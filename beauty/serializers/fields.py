@@ -0,0 +1,39 @@
+import re
+from datetime import timedelta
+
+from django.utils.dateparse import parse_duration
+from rest_framework import serializers
+
+HOUR_MINUTE_RE = re.compile(r'^(?P<hours>\d{1,3}):(?P<minutes>[0-5]\d)$')
+
+
+def parse_hour_minute_duration(value):
+    """
+    Parse "HH:MM" as hours and minutes; anything else falls back to Django's duration formats.
+    """
+    match = HOUR_MINUTE_RE.match(str(value).strip())
+    if match:
+        return timedelta(hours=int(match['hours']), minutes=int(match['minutes']))
+    return parse_duration(str(value).strip())
+
+
+def format_hour_minute_duration(value):
+    minutes = int(value.total_seconds() // 60)
+    return f'{minutes // 60:02d}:{minutes % 60:02d}'
+
+
+class HourMinuteDurationField(serializers.DurationField):
+    """
+    Duration rendered and accepted as "HH:MM", the format used before durations were stored natively.
+    """
+
+    def to_internal_value(self, value):
+        if isinstance(value, timedelta):
+            return value
+        parsed = parse_hour_minute_duration(value)
+        if parsed is None:
+            self.fail('invalid', format='HH:MM')
+        return super().to_internal_value(parsed)
+
+    def to_representation(self, value):
+        return format_hour_minute_duration(value)
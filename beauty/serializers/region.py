@@ -1,6 +1,7 @@
 from rest_framework import serializers
 from rest_framework.serializers import ModelSerializer
 
+from beauty.geography import get_index
 from beauty.models.region import Region, District, Address, Mahalla
 
 
@@ -23,15 +24,32 @@ class MahallaModelSerializer(ModelSerializer):
 
 
 class AddressSerializer(ModelSerializer):
+    """
+    Names and parent/child consistency come from the in-memory GeographyIndex, so neither
+    rendering nor validating an address queries the geography tables.
+    """
+    region = serializers.IntegerField(source='region_id')
+    district = serializers.IntegerField(source='district_id')
+    mahalla = serializers.IntegerField(source='mahalla_id')
+
     class Meta:
         model = Address
         fields = ('id', 'region', 'district', 'mahalla', 'house')
 
+    def validate(self, attrs):
+        ids = (attrs['region_id'], attrs['district_id'], attrs['mahalla_id'])
+        errors = get_index(require=ids).address_errors(*ids)
+        if errors:
+            raise serializers.ValidationError(errors)
+        return attrs
+
     def to_representation(self, instance):
+        ids = (instance.region_id, instance.district_id, instance.mahalla_id)
+        index = get_index(require=ids)
         return {
             "id": instance.id,
-            "region": instance.region.name,
-            "district": instance.district.name,
-            "mahalla": instance.mahalla.name,
+            "region": index.regions.name(instance.region_id),
+            "district": index.districts.name(instance.district_id),
+            "mahalla": index.mahallas.name(instance.mahalla_id),
             "house": instance.house
         }
@@ -1,8 +1,8 @@
 from rest_framework import serializers
 from rest_framework.serializers import ModelSerializer
 
-from beauty.models.favorite import Favorite, Saved, ShopFavorite
 from beauty.models.service import Category, Service, Blog, Shop
+from beauty.serializers.fields import HourMinuteDurationField
 from users.serializers import UserServiceModelSerializer
 
 
@@ -15,6 +15,7 @@ class CategoryModelSerializer(ModelSerializer):
 class ServiceModelSerializer(ModelSerializer):
     user = serializers.HiddenField(default=serializers.CurrentUserDefault())
     image = serializers.ImageField(required=False)
+    duration = HourMinuteDurationField()
 
     class Meta:
         model = Service
@@ -28,11 +29,15 @@ class ServiceModelSerializer(ModelSerializer):
 
 
 class ServiceListSerializer(ModelSerializer):
+    """
+    Expects a queryset built with ``Service.objects.for_listing(user)``.
+    """
     user = UserServiceModelSerializer()
-    favorites_count = serializers.SerializerMethodField()
+    duration = HourMinuteDurationField()
+    favorites_count = serializers.IntegerField(read_only=True)
 
-    is_like = serializers.SerializerMethodField()
-    is_saved = serializers.SerializerMethodField()
+    is_like = serializers.BooleanField(read_only=True)
+    is_saved = serializers.BooleanField(read_only=True)
 
     class Meta:
         model = Service
@@ -40,32 +45,14 @@ class ServiceListSerializer(ModelSerializer):
             'id', 'name', 'price', "image", 'category', 'duration', 'description', 'user', 'favorites_count', 'is_like',
             'is_saved')
 
-    def get_favorites_count(self, obj):
-        return Favorite.objects.filter(service=obj).count()
-
-    def get_is_like(self, obj):
-        user = self.context['request'].user
-        if user.is_authenticated:
-            return Favorite.objects.filter(service=obj, user=user).exists()
-        return False
-
-    def get_is_saved(self, obj):
-        user = self.context['request'].user
-        if user.is_authenticated:
-            return Saved.objects.filter(service=obj, user=user).exists()
-        return False
-
 
 class ShopModelSerializer(ModelSerializer):
-    like_count = serializers.SerializerMethodField()
+    like_count = serializers.IntegerField(source='favorites_count', read_only=True)
 
     class Meta:
         model = Shop
         fields = ('id', 'name', 'price', 'image', 'like_count', 'view', 'brand', 'discount')
 
-    def get_like_count(self, obj):
-        return ShopFavorite.objects.filter(product=obj).count()
-
 
 
 class ShopDetailModelSerializer(serializers.ModelSerializer):
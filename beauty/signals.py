@@ -0,0 +1,231 @@
+from django.db.models.signals import post_save, post_delete, pre_delete, m2m_changed, pre_save, post_init
+from django.dispatch import receiver
+
+from beauty.availability import invalidate_master, invalidate_master_days
+from beauty.calendar import calendar_changed
+from beauty.geography import BUNDLE_MODELS, expire_index
+from beauty.models.about import About, AboutImage, Faq
+from beauty.models.booking import Booking, Time
+from beauty.models.region import District, Mahalla, Region
+from beauty.models.service import Blog, Category, Service, Shop
+from beauty.response_cache import invalidate_responses
+from beauty.search import SPECS, invalidate_catalog, refresh_documents
+from beauty.stats import apply_deltas, booking_contributions, difference, negate
+from beauty.suggest import invalidate_suggestions
+from users.models import User
+
+
+MASTER_FIELDS = ('full_name', 'username', 'is_master')
+
+# Fields whose saved value is remembered on load, so that save receivers can tell
+# what changed without reading the old row back.
+TRACKED_FIELDS = {
+    Service: ('name', 'duration', 'user_id'),
+    Booking: ('date', 'status'),
+    User: MASTER_FIELDS,
+}
+
+
+def _tracked_values(instance):
+    # Read from __dict__ so that deferred fields are not loaded.
+    return {field: instance.__dict__.get(field) for field in TRACKED_FIELDS[type(instance)]}
+
+
+@receiver(post_init, sender=Service)
+@receiver(post_init, sender=Booking)
+@receiver(post_init, sender=User)
+def tracked_loaded(sender, instance, **kwargs):
+    instance._saved_values = _tracked_values(instance)
+
+
+@receiver(pre_save, sender=Service)
+@receiver(pre_save, sender=Booking)
+@receiver(pre_save, sender=User)
+def tracked_saving(sender, instance, **kwargs):
+    instance._values_before = instance.__dict__.get('_saved_values') or {}
+    instance._saved_values = _tracked_values(instance)
+
+
+def _previous_values(instance):
+    """
+    TRACKED_FIELDS values of the instance when it was loaded or last saved.
+    """
+    return instance.__dict__.get('_values_before') or {}
+
+
+def _changed_fields(instance):
+    """
+    Names of TRACKED_FIELDS whose saved value changed, compared to when the instance was loaded or last saved.
+    """
+    before = _previous_values(instance)
+    return {field for field, value in _tracked_values(instance).items() if field in before and before[field] != value}
+
+
+@receiver([post_save, post_delete], sender=Time)
+def time_changed(sender, instance, **kwargs):
+    invalidate_master(instance.user_id)
+
+
+@receiver(pre_save, sender=Service)
+def service_duration_changed(sender, instance, **kwargs):
+    if instance.pk is not None and _changed_fields(instance) & {'duration', 'user_id'}:
+        invalidate_master(_previous_values(instance)['user_id'] or instance.user_id)
+
+
+@receiver(pre_save, sender=Booking)
+def booking_rescheduled(sender, instance, **kwargs):
+    if instance.pk is None:
+        return
+    changed = _changed_fields(instance)
+    if 'date' in changed:
+        invalidate_master_days(_booking_masters(instance), [_previous_values(instance)['date']])
+    if changed & {'date', 'status'}:
+        instance._daily_stats_before = booking_contributions([instance.pk])
+
+
+@receiver(post_save, sender=Booking)
+def booking_saved(sender, instance, created, **kwargs):
+    if not created:
+        invalidate_master_days(_booking_masters(instance), [instance.date])
+    before = instance.__dict__.pop('_daily_stats_before', None)
+    if before is not None:
+        apply_deltas(difference(booking_contributions([instance.pk]), before))
+
+
+@receiver(pre_delete, sender=Booking)
+def booking_deleted(sender, instance, **kwargs):
+    invalidate_master_days(_booking_masters(instance), [instance.date])
+    apply_deltas(negate(booking_contributions([instance.pk])))
+
+
+@receiver(m2m_changed, sender=Booking.service.through)
+def booking_services_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse or action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if action == 'pre_clear':
+        master_ids = _booking_masters(instance)
+    else:
+        master_ids = set(Service.objects.filter(pk__in=pk_set).values_list('user_id', flat=True))
+    invalidate_master_days(master_ids, [instance.date])
+
+
+@receiver(m2m_changed, sender=Booking.service.through)
+def booking_services_stats(sender, instance, action, reverse, pk_set, **kwargs):
+    if action.startswith('pre_'):
+        if reverse:
+            booking_ids = pk_set if pk_set is not None else list(instance.booking.values_list('pk', flat=True))
+        else:
+            booking_ids = [instance.pk]
+        instance._daily_stats_before = (booking_ids, booking_contributions(booking_ids))
+    else:
+        booking_ids, before = instance.__dict__.pop('_daily_stats_before', ([], {}))
+        if booking_ids:
+            apply_deltas(difference(booking_contributions(booking_ids), before))
+
+
+@receiver(post_save, sender=Service)
+def calendar_service_changed(sender, instance, created, **kwargs):
+    if not created and _changed_fields(instance) & {'name', 'duration', 'user_id'}:
+        calendar_changed({_previous_values(instance)['user_id'] or instance.user_id, instance.user_id})
+
+
+@receiver(post_delete, sender=Service)
+def calendar_service_deleted(sender, instance, **kwargs):
+    calendar_changed([instance.user_id])
+
+
+@receiver(m2m_changed, sender=Booking.service.through)
+def calendar_booking_services_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if reverse:
+        calendar_changed([instance.user_id])
+    elif action == 'pre_clear':
+        calendar_changed(_booking_masters(instance))
+    else:
+        calendar_changed(Service.objects.filter(pk__in=pk_set).values_list('user_id', flat=True))
+
+
+@receiver(post_save, sender=User)
+def calendar_customer_renamed(sender, instance, created, **kwargs):
+    if not created and 'full_name' in _changed_fields(instance):
+        calendar_changed(Service.objects.filter(booking__user=instance).values_list('user_id', flat=True).distinct())
+
+
+@receiver(post_save, sender=Service)
+@receiver(post_save, sender=Shop)
+@receiver(post_save, sender=Blog)
+def search_document_changed(sender, instance, update_fields=None, **kwargs):
+    spec = SPECS[sender]
+    searched = [path for path, _ in spec.fields if '__' not in path]
+    if _touches(update_fields, searched):
+        refresh_documents(sender.objects.filter(pk=instance.pk))
+    if _touches(update_fields, [*searched, *spec.filter_fields]):
+        invalidate_catalog()
+
+
+@receiver(post_save, sender=Category)
+def category_renamed(sender, instance, created, update_fields=None, **kwargs):
+    if not created and _touches(update_fields, ['name']):
+        refresh_documents(Service.objects.filter(category_id=instance.pk))
+        invalidate_catalog()
+
+
+@receiver(post_save, sender=User)
+def master_renamed(sender, instance, created, **kwargs):
+    if not created and instance.is_master and _changed_fields(instance) & {'full_name', 'username'}:
+        refresh_documents(Service.objects.filter(user_id=instance.pk))
+        invalidate_catalog()
+
+
+@receiver([post_save, post_delete], sender=Service)
+@receiver([post_save, post_delete], sender=Category)
+def suggested_name_changed(sender, instance, update_fields=None, **kwargs):
+    if _touches(update_fields, ['name']):
+        invalidate_suggestions()
+
+
+@receiver([post_save, post_delete], sender=Shop)
+def suggested_brand_changed(sender, instance, update_fields=None, **kwargs):
+    if _touches(update_fields, ['brand']):
+        invalidate_suggestions()
+
+
+@receiver(post_save, sender=User)
+def suggested_master_changed(sender, instance, created, **kwargs):
+    changed = _changed_fields(instance)
+    if 'is_master' in changed or (instance.is_master and (created or 'full_name' in changed)):
+        invalidate_suggestions()
+
+
+@receiver(post_delete, sender=User)
+def suggested_master_deleted(sender, instance, **kwargs):
+    if instance.is_master:
+        invalidate_suggestions()
+
+
+@receiver([post_save, post_delete], sender=Category)
+@receiver([post_save, post_delete], sender=Region)
+@receiver([post_save, post_delete], sender=District)
+@receiver([post_save, post_delete], sender=Mahalla)
+@receiver([post_save, post_delete], sender=Faq)
+@receiver([post_save, post_delete], sender=About)
+@receiver([post_save, post_delete], sender=AboutImage)
+def reference_data_changed(sender, **kwargs):
+    invalidate_responses(sender)
+    if sender in BUNDLE_MODELS:
+        expire_index()
+
+
+@receiver(m2m_changed, sender=About.image.through)
+def about_images_changed(sender, action, **kwargs):
+    if action.startswith('post_'):
+        invalidate_responses(About)
+
+
+def _touches(update_fields, fields):
+    return update_fields is None or not update_fields.isdisjoint(fields)
+
+
+def _booking_masters(booking):
+    return set(booking.service.values_list('user_id', flat=True))
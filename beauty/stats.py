@@ -0,0 +1,100 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import connection
+from django.db.models import Count, Sum
+
+from beauty.models.booking import Booking, MasterDailyStats
+
+
+def contributions(rows):
+    """
+    Per (master_id, date, status) booking count and revenue of (booking_id, date, status, master_id, price) rows.
+
+    A booking counts once per master however many of the master's services it has.
+    """
+    bookings, revenue = defaultdict(set), defaultdict(Decimal)
+    for booking_id, date, status, master_id, price in rows:
+        bookings[master_id, date, status].add(booking_id)
+        revenue[master_id, date, status] += price
+    return {key: (len(booking_ids), revenue[key]) for key, booking_ids in bookings.items()}
+
+
+def booking_contributions(booking_ids):
+    """
+    Current contributions of the given bookings, read in one query.
+    """
+    rows = (Booking.service.through.objects
+            .filter(booking_id__in=booking_ids)
+            .values_list('booking_id', 'booking__date', 'booking__status', 'service__user_id', 'service__price'))
+    return contributions(rows)
+
+
+def difference(after, before):
+    deltas = {}
+    for key in set(after) | set(before):
+        count = after.get(key, (0, 0))[0] - before.get(key, (0, 0))[0]
+        revenue = after.get(key, (0, 0))[1] - before.get(key, (0, 0))[1]
+        if count or revenue:
+            deltas[key] = (count, revenue)
+    return deltas
+
+
+def negate(values):
+    return {key: (-count, -revenue) for key, (count, revenue) in values.items()}
+
+
+def apply_deltas(deltas):
+    """
+    Add the deltas to the daily rows with a single INSERT ... ON CONFLICT DO UPDATE.
+
+    Both PostgreSQL and SQLite support the statement; the increment happens in the
+    database, so concurrent writers never lose each other's updates.
+    """
+    if not deltas:
+        return
+    meta = MasterDailyStats._meta
+    table = connection.ops.quote_name(meta.db_table)
+    columns = [connection.ops.quote_name(meta.get_field(name).column)
+               for name in ('master', 'date', 'status', 'bookings', 'revenue')]
+    placeholders = ', '.join(['(%s, %s, %s, %s, %s)'] * len(deltas))
+    params = []
+    for (master_id, date, status), (count, revenue) in sorted(deltas.items()):
+        params += [master_id, connection.ops.adapt_datefield_value(date), status, count,
+                   connection.ops.adapt_decimalfield_value(revenue, 12, 2)]
+    master, date, status, bookings, revenue = columns
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} ({", ".join(columns)}) VALUES {placeholders} '
+            f'ON CONFLICT ({master}, {date}, {status}) DO UPDATE SET '
+            f'{bookings} = {table}.{bookings} + EXCLUDED.{bookings}, '
+            f'{revenue} = {table}.{revenue} + EXCLUDED.{revenue}',
+            params,
+        )
+
+
+def rebuild(date_from=None, date_to=None, master_ids=None):
+    """
+    Recompute the daily rows from the bookings; returns the number of rows written.
+    """
+    stats = MasterDailyStats.objects.all()
+    rows = Booking.service.through.objects.all()
+    if date_from:
+        stats, rows = stats.filter(date__gte=date_from), rows.filter(booking__date__gte=date_from)
+    if date_to:
+        stats, rows = stats.filter(date__lte=date_to), rows.filter(booking__date__lte=date_to)
+    if master_ids:
+        stats, rows = stats.filter(master_id__in=master_ids), rows.filter(service__user_id__in=master_ids)
+
+    aggregates = (rows
+                  .values('service__user_id', 'booking__date', 'booking__status')
+                  .annotate(bookings=Count('booking_id', distinct=True), revenue=Sum('service__price'))
+                  .order_by())
+    stats.delete()
+    created = MasterDailyStats.objects.bulk_create(
+        (MasterDailyStats(master_id=row['service__user_id'], date=row['booking__date'], status=row['booking__status'],
+                          bookings=row['bookings'], revenue=row['revenue'])
+         for row in aggregates.iterator()),
+        batch_size=1000,
+    )
+    return len(created)
@@ -0,0 +1,129 @@
+import bisect
+import logging
+import threading
+import time
+
+from django.db import DatabaseError, transaction
+
+from beauty.cache import get_version, bump_version
+from beauty.models.service import Category, Service, Shop
+from users.models import User
+
+logger = logging.getLogger(__name__)
+
+VERSION_NAME = 'suggest'
+# How long a process answers from its index before looking at the shared version again.
+VERSION_CHECK_INTERVAL = 5
+MAX_SUGGESTIONS = 10
+
+
+def normalize(text):
+    return ' '.join((text or '').casefold().split())
+
+
+class PrefixIndex:
+    """
+    Typeahead over short labels: a sorted array with one key per word start of
+    every label, so that "cut" finds "Hair cut". A lookup is a bisect plus a
+    scan over the keys sharing the prefix. Entries with an id are kept one per
+    id, so namesakes stay apart; entries without one are kept one per label.
+    """
+
+    def __init__(self, entries):
+        self.entries = []
+        keys, seen = [], set()
+        for kind, text, pk in entries:
+            label = normalize(text)
+            identity = (kind, label) if pk is None else (kind, pk)
+            if not label or identity in seen:
+                continue
+            seen.add(identity)
+            words = label.split(' ')
+            keys += [(' '.join(words[i:]), len(self.entries)) for i in range(len(words))]
+            self.entries.append({'type': kind, 'text': text.strip(), 'id': pk})
+        keys.sort()
+        self.keys = [key for key, _ in keys]
+        self.positions = [position for _, position in keys]
+
+    def __len__(self):
+        return len(self.entries)
+
+    def lookup(self, prefix, limit=MAX_SUGGESTIONS):
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        found = []
+        i = bisect.bisect_left(self.keys, prefix)
+        while i < len(self.keys) and len(found) < limit and self.keys[i].startswith(prefix):
+            if self.positions[i] not in found:
+                found.append(self.positions[i])
+            i += 1
+        return [self.entries[position] for position in found]
+
+
+def build_index():
+    """
+    Service names, category names, shop brands and master names; four queries.
+
+    Service names and brands are suggested as search text, categories and masters with their ids.
+    """
+    entries = [('service', name, None) for name in Service.objects.values_list('name', flat=True)]
+    entries += [('category', name, pk) for pk, name in Category.objects.values_list('pk', 'name')]
+    entries += [('brand', brand, None) for brand in Shop.objects.exclude(brand=None).values_list('brand', flat=True)]
+    entries += [('master', name, pk) for pk, name in User.objects.filter(is_master=True).values_list('pk', 'full_name')]
+    return PrefixIndex(entries)
+
+
+class Suggester:
+    """
+    The process wide index. It is rebuilt when the shared version in the cache moves,
+    which is checked at most every VERSION_CHECK_INTERVAL seconds; lookups in between
+    never leave the process. While the version cannot be read, every check rebuilds it.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._index = None
+        self._version = None
+        self._checked_at = None
+
+    def index(self):
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < VERSION_CHECK_INTERVAL:
+            return self._index
+        version = get_version(VERSION_NAME)
+        with self._lock:
+            if self._index is None or version is None or self._version != version:
+                self._index, self._version = build_index(), version
+            self._checked_at = now
+        return self._index
+
+    def warm(self):
+        """
+        Build the index before the first lookup, when a worker starts (see root.wsgi).
+        If the database cannot be read yet, the first lookup builds it instead.
+        """
+        try:
+            self.index()
+        except DatabaseError:
+            logger.warning('Suggestion index not built at startup', exc_info=True)
+
+    def expire(self):
+        self._checked_at = None
+
+    def suggest(self, prefix, limit=MAX_SUGGESTIONS):
+        return self.index().lookup(prefix, limit)
+
+
+suggester = Suggester()
+
+
+def invalidate_suggestions():
+    """
+    Have every process rebuild its index once the current transaction commits.
+    """
+    def bump():
+        bump_version(VERSION_NAME)
+        suggester.expire()
+
+    transaction.on_commit(bump)
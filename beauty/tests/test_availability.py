@@ -0,0 +1,198 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from beauty.availability import (AvailabilityEngine, subtract_intervals, intersect_intervals, merge_intervals,
+                                 split_into_slots, working_day_index, intervals_to_bitmap, bitmap_to_intervals,
+                                 and_bitmaps)
+from beauty.models.booking import Booking, Time, WorkingDays
+from beauty.models.service import Category, Service
+from users.models import User
+
+
+class IntervalArithmeticTest(APITestCase):
+    def test_merge_intervals(self):
+        self.assertEqual(merge_intervals([(60, 120), (0, 30), (100, 180), (30, 40)]), [(0, 40), (60, 180)])
+
+    def test_subtract_intervals(self):
+        self.assertEqual(subtract_intervals([(600, 1080)], [(660, 720), (900, 960)]),
+                         [(600, 660), (720, 900), (960, 1080)])
+        self.assertEqual(subtract_intervals([(600, 660)], [(500, 700)]), [])
+
+    def test_intersect_intervals(self):
+        self.assertEqual(intersect_intervals([(0, 100), (200, 300)], [(50, 250)]), [(50, 100), (200, 250)])
+
+    def test_split_into_slots(self):
+        self.assertEqual(split_into_slots([(600, 720), (780, 800)], 60), [600, 660])
+
+    def test_bitmap_round_trip(self):
+        bitmap = intervals_to_bitmap([(600, 660), (721, 800), (1435, 1440)])
+        self.assertEqual(len(bitmap), 36)
+        self.assertEqual(bitmap_to_intervals(bitmap), [(600, 660), (725, 800), (1435, 1440)])
+
+    def test_and_bitmaps(self):
+        bitmap = and_bitmaps([intervals_to_bitmap([(0, 120)]), intervals_to_bitmap([(60, 180)])])
+        self.assertEqual(bitmap_to_intervals(bitmap), [(60, 120)])
+
+
+class AvailabilityEngineTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.date = timezone.now().date() + timedelta(days=1)
+        for day_id in range(7):
+            WorkingDays.objects.create(id=day_id, day=f'Day {day_id}')
+        category = Category.objects.create(name="Hair")
+        self.master = User.objects.create(username="master", email="master@mail.com", is_master=True)
+        self.other_master = User.objects.create(username="other", email="other@mail.com", is_master=True)
+        self.customer = User.objects.create(username="customer", email="customer@mail.com")
+        self.service = Service.objects.create(name="Haircut", price=100, duration=timedelta(hours=1), category=category,
+                                              user=self.master)
+        self.other_service = Service.objects.create(name="Coloring", price=200, duration=timedelta(hours=1),
+                                                    category=category, user=self.other_master)
+        day = working_day_index(self.date)
+        Time.objects.create(day_id=day, start_time="10:00", end_time="14:00", user=self.master)
+        Time.objects.create(day_id=day, start_time="10:00", end_time="14:00", user=self.other_master)
+
+    def book(self, service, time, status=Booking.StatusChoices.PENDING):
+        booking = Booking.objects.create(date=self.date, time=time, user=self.customer, status=status)
+        booking.service.add(service)
+        return booking
+
+    def test_free_slots_skip_bookings_of_the_same_master_only(self):
+        self.book(self.service, "11:00")
+        self.book(self.other_service, "12:00")
+        engine = AvailabilityEngine.from_service_ids([self.service.id])
+        self.assertEqual(engine.free_slots(self.date), ["10:00", "12:00", "13:00"])
+
+    def test_booking_blocks_its_whole_duration(self):
+        self.book(self.service, "10:30")
+        engine = AvailabilityEngine.from_service_ids([self.service.id])
+        self.assertEqual(engine.free_slots(self.date), ["11:30", "12:30"])
+
+    def test_rejected_bookings_do_not_block(self):
+        self.book(self.service, "10:00", status=Booking.StatusChoices.REJECTED)
+        engine = AvailabilityEngine.from_service_ids([self.service.id])
+        self.assertEqual(engine.free_slots(self.date), ["10:00", "11:00", "12:00", "13:00"])
+
+    def test_every_master_must_be_free(self):
+        self.book(self.other_service, "12:00")
+        engine = AvailabilityEngine.from_service_ids([self.service.id, self.other_service.id])
+        self.assertEqual(engine.duration, 120)
+        self.assertEqual(engine.free_slots(self.date), ["10:00"])
+
+    def test_query_count_does_not_depend_on_services_or_bookings(self):
+        for hour in (10, 11, 12):
+            self.book(self.service, f"{hour}:00")
+        with self.assertNumQueries(3):
+            engine = AvailabilityEngine.from_service_ids([self.service.id, self.other_service.id])
+            engine.is_working_day(self.date)
+            engine.free_slots(self.date)
+
+    def test_cached_bitmaps_skip_the_database(self):
+        AvailabilityEngine.from_service_ids([self.service.id]).free_slots(self.date)
+        with self.assertNumQueries(1):
+            engine = AvailabilityEngine.from_service_ids([self.service.id])
+            self.assertEqual(engine.free_slots(self.date), ["10:00", "11:00", "12:00", "13:00"])
+
+    def test_bookings_invalidate_cached_bitmaps(self):
+        engine = AvailabilityEngine.from_service_ids([self.service.id])
+        self.assertEqual(engine.free_slots(self.date), ["10:00", "11:00", "12:00", "13:00"])
+        booking = self.book(self.service, "11:00")
+        engine = AvailabilityEngine.from_service_ids([self.service.id])
+        self.assertEqual(engine.free_slots(self.date), ["10:00", "12:00", "13:00"])
+        booking.status = Booking.StatusChoices.REJECTED
+        booking.save()
+        engine = AvailabilityEngine.from_service_ids([self.service.id])
+        self.assertEqual(engine.free_slots(self.date), ["10:00", "11:00", "12:00", "13:00"])
+
+    def test_rescheduled_bookings_invalidate_cached_bitmaps(self):
+        booking = self.book(self.service, "11:00")
+        AvailabilityEngine.from_service_ids([self.service.id]).free_slots(self.date)
+        booking = Booking.objects.get(pk=booking.pk)
+        booking.date = self.date + timedelta(days=7)
+        with CaptureQueriesContext(connection) as queries:
+            booking.save()
+        self.assertFalse([query for query in queries.captured_queries if 'FROM "booking"' in query['sql']])
+        engine = AvailabilityEngine.from_service_ids([self.service.id])
+        self.assertEqual(engine.free_slots(self.date), ["10:00", "11:00", "12:00", "13:00"])
+
+    def test_service_changes_do_not_read_the_old_row(self):
+        service = Service.objects.get(pk=self.service.pk)
+        service.duration = timedelta(minutes=30)
+        with self.assertNumQueries(1):
+            service.save(update_fields=['duration'])
+
+    def test_writes_survive_a_cache_outage(self):
+        AvailabilityEngine.from_service_ids([self.service.id]).free_slots(self.date)
+        Time.objects.filter(user=self.master).update(end_time="12:00")
+        outage = mock.patch.multiple(cache, incr=mock.Mock(side_effect=ConnectionError),
+                                     get_many=mock.Mock(side_effect=ConnectionError))
+        with outage, self.assertLogs('beauty.cache', 'WARNING'):
+            with self.captureOnCommitCallbacks(execute=True):
+                Time.objects.get(user=self.master).save()
+            engine = AvailabilityEngine.from_service_ids([self.service.id])
+            self.assertEqual(engine.free_slots(self.date), ["10:00", "11:00"])
+        engine = AvailabilityEngine.from_service_ids([self.service.id])
+        self.assertEqual(engine.free_slots(self.date), ["10:00", "11:00"])
+
+    def test_working_hours_invalidate_cached_bitmaps(self):
+        AvailabilityEngine.from_service_ids([self.service.id]).free_slots(self.date)
+        Time.objects.filter(user=self.master).update(end_time="12:00")
+        Time.objects.get(user=self.master).save()
+        engine = AvailabilityEngine.from_service_ids([self.service.id])
+        self.assertEqual(engine.free_slots(self.date), ["10:00", "11:00"])
+
+    def test_free_time_endpoint(self):
+        self.book(self.service, "11:00")
+        response = self.client.get('/api/v1/booking/time',
+                                   {'date': self.date.isoformat(), 'service_ids': str(self.service.id)})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['free_times'], ["10:00", "12:00", "13:00"])
+
+    def test_free_time_endpoint_rejects_unknown_service(self):
+        response = self.client.get('/api/v1/booking/time', {'date': self.date.isoformat(), 'service_ids': '999'})
+        self.assertEqual(response.status_code, 400)
+
+
+class MasterFreeTimeRangeTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.date = timezone.now().date() + timedelta(days=1)
+        for day_id in range(7):
+            WorkingDays.objects.create(id=day_id, day=f'Day {day_id}')
+        category = Category.objects.create(name="Nails")
+        self.master = User.objects.create(username="master", email="master@mail.com", is_master=True)
+        self.customer = User.objects.create(username="customer", email="customer@mail.com")
+        self.service = Service.objects.create(name="Manicure", price=100, duration=timedelta(hours=2),
+                                              category=category, user=self.master)
+        Time.objects.create(day_id=working_day_index(self.date), start_time="10:00", end_time="14:00",
+                            user=self.master)
+
+    def get_range(self, days):
+        return self.client.get('/api/v1/booking/time/range', {
+            'from': self.date.isoformat(),
+            'to': (self.date + timedelta(days=days - 1)).isoformat(),
+            'service_ids': str(self.service.id),
+        })
+
+    def test_range_returns_every_day(self):
+        booking = Booking.objects.create(date=self.date, time="10:00", user=self.customer)
+        booking.service.add(self.service)
+
+        with self.assertNumQueries(3):
+            response = self.get_range(14)
+        self.assertEqual(response.status_code, 200)
+        days = response.data['days']
+        self.assertEqual(len(days), 14)
+        self.assertEqual(days[0]['free_times'], ["12:00"])
+        self.assertTrue(days[0]['available'])
+        self.assertTrue(days[7]['available'])
+        self.assertEqual([day['available'] for day in days].count(True), 2)
+
+    def test_range_is_bounded(self):
+        self.assertEqual(self.get_range(32).status_code, 400)
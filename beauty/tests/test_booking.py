@@ -0,0 +1,400 @@
+import threading
+from datetime import timedelta, time
+from types import SimpleNamespace
+from unittest import mock, skipUnless
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from rest_framework.test import APITestCase
+
+from beauty.availability import working_day_index
+from beauty.cache import bump_version
+from beauty.geography import get_index
+from beauty.holds import get_hold
+from beauty.locks import lock_master_days
+from beauty.models.booking import Booking, Time, WorkingDays
+from beauty.models.outbox import EmailOutbox
+from beauty.models.region import Address, District, Mahalla, Region
+from beauty.models.service import Category, Service
+from beauty.serializers.booking import BookingSerializer
+from users.models import User
+
+
+class BookingFixtureMixin:
+    def create_fixture(self, masters=1):
+        cache.clear()
+        self.date = timezone.now().date() + timedelta(days=1)
+        self.day = WorkingDays.objects.create(id=working_day_index(self.date), day="Tomorrow")
+        self.category = Category.objects.create(name="Hair")
+        self.customer = User.objects.create(username="customer", email="customer@mail.com")
+        self.masters, self.services = [], []
+        for i in range(masters):
+            master = User.objects.create(username=f"master{i}", email=f"master{i}@mail.com", is_master=True)
+            Time.objects.create(day=self.day, start_time="10:00", end_time="18:00", user=master)
+            self.masters.append(master)
+            self.services.append(Service.objects.create(name=f"Haircut {i}", price=100, duration=timedelta(hours=1),
+                                                        category=self.category, user=master))
+
+    def booking_serializer(self, service, start, user=None):
+        request = SimpleNamespace(user=user or self.customer)
+        return BookingSerializer(data={'date': self.date, 'time': start, 'service_ids': [service.id]},
+                                 context={'request': request})
+
+
+class BookingCreateTest(BookingFixtureMixin, APITestCase):
+    def setUp(self):
+        self.create_fixture()
+
+    def test_second_validated_booking_loses(self):
+        first = self.booking_serializer(self.services[0], "10:00")
+        second = self.booking_serializer(self.services[0], "10:30")
+        self.assertTrue(first.is_valid())
+        self.assertTrue(second.is_valid())
+
+        first.save()
+        with self.assertRaises(ValidationError):
+            second.save()
+        self.assertEqual(Booking.objects.count(), 1)
+
+    def test_overlapping_booking_is_rejected_by_validation(self):
+        self.booking_serializer(self.services[0], "10:00").is_valid(raise_exception=True)
+        first = self.booking_serializer(self.services[0], "11:00")
+        first.is_valid(raise_exception=True)
+        first.save()
+        self.assertFalse(self.booking_serializer(self.services[0], "10:30").is_valid())
+        self.assertTrue(self.booking_serializer(self.services[0], "12:00").is_valid())
+
+    def test_overlap_is_checked_again_once_the_lock_is_held(self):
+        serializer = self.booking_serializer(self.services[0], "10:00")
+        serializer.is_valid(raise_exception=True)
+
+        def book_while_waiting(pairs):
+            # Another request wins the slot after this one validated, while it waits for the lock.
+            self.assertEqual(list(pairs), [(self.masters[0].id, self.date)])
+            other = Booking.objects.create(date=self.date, time=time(10, 30), user=self.customer)
+            other.service.add(self.services[0])
+
+        with mock.patch('beauty.serializers.booking.lock_master_days', side_effect=book_while_waiting) as lock:
+            with self.assertRaises(ValidationError):
+                serializer.save()
+        lock.assert_called_once()
+        self.assertFalse(Booking.objects.filter(time=time(10, 0)).exists())
+
+    def test_lock_falls_back_to_the_masters_rows(self):
+        with mock.patch.object(connection, 'vendor', 'sqlite'), CaptureQueriesContext(connection) as queries:
+            with transaction.atomic():
+                lock_master_days([(self.masters[0].id, self.date), (self.masters[0].id, self.date + timedelta(1))])
+        [query] = [query['sql'] for query in queries.captured_queries if query['sql'].startswith('SELECT')]
+        self.assertIn('FROM "users_user"', query)
+        self.assertIn(f'IN ({self.masters[0].id})', query)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Concurrent writers need a server database')
+class ConcurrentBookingTest(BookingFixtureMixin, TransactionTestCase):
+    def setUp(self):
+        self.create_fixture(masters=8)
+
+    def hammer(self, slots, threads=8):
+        outcomes = []
+        lock = threading.Lock()
+
+        def worker(service, start):
+            try:
+                serializer = self.booking_serializer(service, start)
+                try:
+                    won = serializer.is_valid() and bool(serializer.save())
+                except ValidationError:
+                    won = False
+                with lock:
+                    outcomes.append(won)
+            finally:
+                connection.close()
+
+        pool = [threading.Thread(target=worker, args=slot) for slot in slots]
+        for thread in pool:
+            thread.start()
+        for thread in pool:
+            thread.join()
+        return outcomes
+
+    def test_one_slot_has_exactly_one_winner(self):
+        outcomes = self.hammer([(self.services[0], time(10, 0))] * 20)
+        self.assertEqual(outcomes.count(True), 1)
+        self.assertEqual(Booking.objects.count(), 1)
+
+    def test_different_masters_do_not_block_each_other(self):
+        outcomes = self.hammer([(service, time(10, 0)) for service in self.services])
+        self.assertTrue(all(outcomes))
+        self.assertEqual(Booking.objects.count(), len(self.services))
+
+
+class BookingBatchCreateTest(BookingFixtureMixin, APITestCase):
+    def setUp(self):
+        self.create_fixture(masters=3)
+        self.client.force_authenticate(self.customer)
+
+    def test_services_are_inserted_in_one_statement(self):
+        extra = Service.objects.create(name="Styling", price=50, duration=timedelta(minutes=30),
+                                       category=self.category, user=self.masters[0])
+        serializer = BookingSerializer(data={'date': self.date, 'time': "10:00",
+                                             'service_ids': [self.services[0].id, extra.id]},
+                                       context={'request': SimpleNamespace(user=self.customer)})
+        serializer.is_valid(raise_exception=True)
+        with self.assertNumQueries(7):
+            booking = serializer.save()
+        self.assertEqual(set(booking.service.values_list('id', flat=True)), {self.services[0].id, extra.id})
+
+    def test_batch_creates_every_booking(self):
+        response = self.client.post('/api/v1/booking/batch', {'bookings': [
+            {'date': self.date.isoformat(), 'time': "10:00", 'service_ids': [self.services[0].id]},
+            {'date': self.date.isoformat(), 'time': "10:00", 'service_ids': [self.services[1].id]},
+            {'date': self.date.isoformat(), 'time': "12:00", 'service_ids': [self.services[2].id]},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data), 3)
+        self.assertEqual(Booking.objects.count(), 3)
+
+    def test_batch_is_all_or_nothing_with_per_item_errors(self):
+        response = self.client.post('/api/v1/booking/batch', {'bookings': [
+            {'date': self.date.isoformat(), 'time': "10:00", 'service_ids': [self.services[0].id]},
+            {'date': self.date.isoformat(), 'time': "10:30", 'service_ids': [self.services[0].id]},
+            {'date': self.date.isoformat(), 'time': "10:00", 'service_ids': [999]},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data[0], {})
+        self.assertEqual(response.data[1], {})
+        self.assertIn('service_ids', response.data[2])
+
+        response = self.client.post('/api/v1/booking/batch', {'bookings': [
+            {'date': self.date.isoformat(), 'time': "10:00", 'service_ids': [self.services[0].id]},
+            {'date': self.date.isoformat(), 'time': "10:30", 'service_ids': [self.services[0].id]},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data[0], {})
+        self.assertIn('non_field_errors', response.data[1])
+        self.assertEqual(Booking.objects.count(), 0)
+
+    def test_empty_batch_is_rejected(self):
+        response = self.client.post('/api/v1/booking/batch', {'bookings': []}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('non_field_errors', response.data)
+
+
+class BookingWorkingHoursValidationTest(BookingFixtureMixin, APITestCase):
+    def setUp(self):
+        self.create_fixture(masters=2)
+
+    def test_validation_cost_does_not_depend_on_masters(self):
+        serializer = BookingSerializer(data={'date': self.date, 'time': "10:00",
+                                             'service_ids': [service.id for service in self.services]},
+                                       context={'request': SimpleNamespace(user=self.customer)})
+        with self.assertNumQueries(3):
+            self.assertTrue(serializer.is_valid())
+
+    def test_booking_must_end_inside_working_hours(self):
+        self.assertTrue(self.booking_serializer(self.services[0], "17:00").is_valid())
+        serializer = self.booking_serializer(self.services[0], "17:30")
+        self.assertFalse(serializer.is_valid())
+        self.assertIn("working hours", str(serializer.errors))
+        self.assertFalse(self.booking_serializer(self.services[0], "09:30").is_valid())
+
+    def test_day_off_is_rejected(self):
+        Time.objects.filter(user=self.masters[1]).delete()
+        serializer = BookingSerializer(data={'date': self.date, 'time': "10:00",
+                                             'service_ids': [service.id for service in self.services]},
+                                       context={'request': SimpleNamespace(user=self.customer)})
+        self.assertFalse(serializer.is_valid())
+        self.assertIn("not a working day", str(serializer.errors))
+
+
+class MyBookingListTest(BookingFixtureMixin, APITestCase):
+    def setUp(self):
+        self.create_fixture(masters=2)
+        region = Region.objects.create(name="Tashkent")
+        district = District.objects.create(name="Chilonzor", region=region)
+        mahalla = Mahalla.objects.create(name="Qatortol", district=district)
+        address = Address.objects.create(region=region, district=district, mahalla=mahalla, house="1")
+        User.objects.filter(pk__in=[self.customer.pk] + [master.pk for master in self.masters]).update(address=address)
+        get_index()
+
+    def book(self, count):
+        for i in range(count):
+            booking = Booking.objects.create(date=self.date + timedelta(days=i), time="10:00", user=self.customer)
+            booking.service.set(self.services)
+
+    def test_query_count_does_not_depend_on_bookings(self):
+        self.client.force_authenticate(self.customer)
+        self.book(2)
+        with self.assertNumQueries(2) as small:
+            self.client.get('/api/v1/booking/my')
+        self.book(10)
+        with self.assertNumQueries(len(small.captured_queries)):
+            response = self.client.get('/api/v1/booking/my')
+        self.assertEqual(len(response.data['results']), 12)
+
+    def test_each_side_sees_the_other(self):
+        self.book(1)
+        self.client.force_authenticate(self.customer)
+        results = self.client.get('/api/v1/booking/my').data['results']
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0]['user']['id'], self.masters[0].id)
+        self.assertEqual(len(results[0]['service']), 2)
+        self.assertEqual(results[0]['user']['address']['region'], "Tashkent")
+
+        self.client.force_authenticate(self.masters[1])
+        results = self.client.get('/api/v1/booking/my').data['results']
+        self.assertEqual([booking['user']['id'] for booking in results], [self.customer.id])
+
+    def test_cursor_pagination_is_newest_first(self):
+        self.client.force_authenticate(self.customer)
+        self.book(3)
+        response = self.client.get('/api/v1/booking/my', {'page_size': 2})
+        first = [booking['date'] for booking in response.data['results']]
+        self.assertEqual(first, sorted(first, reverse=True))
+        response = self.client.get(response.data['next'])
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertLess(response.data['results'][0]['date'], first[-1])
+
+
+class BookingBulkStatusTest(BookingFixtureMixin, APITestCase):
+    def setUp(self):
+        self.create_fixture(masters=2)
+
+    def book(self, count, service=None):
+        bookings = []
+        for i in range(count):
+            booking = Booking.objects.create(date=self.date + timedelta(days=i), time="10:00", user=self.customer)
+            booking.service.add(service or self.services[0])
+            bookings.append(booking)
+        return bookings
+
+    def test_cost_does_not_depend_on_bookings(self):
+        self.client.force_authenticate(self.masters[0])
+        ids = [booking.id for booking in self.book(50)]
+        with self.assertNumQueries(6):
+            response = self.client.put('/api/v1/booking/batch/status', {'booking_ids': ids, 'status': 'approved'},
+                                       format='json')
+        self.assertEqual(response.data['changed'], 50)
+        self.assertEqual(Booking.objects.filter(status='approved').count(), 50)
+        self.assertEqual(EmailOutbox.objects.count(), 50)
+
+    def test_foreign_booking_rejects_the_whole_request(self):
+        self.client.force_authenticate(self.masters[0])
+        own, = self.book(1)
+        foreign, = self.book(1, self.services[1])
+        response = self.client.put('/api/v1/booking/batch/status',
+                                   {'booking_ids': [own.id, foreign.id], 'status': 'approved'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Booking.objects.filter(status='approved').exists())
+        self.assertFalse(EmailOutbox.objects.exists())
+
+    def test_rejecting_frees_the_slot(self):
+        booking, = self.book(1)
+        self.assertFalse(self.booking_serializer(self.services[0], "10:00").is_valid())
+        self.client.force_authenticate(self.masters[0])
+        self.client.put('/api/v1/booking/batch/status', {'booking_ids': [booking.id], 'status': 'rejected'},
+                        format='json')
+        self.assertTrue(self.booking_serializer(self.services[0], "10:00").is_valid())
+
+
+class SlotHoldTest(BookingFixtureMixin, APITestCase):
+    def setUp(self):
+        self.create_fixture()
+        self.other = User.objects.create(username="other", email="other@mail.com")
+        self.client.force_authenticate(self.customer)
+
+    def hold(self, start, user=None):
+        self.client.force_authenticate(user or self.customer)
+        return self.client.post('/api/v1/booking/hold', {'date': self.date.isoformat(), 'time': start,
+                                                         'service_ids': [self.services[0].id]}, format='json')
+
+    def free_times(self):
+        return self.client.get('/api/v1/booking/time', {'date': self.date.isoformat(),
+                                                        'service_ids': self.services[0].id}).data['free_times']
+
+    def test_overlapping_hold_is_refused(self):
+        self.assertEqual(self.hold("10:00").status_code, 201)
+        self.assertEqual(self.hold("10:30", self.other).status_code, 400)
+        self.assertEqual(self.hold("11:00", self.other).status_code, 201)
+
+    def test_held_slot_is_busy_for_others(self):
+        token = self.hold("10:00").data['token']
+        self.assertNotIn("10:00", self.free_times())
+
+        serializer = self.booking_serializer(self.services[0], "10:00", user=self.other)
+        self.assertFalse(serializer.is_valid())
+        self.assertIn("held by another customer", str(serializer.errors))
+
+        self.client.force_authenticate(self.customer)
+        self.assertEqual(self.client.delete(f'/api/v1/booking/hold/{token}').status_code, 204)
+        self.assertIn("10:00", self.free_times())
+
+    def test_holds_of_every_customer_are_busy(self):
+        self.hold("10:00")
+        self.hold("12:00", self.other)
+        self.assertEqual(self.free_times(), ["11:00", "13:00", "14:00", "15:00", "16:00", "17:00"])
+
+    def test_own_hold_does_not_block_another_time(self):
+        self.hold("10:00")
+        serializer = self.booking_serializer(self.services[0], "10:30")
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        self.assertFalse(self.booking_serializer(self.services[0], "10:30", user=self.other).is_valid())
+
+    def test_booking_consumes_the_hold(self):
+        token = self.hold("10:00").data['token']
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/v1/booking', {'date': self.date.isoformat(), 'time': "10:00",
+                                                            'service_ids': [self.services[0].id], 'hold': token},
+                                        format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertIsNone(get_hold(token))
+
+    def test_hold_of_another_customer_cannot_be_used(self):
+        token = self.hold("10:00").data['token']
+        serializer = BookingSerializer(data={'date': self.date, 'time': "10:00", 'service_ids': [self.services[0].id],
+                                             'hold': token}, context={'request': SimpleNamespace(user=self.other)})
+        self.assertFalse(serializer.is_valid())
+        self.assertIn('hold', serializer.errors)
+
+
+class WorkingHoursReplaceTest(BookingFixtureMixin, APITestCase):
+    def setUp(self):
+        self.create_fixture()
+        self.master = self.masters[0]
+        self.client.force_authenticate(self.master)
+
+    def week(self, *windows):
+        return {'times': [{'day': self.day.id, 'start_time': start, 'end_time': end} for start, end in windows]}
+
+    def test_week_is_replaced_in_one_delete_and_one_insert(self):
+        self.client.get('/api/v1/booking/time', {'date': self.date.isoformat(), 'service_ids': self.services[0].id})
+        with self.assertNumQueries(6), mock.patch('beauty.availability.bump_version', wraps=bump_version) as bumped:
+            response = self.client.put('/api/v1/working/time', self.week(("08:00", "12:00"), ("13:00", "20:00")),
+                                       format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(bumped.call_count, 1)
+        self.assertEqual(sorted(Time.objects.filter(user=self.master).values_list('start_time', 'end_time')),
+                         [(time(8, 0), time(12, 0)), (time(13, 0), time(20, 0))])
+
+        free_times = self.client.get('/api/v1/booking/time', {'date': self.date.isoformat(),
+                                                              'service_ids': self.services[0].id}).data['free_times']
+        self.assertEqual(free_times[0], "08:00")
+        self.assertNotIn("12:00", free_times)
+
+    def test_overlapping_windows_are_rejected(self):
+        response = self.client.put('/api/v1/working/time', self.week(("08:00", "12:00"), ("11:00", "14:00")),
+                                   format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(Time.objects.filter(user=self.master, start_time=time(10, 0)).exists())
+
+    def test_added_window_must_not_overlap_stored_ones(self):
+        response = self.client.post('/api/v1/working/time', self.week(("17:00", "19:00")), format='json')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post('/api/v1/working/time', self.week(("18:00", "19:00"), ("08:00", "09:00")),
+                                    format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Time.objects.filter(user=self.master).count(), 3)
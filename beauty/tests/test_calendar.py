@@ -0,0 +1,143 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.core import signing
+from django.core.cache import cache
+from django.test import SimpleTestCase
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from beauty.calendar import TOKEN_SALT, calendar_token, read_calendar_token, fold_line, escape_text
+from beauty.models.booking import Booking
+from beauty.models.service import Category, Service
+from users.models import User
+
+
+def url_token(url):
+    return url.rsplit('/', 1)[1].removesuffix('.ics')
+
+
+class CalendarTextTest(SimpleTestCase):
+    def test_long_lines_are_folded_without_splitting_characters(self):
+        line = 'SUMMARY:' + 'ё' * 60
+        folded = fold_line(line)
+        self.assertTrue(all(len(part.encode()) <= 75 for part in folded.rstrip('\r\n').split('\r\n')))
+        self.assertEqual(folded.replace('\r\n ', '').rstrip('\r\n'), line)
+
+    def test_text_is_escaped(self):
+        self.assertEqual(escape_text('a,b;c\nd\\'), 'a\\,b\\;c\\nd\\\\')
+
+
+class MasterCalendarFeedTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.master = User.objects.create(username="master", email="master@mail.com", is_master=True)
+        self.customer = User.objects.create(username="customer", email="customer@mail.com", full_name="Ann Lee")
+        category = Category.objects.create(name="Hair")
+        self.services = [Service.objects.create(name=name, price=100, duration=timedelta(minutes=30),
+                                                category=category, user=self.master)
+                         for name in ("Haircut", "Styling")]
+        self.booking = Booking.objects.create(date=timezone.now().date(), time="10:00", user=self.customer,
+                                              status=Booking.StatusChoices.APPROVED)
+        self.booking.service.set(self.services)
+        self.url = f'/api/v1/booking/calendar/{calendar_token(self.master)}.ics'
+
+    def test_master_gets_feed_url(self):
+        self.client.force_authenticate(self.master)
+        response = self.client.get('/api/v1/booking/calendar')
+        self.assertEqual(read_calendar_token(url_token(response.data['url'])), (self.master.id, ''))
+
+        self.client.force_authenticate(self.customer)
+        self.assertEqual(self.client.get('/api/v1/booking/calendar').status_code, 403)
+
+    def test_feed_contains_bookings(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        body = b''.join(response.streaming_content).decode()
+        self.assertIn(f'UID:booking-{self.booking.id}@', body)
+        self.assertIn(f'DTSTART:{self.booking.date:%Y%m%d}T100000', body)
+        self.assertIn(f'DTEND:{self.booking.date:%Y%m%d}T110000', body)
+        self.assertIn('SUMMARY:Haircut\\, Styling', body)
+        self.assertIn('STATUS:CONFIRMED', body)
+
+    def test_unchanged_feed_is_not_modified_after_one_query(self):
+        etag = self.client.get(self.url)['ETag']
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        self.booking.status = Booking.StatusChoices.REJECTED
+        self.booking.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+        etag = response['ETag']
+        self.booking.delete()
+        self.assertNotEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def assertChangesFeed(self, change):
+        etag = self.client.get(self.url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            change()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode()
+
+    def test_service_changes_change_the_feed(self):
+        def rename():
+            self.services[1].name = "Blow-dry"
+            self.services[1].save()
+
+        def shorten():
+            self.services[1].duration = timedelta(minutes=15)
+            self.services[1].save()
+
+        self.assertIn('SUMMARY:Haircut\\, Blow-dry', self.assertChangesFeed(rename))
+        self.assertIn(f'DTEND:{self.booking.date:%Y%m%d}T104500', self.assertChangesFeed(shorten))
+        body = self.assertChangesFeed(lambda: self.booking.service.remove(self.services[1]))
+        self.assertIn('SUMMARY:Haircut\r\n', body)
+
+    def test_customer_rename_changes_the_feed(self):
+        def rename():
+            self.customer.full_name = "Ann Smith"
+            self.customer.save()
+
+        self.assertIn('DESCRIPTION:Ann Smith', self.assertChangesFeed(rename))
+
+    def test_feed_is_not_cached_while_the_cache_is_down(self):
+        with mock.patch.object(cache, 'get', side_effect=ConnectionError), self.assertLogs('beauty.cache'):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH='"anything"')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('ETag', response)
+
+    def test_rotated_key_revokes_old_urls(self):
+        self.client.force_authenticate(self.master)
+        url = self.client.post('/api/v1/booking/calendar').data['url']
+        self.master.refresh_from_db()
+        self.assertEqual(read_calendar_token(url_token(url)), (self.master.id, self.master.calendar_key))
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_tokens_without_a_key_stay_valid_until_rotated(self):
+        legacy_url = f'/api/v1/booking/calendar/{signing.dumps(self.master.id, salt=TOKEN_SALT, compress=True)}.ics'
+        self.assertEqual(self.client.get(legacy_url).status_code, 200)
+        self.client.force_authenticate(self.master)
+        self.client.post('/api/v1/booking/calendar')
+        self.assertEqual(self.client.get(legacy_url).status_code, 404)
+
+    def test_feed_is_read_in_keyset_chunks(self):
+        bookings = [self.booking]
+        for hour in (11, 12):
+            booking = Booking.objects.create(date=self.booking.date, time=f"{hour}:00", user=self.customer)
+            booking.service.set(self.services)
+            bookings.append(booking)
+        with mock.patch('beauty.calendar.CHUNK_SIZE', 3), self.assertNumQueries(4):
+            body = b''.join(self.client.get(self.url).streaming_content).decode()
+        self.assertEqual(body.count('SUMMARY:Haircut\\, Styling'), 3)
+        self.assertEqual([line for line in body.split('\r\n') if line.startswith('UID:')],
+                         [f'UID:booking-{booking.id}@testserver' for booking in bookings])
+
+    def test_tampered_token_is_rejected(self):
+        self.assertEqual(self.client.get(self.url.replace('.ics', 'x.ics')).status_code, 404)
@@ -1,3 +1,5 @@
+from datetime import timedelta
+
 from django.test import TestCase
 
 from beauty.models.about import *
@@ -28,7 +30,7 @@ class ServiceModelTest(TestCase):
         self.service = Service.objects.create(
             name="Test Service",
             price=100.00,
-            duration="30 mins",
+            duration=timedelta(minutes=30),
             description="Test description",
             category=self.category,
             user=self.user,
@@ -38,7 +40,7 @@ class ServiceModelTest(TestCase):
     def test_service_creation(self):
         self.assertEqual(self.service.name, "Test Service")
         self.assertEqual(self.service.price, 100.00)
-        self.assertEqual(self.service.duration, "30 mins")
+        self.assertEqual(self.service.duration, timedelta(minutes=30))
         self.assertEqual(self.service.description, "Test description")
         self.assertEqual(self.service.category, self.category)
         self.assertEqual(self.service.user, self.user)
@@ -139,7 +141,7 @@ class FavoriteModelTest(TestCase):
         self.service = Service.objects.create(
             name="Test Service",
             price=100.00,
-            duration="30 mins",
+            duration=timedelta(minutes=30),
             description="Test description",
             category=self.category,
             user=self.user,
@@ -169,7 +171,7 @@ class SavedModelTest(TestCase):
         self.service = Service.objects.create(
             name="Test Service",
             price=100.00,
-            duration="30 mins",
+            duration=timedelta(minutes=30),
             description="Test description",
             category=self.category,
             user=self.user,
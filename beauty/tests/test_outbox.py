@@ -0,0 +1,73 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.core import mail
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from beauty.models.booking import Booking
+from beauty.models.outbox import EmailOutbox
+from beauty.outbox import send_batch, queue_stats
+from users.models import User
+
+
+def queue(count=1):
+    return [EmailOutbox.enqueue(subject=f"Booking {i}", template_name='booking_email_template.html',
+                                context={'status': 'approved', 'booking_status': 'approved'},
+                                to=[f"user{i}@mail.com"], from_email="team@mail.com")
+            for i in range(count)]
+
+
+class EmailOutboxSendTest(TestCase):
+    def test_batch_is_sent_over_one_connection(self):
+        queue(3)
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.open') as opened:
+            stats = send_batch(batch_size=10)
+        self.assertEqual(opened.call_count, 1)
+        self.assertEqual(stats['sent'], 3)
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(mail.outbox[0].alternatives[0][1], 'text/html')
+        self.assertFalse(EmailOutbox.objects.exclude(status=EmailOutbox.StatusChoices.SENT).exists())
+
+    def test_failed_message_is_retried_with_backoff(self):
+        message, = queue()
+        with mock.patch('django.core.mail.EmailMultiAlternatives.send', side_effect=OSError("timeout")):
+            self.assertEqual(send_batch()['failed'], 1)
+        message.refresh_from_db()
+        self.assertEqual(message.status, EmailOutbox.StatusChoices.PENDING)
+        self.assertEqual(message.attempts, 1)
+        self.assertEqual(message.last_error, "timeout")
+        self.assertGreater(message.available_at, timezone.now() + timedelta(seconds=30))
+        self.assertEqual(send_batch()['claimed'], 0)
+
+        EmailOutbox.objects.update(available_at=timezone.now())
+        self.assertEqual(send_batch()['sent'], 1)
+        message.refresh_from_db()
+        self.assertEqual(message.attempts, 2)
+
+    def test_message_gives_up_after_max_attempts(self):
+        message, = queue()
+        with mock.patch('django.core.mail.EmailMultiAlternatives.send', side_effect=OSError("timeout")):
+            send_batch(max_attempts=1)
+        message.refresh_from_db()
+        self.assertEqual(message.status, EmailOutbox.StatusChoices.FAILED)
+
+    def test_command_drains_queue_in_batches(self):
+        queue(5)
+        self.assertEqual(queue_stats()['depth'], 5)
+        call_command('send_outbox', batch_size=2, stdout=mock.MagicMock())
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertEqual(queue_stats()['depth'], 0)
+
+
+class BookingStatusEmailTest(APITestCase):
+    def test_status_update_queues_email_instead_of_sending(self):
+        user = User.objects.create(username="customer", email="customer@mail.com")
+        booking = Booking.objects.create(date=timezone.now().date(), time="10:00", user=user)
+        self.client.force_authenticate(user)
+        response = self.client.put(f'/api/v1/booking/{booking.id}', {'status': 'approved'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(list(EmailOutbox.objects.values_list('to', flat=True)), [["customer@mail.com"]])
@@ -0,0 +1,98 @@
+from datetime import date, timedelta
+from unittest import mock
+
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve
+from rest_framework.test import APITestCase
+
+from beauty.models.about import About, AboutImage, Faq
+from beauty.models.booking import Booking
+from beauty.models.favorite import Favorite
+from beauty.models.region import Address, District, Mahalla, Region
+from beauty.models.service import Blog, Category, Service, Shop
+from beauty.query_budget import get_query_budget
+from beauty.views.service import ShopListAPIView
+from users.models import User
+
+ENDPOINTS = [
+    ('/api/v1/service/list', {}),
+    ('/api/v1/service/list', {'search': 'haircut', 'ordering': 'price'}),
+    ('/api/v1/category/service', {}),
+    ('/api/v1/search', {'name': 'haircut'}),
+    ('/api/v1/search/suggest', {'q': 'ha'}),
+    ('/api/v1/shop', {'search': 'shampoo'}),
+    ('/api/v1/blog', {}),
+    ('/api/v1/booking/my', {}),
+    ('/api/v1/category', {}),
+    ('/api/v1/region', {}),
+    ('/api/v1/district', {}),
+    ('/api/v1/mahalla', {}),
+    ('/api/v1/faq', {}),
+    ('/api/v1/about', {}),
+    ('/api/v1/geography', {}),
+]
+
+
+class QueryBudgetTest(APITestCase):
+    sizes = (1, 8, 25)
+
+    def setUp(self):
+        self.customer = User.objects.create(username="customer", email="customer@mail.com")
+        self.seeded = 0
+
+    def seed(self, count):
+        """
+        ``count`` more of everything the list endpoints show, spread over as many masters.
+        """
+        with self.captureOnCommitCallbacks(execute=True):
+            for i in range(self.seeded, self.seeded + count):
+                region = Region.objects.create(name=f"Region {i}")
+                district = District.objects.create(name=f"District {i}", region=region)
+                mahalla = Mahalla.objects.create(name=f"Mahalla {i}", district=district)
+                category = Category.objects.create(name=f"Hair {i}")
+                address = Address.objects.create(region=region, district=district, mahalla=mahalla, house=str(i))
+                master = User.objects.create(username=f"master{i}", email=f"master{i}@mail.com",
+                                             full_name=f"Master {i}", is_master=True, address=address)
+                service = Service.objects.create(name=f"Haircut {i}", price=100 + i, duration=timedelta(hours=1),
+                                                 category=category, user=master, image="service/a.png")
+                Favorite.set_like(service.id, self.customer, True)
+                booking = Booking.objects.create(date=date(2030, 1, 1) + timedelta(days=i), time="10:00",
+                                                 user=self.customer)
+                booking.service.add(service)
+                Shop.objects.create(name=f"Shampoo {i}", brand=f"Brand {i}", price=10, image="shop/a.png")
+                Blog.objects.create(title=f"Post {i}", description="Hair care", image1="blog/a.png")
+                Faq.objects.create(question=f"Question {i}?", answer="Yes")
+                about = About.objects.create(title=f"About {i}", description="Beauty")
+                about.image.add(AboutImage.objects.create(image="about/a.png"))
+        self.seeded += count
+
+    def test_list_endpoints_stay_within_their_budget_at_any_size(self):
+        self.client.force_authenticate(self.customer)
+        counts = {}
+        for size in self.sizes:
+            self.seed(size - self.seeded)
+            for url, params in ENDPOINTS:
+                budget = get_query_budget(resolve(url).func)
+                self.assertIsNotNone(budget, f'{url} declares no query_budget')
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(url, params)
+                self.assertEqual(response.status_code, 200, url)
+                self.assertLessEqual(len(queries), budget, f'{url} {params} at {size} rows')
+                counts.setdefault((url, str(params)), []).append(len(queries))
+        for endpoint, values in counts.items():
+            self.assertEqual(len(set(values)), 1, f'{endpoint} ran {values} queries for {self.sizes} rows')
+
+    @override_settings(QUERY_BUDGET_LOG=True)
+    def test_middleware_logs_counts_and_warns_over_budget(self):
+        self.seed(2)
+        with self.assertLogs('beauty.query_budget', 'INFO') as logs:
+            self.client.get('/api/v1/blog')
+        self.assertEqual(logs.records[0].levelname, 'INFO')
+        self.assertIn('queries (budget 3)', logs.output[0])
+
+        with mock.patch.object(ShopListAPIView, 'query_budget', 0), \
+                self.assertLogs('beauty.query_budget', 'WARNING') as logs:
+            self.client.get('/api/v1/shop')
+        self.assertIn('1 queries (budget 0)', logs.output[0])
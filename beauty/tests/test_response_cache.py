@@ -0,0 +1,114 @@
+import gzip
+import json
+from unittest import mock
+
+import tablib
+from django.core.cache import cache
+from import_export.resources import modelresource_factory
+from rest_framework.test import APITestCase
+
+from beauty.admin import ReferenceDataResource
+from beauty.models.about import About, AboutImage, Faq
+from beauty.models.region import District, Mahalla, Region
+
+
+class CachedResponseTest(APITestCase):
+    def setUp(self):
+        self.region = Region.objects.create(name="Toshkent")
+        District.objects.create(name="Chilonzor", region=self.region)
+        Faq.objects.create(question="Open?", answer="Always")
+        self.about = About.objects.create(title="Aura", description="Beauty")
+        self.about.image.add(AboutImage.objects.create(image="about/a.png"))
+
+    def test_hits_cost_no_queries(self):
+        for url in ('/api/v1/region', '/api/v1/district?region_id=%d' % self.region.id, '/api/v1/faq',
+                    '/api/v1/about', '/api/v1/category'):
+            first = self.client.get(url)
+            self.assertEqual(first.status_code, 200)
+            with self.assertNumQueries(0):
+                second = self.client.get(url)
+            self.assertEqual(second.content, first.content)
+            self.assertEqual(second['ETag'], first['ETag'])
+
+    def test_about_images_are_prefetched(self):
+        self.about.image.add(AboutImage.objects.create(image="about/b.png"))
+        About.objects.create(title="Team", description="Masters")
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/v1/about')
+        self.assertEqual([len(row['image']) for row in response.data], [2, 0])
+
+    def test_etag_is_answered_with_not_modified(self):
+        etag = self.client.get('/api/v1/faq')['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/v1/faq', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_changes_retire_cached_responses(self):
+        etag = self.client.get('/api/v1/about')['ETag']
+        self.about.image.add(AboutImage.objects.create(image="about/b.png"))
+        response = self.client.get('/api/v1/about', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()[0]['image']), 2)
+
+        Region.objects.create(name="Samarqand")
+        self.assertEqual(len(self.client.get('/api/v1/region').json()), 2)
+
+    def test_imports_retire_responses_once(self):
+        dataset = tablib.Dataset(*[(None, f"Region {i}") for i in range(3)], headers=['id', 'name'])
+        resource = modelresource_factory(Region, resource_class=ReferenceDataResource)()
+        with mock.patch('beauty.response_cache.bump_version') as bump, \
+                self.captureOnCommitCallbacks(execute=True):
+            result = resource.import_data(dataset)
+        self.assertFalse(result.has_errors())
+        self.assertEqual(Region.objects.count(), 4)
+        self.assertEqual(bump.call_args_list, [mock.call('model:beauty.region')] * 2)
+
+    def test_responses_are_built_while_the_cache_is_down(self):
+        with mock.patch.multiple(cache, get_many=mock.Mock(side_effect=ConnectionError),
+                                 incr=mock.Mock(side_effect=ConnectionError)), self.assertLogs('beauty.cache'):
+            Faq.objects.create(question="Cards?", answer="Yes")
+            response = self.client.get('/api/v1/faq', HTTP_IF_NONE_MATCH='"anything"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 2)
+        self.assertNotIn('ETag', response)
+
+
+class GeographyBundleTest(APITestCase):
+    def setUp(self):
+        self.region = Region.objects.create(name="Toshkent")
+        self.district = District.objects.create(name="Chilonzor", region=self.region)
+        Mahalla.objects.create(name="Qatortol", district=self.district)
+
+    def test_tree_is_served_gzipped_with_its_hash(self):
+        response = self.client.get('/api/v1/geography', HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        tree = json.loads(gzip.decompress(response.content))
+        self.assertEqual(tree[0]['districts'][0]['mahallas'][0]['name'], "Qatortol")
+
+        content_hash = response['ETag'].strip('"')
+        self.assertEqual(response['Content-Location'], f'/api/v1/geography/{content_hash}')
+        with self.assertNumQueries(0):
+            pinned = self.client.get(response['Content-Location'])
+        self.assertIn('immutable', pinned['Cache-Control'])
+        self.assertEqual(json.loads(pinned.content), tree)
+
+    def test_bundle_is_rebuilt_only_after_changes(self):
+        etag = self.client.get('/api/v1/geography')['ETag']
+        content_hash = etag.strip('"')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/api/v1/geography', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        Mahalla.objects.create(name="Bunyodkor", district=self.district)
+        response = self.client.get('/api/v1/geography', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()[0]['districts'][0]['mahallas']), 2)
+        outdated = self.client.get(f'/api/v1/geography/{content_hash}')
+        self.assertRedirects(outdated, response['Content-Location'], fetch_redirect_response=False)
+
+    def test_bundle_is_built_while_the_cache_is_down(self):
+        etag = self.client.get('/api/v1/geography')['ETag']
+        with mock.patch.object(cache, 'get_many', side_effect=ConnectionError), self.assertLogs('beauty.cache'):
+            Mahalla.objects.create(name="Bunyodkor", district=self.district)
+            response = self.client.get('/api/v1/geography')
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(len(response.json()[0]['districts'][0]['mahallas']), 2)
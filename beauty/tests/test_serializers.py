@@ -1,10 +1,15 @@
 from datetime import timedelta
+from unittest import mock
 
+from django.core.cache import cache
 from django.utils import timezone
 from rest_framework.test import APITestCase
 
+from beauty.geography import get_index
 from beauty.models.about import Faq, About, AboutImage, Contact
-from beauty.models.booking import Booking, WorkingDays
+from beauty.models.booking import Booking, WorkingDays, Time
+from beauty.models.region import Address, District, Mahalla, Region
+from beauty.models.service import Category, Service
 from beauty.serializers.about import (
     FaqModelSerializer,
     AboutImageModelSerializer,
@@ -14,7 +19,11 @@ from beauty.serializers.about import (
 from beauty.serializers.booking import (
     WorkingDaySerializer,
     BookingUpdateSerializer,
+    ServiceSerializer,
+    TimeSerializer,
 )
+from beauty.serializers.fields import HourMinuteDurationField
+from beauty.serializers.region import AddressSerializer
 from users.models import User
 
 
@@ -109,3 +118,76 @@ class BookingUpdateSerializerTest(APITestCase):
         self.assertTrue(serializer.is_valid())
         updated_booking = serializer.update(self.booking, serializer.validated_data)
         self.assertEqual(updated_booking.status, Booking.StatusChoices.APPROVED)
+
+
+class HourMinuteDurationFieldTest(APITestCase):
+    def test_hour_minute_format(self):
+        field = HourMinuteDurationField()
+        self.assertEqual(field.to_internal_value("01:30"), timedelta(hours=1, minutes=30))
+        self.assertEqual(field.to_internal_value("00:45:00"), timedelta(minutes=45))
+        self.assertEqual(field.to_representation(timedelta(hours=2, minutes=5)), "02:05")
+
+    def test_invalid_duration(self):
+        serializer = ServiceSerializer(data={"name": "Haircut", "price": "10.00", "duration": "soon"})
+        self.assertFalse(serializer.is_valid())
+        self.assertIn("duration", serializer.errors)
+
+
+class NativeTimeColumnsSerializerTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="master", email="master@mail.com", is_master=True)
+        self.day = WorkingDays.objects.create(day="Monday")
+        self.category = Category.objects.create(name="Hair")
+
+    def test_service_duration_keeps_hour_minute_format(self):
+        service = Service.objects.create(name="Haircut", price=10, duration=timedelta(hours=1, minutes=15),
+                                         category=self.category, user=self.user)
+        self.assertEqual(ServiceSerializer(service).data["duration"], "01:15")
+
+    def test_time_keeps_hour_minute_format(self):
+        time = Time.objects.create(day=self.day, start_time="09:00", end_time="17:30", user=self.user)
+        time.refresh_from_db()
+        data = TimeSerializer(time).data
+        self.assertEqual(data["start_time"], "09:00")
+        self.assertEqual(data["end_time"], "17:30")
+
+
+class AddressSerializerTest(APITestCase):
+    def setUp(self):
+        self.region = Region.objects.create(name="Toshkent")
+        self.district = District.objects.create(name="Chilonzor", region=self.region)
+        self.mahalla = Mahalla.objects.create(name="Qatortol", district=self.district)
+        other_region = Region.objects.create(name="Samarqand")
+        self.other_district = District.objects.create(name="Urgut", region=other_region)
+        get_index()
+
+    def test_rendering_does_not_query(self):
+        address = Address(id=1, region_id=self.region.id, district_id=self.district.id, mahalla_id=self.mahalla.id,
+                          house="7")
+        with self.assertNumQueries(0):
+            data = AddressSerializer(address).data
+        self.assertEqual(data, {"id": 1, "region": "Toshkent", "district": "Chilonzor", "mahalla": "Qatortol",
+                                "house": "7"})
+
+    def test_parts_must_belong_to_each_other(self):
+        data = {"region": self.region.id, "district": self.district.id, "mahalla": self.mahalla.id, "house": "7"}
+        with self.assertNumQueries(0):
+            self.assertTrue(AddressSerializer(data=data).is_valid())
+        serializer = AddressSerializer(data={**data, "district": self.other_district.id})
+        self.assertFalse(serializer.is_valid())
+        self.assertIn("district", serializer.errors)
+        serializer = AddressSerializer(data={**data, "mahalla": 0})
+        self.assertFalse(serializer.is_valid())
+        self.assertIn("mahalla", serializer.errors)
+
+    def test_new_rows_are_found_right_away(self):
+        mahalla = Mahalla.objects.create(name="Bunyodkor", district=self.district)
+        data = {"region": self.region.id, "district": self.district.id, "mahalla": mahalla.id, "house": "7"}
+        self.assertTrue(AddressSerializer(data=data).is_valid())
+
+    def test_addresses_are_validated_while_the_cache_is_down(self):
+        with mock.patch.object(cache, 'get_many', side_effect=ConnectionError), self.assertLogs('beauty.cache'):
+            mahalla = Mahalla.objects.create(name="Bunyodkor", district=self.district)
+            data = {"region": self.region.id, "district": self.district.id, "mahalla": mahalla.id, "house": "7"}
+            self.assertTrue(AddressSerializer(data=data).is_valid())
+            self.assertFalse(AddressSerializer(data={**data, "district": self.other_district.id}).is_valid())
@@ -0,0 +1,365 @@
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+
+from beauty.cache import get_version
+from beauty.models.favorite import Favorite, Saved, ShopFavorite
+from beauty.models.service import Blog, Category, Service, Shop
+from beauty.search import CATALOG_VERSION, has_trigram, is_postgresql, normalize_query
+from beauty.suggest import VERSION_NAME as SUGGEST_VERSION, suggester
+from users.models import User
+
+
+class CatalogFixtureMixin:
+    def create_catalog(self, services=3):
+        self.category = Category.objects.create(name="Hair")
+        self.customer = User.objects.create(username="customer", email="customer@mail.com")
+        self.services = []
+        for i in range(services):
+            master = User.objects.create(username=f"master{i}", email=f"master{i}@mail.com", is_master=True)
+            self.services.append(Service.objects.create(name=f"Haircut {i}", price=100, duration=timedelta(hours=1),
+                                                        category=self.category, user=master, image="service/a.png"))
+
+
+class ServiceListQueryTest(CatalogFixtureMixin, APITestCase):
+    def setUp(self):
+        self.create_catalog()
+        Favorite.set_like(self.services[0].id, self.customer, True)
+        Saved.objects.create(service=self.services[1], user=self.customer, saved=True)
+        self.client.force_authenticate(self.customer)
+
+    def assert_constant_queries(self, url, params, queries=1):
+        with self.assertNumQueries(queries):
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.data['results']
+
+    def test_list_endpoints_cost_one_query(self):
+        # The first search of a query also ranks the matches.
+        for url, params, queries in (('/api/v1/service/list', {}, 1), ('/api/v1/category/service', {}, 1),
+                                     ('/api/v1/search', {'name': 'Haircut'}, 2),
+                                     ('/api/v1/search', {'name': 'Haircut'}, 1)):
+            data = self.assert_constant_queries(url, params, queries)
+            rows = {row['id']: row for row in data}
+            self.assertEqual(len(rows), 3)
+            self.assertEqual(rows[self.services[0].id]['favorites_count'], 1)
+            self.assertTrue(rows[self.services[0].id]['is_like'])
+            self.assertFalse(rows[self.services[0].id]['is_saved'])
+            self.assertTrue(rows[self.services[1].id]['is_saved'])
+            self.assertEqual(rows[self.services[2].id]['user']['username'], "master2")
+
+    def test_anonymous_user_has_no_likes(self):
+        self.client.force_authenticate(None)
+        data = self.assert_constant_queries('/api/v1/service/list', {'category_id': self.category.id})
+        self.assertFalse(any(row['is_like'] or row['is_saved'] for row in data))
+
+
+class LikeCounterTest(CatalogFixtureMixin, APITestCase):
+    def setUp(self):
+        self.create_catalog(services=1)
+        self.service = self.services[0]
+        self.shop = Shop.objects.create(name="Shampoo", price=10, image="shop/a.png")
+        self.client.force_authenticate(self.customer)
+
+    def favorites(self, instance):
+        instance.refresh_from_db(fields=['favorites_count'])
+        return instance.favorites_count
+
+    def test_toggling_keeps_the_counter(self):
+        response = self.client.post('/api/v1/favorite', {'service': self.service.id, 'like': True}, format='json')
+        self.assertEqual(response.data['likes_count'], 1)
+        self.client.post('/api/v1/favorite', {'service': self.service.id, 'like': True}, format='json')
+        self.assertEqual(self.favorites(self.service), 1)
+        self.client.post('/api/v1/favorite', {'service': self.service.id, 'like': False}, format='json')
+        self.assertEqual(self.favorites(self.service), 0)
+
+        response = self.client.post('/api/v1/shop/favorite', {'product': self.shop.id, 'like': True}, format='json')
+        self.assertEqual(response.data['likes_count'], 1)
+        self.client.post('/api/v1/shop/favorite', {'product': self.shop.id, 'like': False}, format='json')
+        self.assertEqual(self.favorites(self.shop), 0)
+
+    def test_counter_keeps_counting_every_favorite_row(self):
+        Favorite.set_like(self.service.id, self.customer, 0)
+        self.assertEqual(self.favorites(self.service), 1)
+        response = self.client.get('/api/v1/service/list')
+        self.assertEqual(response.data['results'][0]['favorites_count'], 1)
+
+        response = self.client.post('/api/v1/favorite', {'service': self.service.id, 'like': True}, format='json')
+        self.assertEqual(response.data['likes_count'], 1)
+        self.assertEqual(self.favorites(self.service), 1)
+
+    def test_reconciliation_repairs_drift(self):
+        Favorite.objects.create(service=self.service, user=self.customer, like=True)
+        Favorite.objects.create(service=self.service, user=self.services[0].user)
+        ShopFavorite.set_like(self.shop.id, self.customer, True)
+        Shop.objects.update(favorites_count=5)
+        call_command('reconcile_favorite_counts', stdout=StringIO())
+        self.assertEqual(self.favorites(self.service), 2)
+        self.assertEqual(self.favorites(self.shop), 1)
+
+
+class CatalogPaginationTest(CatalogFixtureMixin, APITestCase):
+    def setUp(self):
+        self.create_catalog(services=5)
+        for service in self.services:
+            Favorite.set_like(service.id, self.customer, True)
+
+    def walk(self, url, params):
+        ids, response = [], self.client.get(url, params)
+        while True:
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(len(response.data['results']), params['page_size'])
+            ids += [row['id'] for row in response.data['results']]
+            if not response.data['next']:
+                return ids
+            response = self.client.get(response.data['next'])
+
+    def test_catalog_lists_are_walked_by_cursor(self):
+        self.client.force_authenticate(self.customer)
+        expected = [service.id for service in self.services]
+        for url, params in (('/api/v1/service/list', {}), ('/api/v1/category/service', {}),
+                            ('/api/v1/search', {'name': 'Haircut'})):
+            self.assertEqual(self.walk(url, {**params, 'page_size': 2}), expected)
+        self.assertEqual(len(self.walk('/api/v1/favorite', {'page_size': 2})), 5)
+
+    def test_page_size_is_bounded(self):
+        for i in range(105):
+            Shop.objects.create(name=f"Shampoo {i}", price=10, image="shop/a.png")
+        response = self.client.get('/api/v1/shop', {'page_size': 1000})
+        self.assertEqual(len(response.data['results']), 100)
+        self.assertIsNotNone(response.data['next'])
+
+
+class ServiceSearchTest(CatalogFixtureMixin, APITestCase):
+    def setUp(self):
+        self.create_catalog(services=2)
+        colouring = Category.objects.create(name="Colouring")
+        master = User.objects.create(username="stylist", full_name="Anna Balayage", email="anna@mail.com",
+                                     is_master=True)
+        self.by_master = Service.objects.create(name="Toning", price=100, duration=timedelta(hours=1),
+                                                category=colouring, user=master, image="service/a.png")
+        self.by_name = Service.objects.create(name="Balayage", price=100, duration=timedelta(hours=1),
+                                              category=colouring, user=master, image="service/a.png")
+
+    def search(self, url, params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return [row['id'] for row in response.data['results']]
+
+    def test_name_matches_rank_above_other_fields(self):
+        for url, params in (('/api/v1/service/list', {'search': 'balayage'}), ('/api/v1/search', {'name': 'balayage'})):
+            self.assertEqual(self.search(url, params), [self.by_name.id, self.by_master.id])
+
+    def test_typos_still_match(self):
+        if is_postgresql() and not has_trigram():
+            self.skipTest('pg_trgm is not installed')
+        self.assertEqual(self.search('/api/v1/search', {'name': 'balayge'})[0], self.by_name.id)
+
+    def test_documents_follow_renamed_masters(self):
+        self.by_master.user.full_name = "Anna Ombre"
+        self.by_master.user.save()
+        self.assertCountEqual(self.search('/api/v1/service/list', {'search': 'ombre'}),
+                              [self.by_master.id, self.by_name.id])
+
+    def test_ranked_results_are_walked_by_cursor(self):
+        ids, response = [], self.client.get('/api/v1/service/list', {'search': 'haircut', 'page_size': 1})
+        while True:
+            ids += [row['id'] for row in response.data['results']]
+            if not response.data['next']:
+                break
+            response = self.client.get(response.data['next'])
+        self.assertEqual(ids, [service.id for service in self.services])
+
+    def test_shops_and_blogs_are_searchable(self):
+        shampoo = Shop.objects.create(name="Argan shampoo", brand="Kapous", price=10, image="shop/a.png")
+        Shop.objects.create(name="Hair dryer", price=10, image="shop/a.png")
+        blog = Blog.objects.create(title="Summer hair care", description="Use a shampoo", image1="blog/a.png")
+        self.assertEqual(self.search('/api/v1/shop', {'search': 'kapous'}), [shampoo.id])
+        self.assertEqual(self.search('/api/v1/blog', {'search': 'summer'}), [blog.id])
+
+
+    def test_equivalent_queries_share_cached_results(self):
+        self.assertEqual(normalize_query("  O\u2018zbek  Soch\u02bcI "), "o'zbek soch'i")
+        first = self.search('/api/v1/search', {'name': 'Balayage'})
+        with self.assertNumQueries(1):
+            self.assertEqual(self.search('/api/v1/search', {'name': '  BALAYAGE '}), first)
+
+    def test_saving_a_service_retires_cached_results(self):
+        self.assertEqual(self.search('/api/v1/search', {'name': 'curls'}), [])
+        self.by_master.name = "Curls"
+        self.by_master.save()
+        self.assertEqual(self.search('/api/v1/search', {'name': 'curls'}), [self.by_master.id])
+
+    def test_explicit_ordering_wins_over_relevance(self):
+        for i, service in enumerate(self.services):
+            Service.objects.filter(pk=service.pk).update(price=300 - 100 * i)
+        ids, response = [], self.client.get('/api/v1/service/list',
+                                            {'search': 'haircut', 'ordering': 'price', 'page_size': 1})
+        while True:
+            self.assertEqual(response.status_code, 200)
+            ids += [row['id'] for row in response.data['results']]
+            if not response.data['next']:
+                break
+            response = self.client.get(response.data['next'])
+        self.assertEqual(ids, [service.id for service in reversed(self.services)])
+
+    def test_filters_are_applied_before_ranking(self):
+        cheap = self.services[-1]
+        Service.objects.filter(pk=cheap.pk).update(price=10)
+        with mock.patch('beauty.search.SEARCH_RESULT_LIMIT', 1):
+            self.assertEqual(self.search('/api/v1/service/list', {'search': 'haircut'}), [self.services[0].id])
+            self.assertEqual(self.search('/api/v1/service/list', {'search': 'haircut', 'price_max': 50}), [cheap.id])
+
+    def test_price_changes_retire_cached_filtered_results(self):
+        self.assertEqual(self.search('/api/v1/service/list', {'search': 'haircut', 'price_max': 50}), [])
+        self.services[0].price = 10
+        self.services[0].save(update_fields=['price'])
+        self.assertEqual(self.search('/api/v1/service/list', {'search': 'haircut', 'price_max': 50}),
+                         [self.services[0].id])
+
+    def test_search_works_while_the_cache_is_down(self):
+        with mock.patch.multiple(cache, get=mock.Mock(side_effect=ConnectionError),
+                                 get_many=mock.Mock(side_effect=ConnectionError),
+                                 set=mock.Mock(side_effect=ConnectionError)), self.assertLogs('beauty.cache'):
+            self.assertEqual(self.search('/api/v1/search', {'name': 'balayage'}), [self.by_name.id, self.by_master.id])
+
+    def test_statement_does_not_grow_with_the_results(self):
+        if not is_postgresql():
+            self.skipTest('ranks are joined as arrays on PostgreSQL only')
+        with CaptureQueriesContext(connection) as queries:
+            self.search('/api/v1/service/list', {'search': 'haircut'})
+        self.assertNotIn('CASE', queries.captured_queries[-1]['sql'])
+        self.assertIn('array_position', queries.captured_queries[-1]['sql'])
+
+    def test_in_process_ranking_scans_a_bounded_number_of_rows(self):
+        if is_postgresql():
+            self.skipTest('PostgreSQL ranks in the database')
+        with mock.patch('beauty.search.IN_PROCESS_ROW_LIMIT', 2), self.assertLogs('beauty.search', 'WARNING'):
+            ids = self.search('/api/v1/service/list', {'search': 'haircut'})
+        self.assertEqual(ids, [service.id for service in self.services[:2]])
+
+
+class SuggestTest(CatalogFixtureMixin, APITestCase):
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_catalog(services=2)
+            Shop.objects.create(name="Argan shampoo", brand="Kapous", price=10, image="shop/a.png")
+            self.master = User.objects.create(username="stylist", full_name="Karina Hairova", email="k@mail.com",
+                                              is_master=True)
+
+    def suggest(self, q, **params):
+        response = self.client.get('/api/v1/search/suggest', {'q': q, **params})
+        self.assertEqual(response.status_code, 200)
+        return [(row['type'], row['text']) for row in response.data]
+
+    def test_prefixes_of_any_word_match(self):
+        self.assertEqual(self.suggest('ka'), [('brand', 'Kapous'), ('master', 'Karina Hairova')])
+        self.assertEqual(self.suggest('HAIR'), [('category', 'Hair'), ('service', 'Haircut 0'),
+                                                ('service', 'Haircut 1'), ('master', 'Karina Hairova')])
+        self.assertEqual(self.suggest('hair', limit=1), [('category', 'Hair')])
+        self.assertEqual(self.suggest(''), [])
+
+    def test_lookups_do_not_touch_the_database(self):
+        self.suggest('hair')
+        with self.assertNumQueries(0):
+            self.suggest('haircut')
+
+    def test_changes_are_picked_up_after_commit(self):
+        self.suggest('hair')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category.name = "Nails"
+            self.category.save()
+        self.assertEqual(self.suggest('nai'), [('category', 'Nails')])
+
+    def test_namesakes_are_suggested_apart(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            namesake = User.objects.create(username="karina", full_name="Karina Hairova", email="k2@mail.com",
+                                           is_master=True)
+        response = self.client.get('/api/v1/search/suggest', {'q': 'karina'})
+        self.assertEqual([row['id'] for row in response.data], [self.master.id, namesake.id])
+
+    def test_index_is_warmed_outside_requests(self):
+        suggester.expire()
+        suggester._index = None
+        suggester.warm()
+        with self.assertNumQueries(0):
+            self.suggest('hair')
+
+        suggester.expire()
+        suggester._index = None
+        with mock.patch('beauty.suggest.build_index', side_effect=DatabaseError), self.assertLogs('beauty.suggest'):
+            suggester.warm()
+        self.assertEqual(self.suggest('ka'), [('brand', 'Kapous'), ('master', 'Karina Hairova')])
+
+
+class ServiceFilterTest(CatalogFixtureMixin, APITestCase):
+    def setUp(self):
+        self.create_catalog(services=4)
+        for i, service in enumerate(self.services):
+            Service.objects.filter(pk=service.pk).update(price=100 * (i + 1), duration=timedelta(minutes=30 * (i + 1)),
+                                                         favorites_count=[2, 9, 0, 5][i])
+
+    def ids(self, params):
+        response = self.client.get('/api/v1/service/list', params)
+        self.assertEqual(response.status_code, 200)
+        return [row['id'] for row in response.data['results']]
+
+    def test_filters_combine(self):
+        first, second, third, fourth = [service.id for service in self.services]
+        self.assertEqual(self.ids({'price_min': 200, 'price_max': 300}), [second, third])
+        self.assertEqual(self.ids({'duration_max': '01:00', 'category_id': self.category.id}), [first, second])
+        self.assertEqual(self.ids({'id': first, 'user_id': self.services[1].user_id}), [])
+        self.assertEqual(self.client.get('/api/v1/service/list', {'duration_min': 'soon'}).status_code, 400)
+
+    def test_ordering_is_kept_across_pages(self):
+        first, second, third, fourth = [service.id for service in self.services]
+        for ordering, expected in (('-price', [fourth, third, second, first]),
+                                   ('newest', [fourth, third, second, first]),
+                                   ('popularity', [second, fourth, first, third])):
+            ids, response = [], self.client.get('/api/v1/service/list', {'ordering': ordering, 'page_size': 3})
+            while True:
+                ids += [row['id'] for row in response.data['results']]
+                if not response.data['next']:
+                    break
+                response = self.client.get(response.data['next'])
+            self.assertEqual(ids, expected)
+
+
+class CatalogVersionTest(CatalogFixtureMixin, APITestCase):
+    def setUp(self):
+        self.create_catalog(services=1)
+        self.master = self.services[0].user
+
+    def test_only_renamed_masters_move_the_catalog(self):
+        version = get_version(CATALOG_VERSION)
+        self.customer.full_name = "Someone Else"
+        self.customer.save()
+        self.master.phone = "+998901234567"
+        self.master.save()
+        User.objects.get(pk=self.master.pk).save()
+        self.assertEqual(get_version(CATALOG_VERSION), version)
+
+        self.master.full_name = "Renamed Master"
+        self.master.save()
+        self.assertNotEqual(get_version(CATALOG_VERSION), version)
+
+    def test_only_master_changes_rebuild_suggestions(self):
+        version = get_version(SUGGEST_VERSION)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.customer.full_name = "Someone Else"
+            self.customer.save()
+            User.objects.create(username="another", email="another@mail.com")
+            self.master.phone = "+998901234567"
+            self.master.save()
+        self.assertEqual(get_version(SUGGEST_VERSION), version)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.customer.is_master = True
+            self.customer.save()
+        self.assertNotEqual(get_version(SUGGEST_VERSION), version)
@@ -0,0 +1,70 @@
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+
+from django.core.management import call_command
+from rest_framework.test import APITestCase
+
+from beauty.models.booking import Booking, MasterDailyStats
+from beauty.models.service import Service
+from beauty.tests.test_booking import BookingFixtureMixin
+
+
+class MasterDailyStatsTest(BookingFixtureMixin, APITestCase):
+    def setUp(self):
+        self.create_fixture(masters=2)
+        self.extra = Service.objects.create(name="Styling", price=50, duration=timedelta(minutes=30),
+                                            category=self.category, user=self.masters[0])
+
+    def stats(self):
+        return {(row.master_id, row.date, row.status): (row.bookings, row.revenue)
+                for row in MasterDailyStats.objects.filter(bookings__gt=0)}
+
+    def assert_matches_rebuild(self):
+        incremental = self.stats()
+        call_command('rebuild_daily_stats', stdout=StringIO())
+        self.assertEqual(incremental, self.stats())
+
+    def test_created_booking_is_counted_once_per_master(self):
+        serializer = self.booking_serializer(self.services[0], "10:00")
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        self.assertEqual(self.stats(), {(self.masters[0].id, self.date, 'pending'): (1, Decimal('100'))})
+
+        booking = Booking.objects.create(date=self.date, time="12:00", user=self.customer)
+        booking.service.set([self.services[0], self.extra, self.services[1]])
+        self.assertEqual(self.stats()[self.masters[0].id, self.date, 'pending'], (2, Decimal('250')))
+        self.assertEqual(self.stats()[self.masters[1].id, self.date, 'pending'], (1, Decimal('100')))
+        self.assert_matches_rebuild()
+
+    def test_status_changes_move_the_booking(self):
+        bookings = []
+        for start in ("10:00", "12:00", "14:00"):
+            booking = Booking.objects.create(date=self.date, time=start, user=self.customer)
+            booking.service.set([self.services[0]])
+            bookings.append(booking)
+
+        self.client.force_authenticate(self.masters[0])
+        self.client.put(f'/api/v1/booking/{bookings[0].id}', {'status': 'approved'}, format='json')
+        self.client.put('/api/v1/booking/batch/status', {'booking_ids': [bookings[1].id, bookings[2].id],
+                                                         'status': 'rejected'}, format='json')
+        self.client.delete(f'/api/v1/booking/{bookings[2].id}')
+
+        self.assertEqual(self.stats(), {(self.masters[0].id, self.date, 'approved'): (1, Decimal('100')),
+                                        (self.masters[0].id, self.date, 'rejected'): (1, Decimal('100'))})
+        self.assert_matches_rebuild()
+
+    def test_master_reads_daily_rows(self):
+        booking = Booking.objects.create(date=self.date, time="10:00", user=self.customer, status='approved')
+        booking.service.set([self.services[0], self.extra])
+
+        self.client.force_authenticate(self.masters[0])
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/v1/booking/stats', {'from': self.date.isoformat(),
+                                                                 'to': self.date.isoformat()})
+        self.assertEqual(response.data['days'], [{'date': self.date.isoformat(), 'status': 'approved',
+                                                  'bookings': 1, 'revenue': '150.00'}])
+        self.assertEqual(response.data['totals'], {'approved': {'bookings': 1, 'revenue': '150.00'}})
+
+        self.client.force_authenticate(self.customer)
+        self.assertEqual(self.client.get('/api/v1/booking/stats').status_code, 403)
@@ -1,12 +1,14 @@
 from django.urls import path
 
-from beauty.views.about import FaqAPIView, AboutAPIView, SearchServiceByNameView, ContactCreateAPIView
+from beauty.views.about import FaqAPIView, AboutAPIView, SearchServiceByNameView, ContactCreateAPIView, SuggestAPIView
 from beauty.views.booking import (TimeListCreateAPIView, TimeUpdateDestroyAPIView, MasterFreeTimeListAPIView,
                                   BookingCreateAPIView, WorkingDayListAPIView, MyBookingListAPIView,
-                                  BookingUpdateAPIView)
+                                  BookingUpdateAPIView, MasterFreeTimeRangeAPIView, BookingBatchCreateAPIView,
+                                  MasterCalendarLinkAPIView, MasterCalendarFeedAPIView, BookingBulkStatusUpdateAPIView,
+                                  SlotHoldCreateAPIView, SlotHoldDestroyAPIView, MasterStatsAPIView)
 from beauty.views.favorite import (FavoriteListCreateAPIView, SavedListCreateAPIView, ShopFavoriteListCreateAPIView,
                                    ShopSavedListCreateAPIView)
-from beauty.views.region import RegionListAPIView, DistrictListAPIView, MahallaListAPIView
+from beauty.views.region import RegionListAPIView, DistrictListAPIView, MahallaListAPIView, GeographyBundleAPIView
 from beauty.views.service import (CategoryListCreateAPIView, ServiceCreateAPIView,
                                   ServiceRetrieveUpdateDestroyAPIView, ServiceListAPIView, ServiceByCategoryAPIView,
                                   ShopListAPIView, BlogListAPIView, BlogRetrieveApiView, ShopRetrieveAPIView)
@@ -15,6 +17,8 @@ urlpatterns = [
     path("region", RegionListAPIView.as_view()),
     path("district", DistrictListAPIView.as_view()),
     path("mahalla", MahallaListAPIView.as_view()),
+    path("geography", GeographyBundleAPIView.as_view(), name="geography"),
+    path("geography/<str:content_hash>", GeographyBundleAPIView.as_view(), name="geography-bundle"),
     path("category", CategoryListCreateAPIView.as_view()),
     path("favorite", FavoriteListCreateAPIView.as_view()),
     path("saved", SavedListCreateAPIView.as_view()),
@@ -26,8 +30,16 @@ urlpatterns = [
     path("working/time/<int:pk>", TimeUpdateDestroyAPIView.as_view()),
     path("booking/<int:pk>", BookingUpdateAPIView.as_view()),
     path("booking", BookingCreateAPIView.as_view()),
+    path("booking/batch", BookingBatchCreateAPIView.as_view()),
+    path("booking/batch/status", BookingBulkStatusUpdateAPIView.as_view()),
     path("booking/time", MasterFreeTimeListAPIView.as_view()),
+    path("booking/time/range", MasterFreeTimeRangeAPIView.as_view()),
+    path("booking/hold", SlotHoldCreateAPIView.as_view()),
+    path("booking/hold/<str:token>", SlotHoldDestroyAPIView.as_view()),
     path("booking/my", MyBookingListAPIView.as_view()),
+    path("booking/stats", MasterStatsAPIView.as_view()),
+    path("booking/calendar", MasterCalendarLinkAPIView.as_view()),
+    path("booking/calendar/<str:token>.ics", MasterCalendarFeedAPIView.as_view(), name="booking-calendar"),
     path("faq", FaqAPIView.as_view()),
     path("about", AboutAPIView.as_view()),
     path("category/service", ServiceByCategoryAPIView.as_view()),
@@ -38,6 +50,7 @@ urlpatterns = [
     path("blog", BlogListAPIView.as_view()),
     path("blog/<int:pk>", BlogRetrieveApiView.as_view()),
     path("search", SearchServiceByNameView.as_view()),
+    path("search/suggest", SuggestAPIView.as_view()),
     path("contact", ContactCreateAPIView.as_view()),
 
 ]
@@ -4,27 +4,36 @@ from rest_framework import status
 from rest_framework.generics import ListAPIView, CreateAPIView
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
+from rest_framework.views import APIView
 
-from beauty.models.about import Faq, About
+from beauty.models.about import Faq, About, AboutImage
 from beauty.models.service import Service
+from beauty.pagination import CatalogCursorPagination
+from beauty.response_cache import CachedResponseMixin
+from beauty.search import search
+from beauty.suggest import MAX_SUGGESTIONS, suggester
 from beauty.serializers.about import AboutModelSerializer, FaqModelSerializer, ContactModelSerializer
 from beauty.serializers.service import ServiceListSerializer
 
 
-class FaqAPIView(ListAPIView):
+class FaqAPIView(CachedResponseMixin, ListAPIView):
     permission_classes = [AllowAny]
     serializer_class = FaqModelSerializer
     queryset = Faq.objects.all()
+    cache_models = (Faq,)
+    query_budget = 1
 
     @swagger_auto_schema(operation_description="Frequently Asked Questions")
     def get(self, request, *args, **kwargs):
         return super().get(request, *args, **kwargs)
 
 
-class AboutAPIView(ListAPIView):
+class AboutAPIView(CachedResponseMixin, ListAPIView):
     permission_classes = [AllowAny]
     serializer_class = AboutModelSerializer
-    queryset = About.objects.all()
+    queryset = About.objects.prefetch_related('image')
+    cache_models = (About, AboutImage)
+    query_budget = 2
 
     @swagger_auto_schema(operation_description="About Us")
     def get(self, request, *args, **kwargs):
@@ -32,6 +41,8 @@ class AboutAPIView(ListAPIView):
 
 class SearchServiceByNameView(ListAPIView):
     serializer_class = ServiceListSerializer
+    pagination_class = CatalogCursorPagination
+    query_budget = 3  # page, search ranking, authentication
 
     @swagger_auto_schema(
         manual_parameters=[
@@ -43,10 +54,35 @@ class SearchServiceByNameView(ListAPIView):
         name_query = self.request.query_params.get('name', None)
         if not name_query:
             return Response({"error": "The 'name' query parameter is required."}, status=status.HTTP_400_BAD_REQUEST)
+        return super().get(request, *args, **kwargs)
+
+    def get_queryset(self):
+        return search(Service.objects.for_listing(self.request.user), self.request.query_params.get('name', ''))
+
+
+class SuggestAPIView(APIView):
+    """
+    Typeahead suggestions for the search box, answered from an in-process index
+    of service, category, brand and master names.
+    """
+    permission_classes = [AllowAny]
+    query_budget = 5  # index build, authentication
+
+    @swagger_auto_schema(
+        manual_parameters=[
+            openapi.Parameter('q', openapi.IN_QUERY, description="Typed prefix", type=openapi.TYPE_STRING),
+            openapi.Parameter('limit', openapi.IN_QUERY, description=f"At most {MAX_SUGGESTIONS}",
+                              type=openapi.TYPE_INTEGER)
+        ]
+    )
+    def get(self, request, *args, **kwargs):
+        try:
+            limit = min(max(int(request.query_params.get('limit', MAX_SUGGESTIONS)), 1), MAX_SUGGESTIONS)
+        except ValueError:
+            return Response({"error": "The 'limit' query parameter must be a number."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        return Response(suggester.suggest(request.query_params.get('q', ''), limit))
 
-        queryset = Service.objects.filter(name__icontains=name_query)
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
 
 class ContactCreateAPIView(CreateAPIView):
     serializer_class = ContactModelSerializer
@@ -1,16 +1,30 @@
+from django.db.models import Q, Prefetch, Sum
+from django.http import StreamingHttpResponse
+from django.urls import reverse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
 from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
 from rest_framework import status
-from rest_framework.exceptions import ValidationError
+from rest_framework.exceptions import ValidationError, NotFound, PermissionDenied
 from rest_framework.filters import BaseFilterBackend
-from rest_framework.generics import ListAPIView, ListCreateAPIView, UpdateAPIView, DestroyAPIView, CreateAPIView
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.generics import (ListAPIView, ListCreateAPIView, UpdateAPIView, DestroyAPIView, CreateAPIView,
+                                     GenericAPIView)
+from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.response import Response
+from rest_framework.views import APIView
 
-from beauty.models.booking import WorkingDays, Time, Booking
+from beauty.calendar import (calendar_token, read_calendar_token, rotate_calendar_key, calendar_state, iter_calendar,
+                             ICS_CONTENT_TYPE)
+from beauty.holds import get_hold, release_hold
+
+from beauty.models.booking import WorkingDays, Time, Booking, MasterDailyStats
+from beauty.models.service import Service
+from beauty.pagination import BookingCursorPagination
 from beauty.serializers.booking import (WorkingDaySerializer, TimeSerializer, BookingSerializer,
                                         MasterFreeTimeSerializer, BookingUpdateSerializer, MyBookingSerializer,
-                                        UserServiceSerializer, ServiceSerializer)
+                                        MasterFreeTimeRangeSerializer, BookingBulkStatusSerializer, SlotHoldSerializer,
+                                        MasterDailyStatsSerializer, MasterStatsRangeSerializer)
 
 
 class WorkingDayListAPIView(ListAPIView):
@@ -27,6 +41,7 @@ class WorkingDayListAPIView(ListAPIView):
 class TimeListCreateAPIView(ListCreateAPIView):
     """
     API endpoint that allows for request user working hours to be viewed or created.
+    POST adds the windows, PUT replaces the whole week with them. Overlapping windows are rejected.
 
     {
       "times": [
@@ -54,6 +69,13 @@ class TimeListCreateAPIView(ListCreateAPIView):
         self.perform_create(serializer)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
+    def put(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data.get('times', []), many=True,
+                                         context={**self.get_serializer_context(), 'replace': True})
+        serializer.is_valid(raise_exception=True)
+        serializer.replace(request.user)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
     def get_queryset(self):
         return Time.objects.filter(user=self.request.user)
 
@@ -108,6 +130,44 @@ class MasterFreeTimeListAPIView(ListAPIView):
         return Response({"free_times": free_times}, status=200)
 
 
+class MasterFreeTimeRangeAPIView(ListAPIView):
+    """
+    API endpoint that allows for master free time to be viewed for a range of dates (at most 31 days).
+
+    Example request:
+    booking/time/range?from=2025-05-01&to=2025-05-31&service_ids=1,2
+    """
+    serializer_class = MasterFreeTimeRangeSerializer
+
+    @swagger_auto_schema(
+        manual_parameters=[
+            openapi.Parameter('from', openapi.IN_QUERY, description='First date in format YYYY-MM-DD',
+                              type=openapi.TYPE_STRING),
+            openapi.Parameter('to', openapi.IN_QUERY, description='Last date in format YYYY-MM-DD',
+                              type=openapi.TYPE_STRING),
+            openapi.Parameter('service_ids', openapi.IN_QUERY, description='List of service IDs',
+                              type=openapi.TYPE_ARRAY,
+                              items=openapi.Items(type=openapi.TYPE_INTEGER))
+        ],
+    )
+    def get(self, request, *args, **kwargs):
+        service_ids = request.query_params.get('service_ids')
+
+        if service_ids:
+            try:
+                service_ids = [int(id) for id in service_ids.split(',')]
+            except ValueError:
+                raise ValidationError("Invalid value for service_ids. Expected a comma-separated list of integers.")
+
+        serializer = self.serializer_class(data={
+            'date_from': request.query_params.get('from'),
+            'date_to': request.query_params.get('to'),
+            'service_ids': service_ids or [],
+        })
+        serializer.is_valid(raise_exception=True)
+        return Response({"days": serializer.get_days()}, status=200)
+
+
 class BookingCreateAPIView(CreateAPIView):
     """
     API endpoint that allows for booking to be created.
@@ -119,6 +179,31 @@ class BookingCreateAPIView(CreateAPIView):
     permission_classes = (IsAuthenticated,)
 
 
+class BookingBatchCreateAPIView(CreateAPIView):
+    """
+    API endpoint that allows for several bookings to be created at once, e.g. for a family.
+    Either every booking is created or none is; errors are reported per booking in request order,
+    each as a dict of field errors. An empty list of bookings is rejected.
+
+    Example request:
+    {
+      "bookings": [
+        {"date": "2025-05-01", "time": "10:00", "service_ids": [1]},
+        {"date": "2025-05-01", "time": "10:00", "service_ids": [2, 3]}
+      ]
+    }
+    """
+    queryset = Booking.objects.all()
+    serializer_class = BookingSerializer
+    permission_classes = (IsAuthenticated,)
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data.get('bookings', []), many=True, allow_empty=False)
+        serializer.is_valid(raise_exception=True)
+        self.perform_create(serializer)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
 class BookingUpdateAPIView(UpdateAPIView, DestroyAPIView):
     """
     API endpoint that allows for booking to be updated.
@@ -137,6 +222,97 @@ class BookingUpdateAPIView(UpdateAPIView, DestroyAPIView):
         return Booking.objects.filter(user=self.request.user)
 
 
+class SlotHoldCreateAPIView(CreateAPIView):
+    """
+    API endpoint that holds a slot for a few minutes during checkout.
+    Pass the returned token as "hold" when creating the booking.
+
+    Example request:
+    {
+      "date": "2024-03-01",
+      "time": "10:00",
+      "service_ids": [1, 2]
+    }
+    """
+    serializer_class = SlotHoldSerializer
+    permission_classes = (IsAuthenticated,)
+
+
+class SlotHoldDestroyAPIView(APIView):
+    """
+    API endpoint that releases a slot hold before it expires.
+    """
+    permission_classes = (IsAuthenticated,)
+
+    def delete(self, request, token, *args, **kwargs):
+        hold = get_hold(token)
+        if hold is None or hold['user_id'] != request.user.id:
+            raise NotFound()
+        release_hold(token)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class BookingBulkStatusUpdateAPIView(GenericAPIView):
+    """
+    API endpoint that allows a master to change the status of many bookings at once.
+
+    Example request:
+    {
+      "booking_ids": [1, 2, 3],
+      "status": "approved"
+    }
+    """
+    serializer_class = BookingBulkStatusSerializer
+    permission_classes = (IsAuthenticated,)
+
+    def put(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        changed = serializer.save()
+        return Response({'status': serializer.validated_data['status'],
+                         'booking_ids': sorted(serializer.validated_data['booking_ids']),
+                         'changed': len(changed)}, status=status.HTTP_200_OK)
+
+
+class MasterStatsAPIView(APIView):
+    """
+    API endpoint that returns the request master's bookings and revenue per day and status.
+    Defaults to the last 30 days.
+
+    Example request:
+    # from = 2024-03-01, to = 2024-03-31
+    """
+    permission_classes = (IsAuthenticated,)
+
+    @swagger_auto_schema(
+        manual_parameters=[
+            openapi.Parameter('from', openapi.IN_QUERY, description='First day in format YYYY-MM-DD',
+                              type=openapi.TYPE_STRING),
+            openapi.Parameter('to', openapi.IN_QUERY, description='Last day in format YYYY-MM-DD',
+                              type=openapi.TYPE_STRING),
+        ],
+    )
+    def get(self, request, *args, **kwargs):
+        if not request.user.is_master:
+            raise PermissionDenied("Only masters have booking statistics")
+        params = {'date_from': request.query_params.get('from'), 'date_to': request.query_params.get('to')}
+        serializer = MasterStatsRangeSerializer(data={key: value for key, value in params.items() if value})
+        serializer.is_valid(raise_exception=True)
+
+        stats = (MasterDailyStats.objects
+                 .filter(master=request.user, bookings__gt=0,
+                         date__range=(serializer.validated_data['date_from'], serializer.validated_data['date_to']))
+                 .order_by('date', 'status'))
+        totals = stats.values('status').annotate(bookings=Sum('bookings'), revenue=Sum('revenue')).order_by('status')
+        return Response({
+            'date_from': serializer.validated_data['date_from'],
+            'date_to': serializer.validated_data['date_to'],
+            'days': MasterDailyStatsSerializer(stats, many=True).data,
+            'totals': {row['status']: {'bookings': row['bookings'], 'revenue': f'{row["revenue"]:.2f}'}
+                       for row in totals},
+        })
+
+
 class BookingStatusFilterBackend(BaseFilterBackend):
     def filter_queryset(self, request, queryset, view):
         status = request.query_params.get('status')
@@ -148,6 +324,7 @@ class BookingStatusFilterBackend(BaseFilterBackend):
 class MyBookingListAPIView(ListAPIView):
     """
     API endpoint that allows for request user own booking to be viewed.
+    Masters also see the bookings of their services. Results are cursor paginated, newest first.
 
     Example request:
     # status = pending, approved, rejected
@@ -157,6 +334,8 @@ class MyBookingListAPIView(ListAPIView):
     queryset = Booking.objects.all()
     permission_classes = (IsAuthenticated,)
     filter_backends = [BookingStatusFilterBackend]
+    pagination_class = BookingCursorPagination
+    query_budget = 6  # page, services, geography index build, authentication
 
     @swagger_auto_schema(
         manual_parameters=[
@@ -165,108 +344,75 @@ class MyBookingListAPIView(ListAPIView):
             openapi.Parameter('status', openapi.IN_QUERY, description='Get bookings with a specific status',
                               type=openapi.TYPE_STRING)
         ],
-        responses={200: MyBookingSerializer(many=True)}
     )
     def get(self, request, *args, **kwargs):
         return super().get(request, *args, **kwargs)
 
     def get_queryset(self):
-        queryset = super().get_queryset()
+        user = self.request.user
+        queryset = (
+            Booking.objects
+            .filter(Q(user=user) | Q(service__user=user))
+            .distinct()
+            .select_related('user__address')
+            .prefetch_related(Prefetch('service',
+                                       queryset=Service.objects.select_related('user__address').order_by('id')))
+        )
         date = self.request.query_params.get('date')
         if date:
             queryset = queryset.filter(date=date)
         return queryset
 
-    def list(self, request, *args, **kwargs):
-        queryset = self.filter_queryset(self.get_queryset())
-
-        if request.user.is_master:
-            master_bookings = queryset.filter(service__user=request.user)
-            bookings_data = [{
-                'id': booking.id,
-                'status': booking.status,
-                'date': booking.date,
-                'time': booking.time,
-                'user': UserServiceSerializer(booking.user).data,
-                'service': ServiceSerializer(booking.service.all(), many=True).data
-            } for booking in master_bookings]
-
-            master_made_bookings = queryset.filter(user=request.user)
-            for booking in master_made_bookings:
-                bookings_data.append({
-                    'id': booking.id,
-                    'status': booking.status,
-                    'date': booking.date,
-                    'time': booking.time,
-                    'user': UserServiceSerializer(booking.service.first().user).data,
-                    'service': ServiceSerializer(booking.service.all(), many=True).data
-                })
-        else:
-            user_bookings = queryset.filter(user=request.user)
-            bookings_data = [{
-                'id': booking.id,
-                'status': booking.status,
-                'date': booking.date,
-                'time': booking.time,
-                'service': ServiceSerializer(booking.service.all(), many=True).data,
-                'user': UserServiceSerializer(service.user).data
-            } for booking in user_bookings for service in booking.service.all()]
-
-        return Response(bookings_data)
-
-    # def list(self, request, *args, **kwargs):
-    #     queryset = self.filter_queryset(self.get_queryset())
-    #
-    #     if request.user.is_master:
-    #         master_bookings = queryset.filter(service__user=request.user)
-    #         bookings_data = [{
-    #             'id': booking.id,
-    #             'status': booking.status,
-    #             'date': booking.date,
-    #             'time': booking.time,
-    #             'user': UserServiceSerializer(booking.user).data,
-    #             'service': ServiceSerializer(booking.service.all(), many=True).data
-    #         } for booking in master_bookings]
-    #
-    #         # Fetch the bookings made by the master
-    #         master_made_bookings = queryset.filter(user=request.user)
-    #         for booking in master_made_bookings:
-    #             bookings_data.append({
-    #                 'id': booking.id,
-    #                 'status': booking.status,
-    #                 'date': booking.date,
-    #                 'time': booking.time,
-    #                 'user': UserServiceSerializer(booking.service.first().user).data,
-    #                 'service': ServiceSerializer(booking.service.all(), many=True).data
-    #             })
-    #     else:
-    #         # Fetch the bookings made by the user
-    #         user_bookings = queryset.filter(user=request.user)
-    #         bookings_data = [{
-    #             'id': booking.id,
-    #             'status': booking.status,
-    #             'date': booking.date,
-    #             'time': booking.time,
-    #             'service': ServiceSerializer(service).data,
-    #             'user': UserServiceSerializer(service.user).data
-    #         } for booking in user_bookings for service in booking.service.all()]
-    #
-    #     return Response(bookings_data)
-
-    # def get_queryset(self):
-    #     if self.request.user.is_master:
-    #         # Include bookings where the logged-in user is the master of the service that was booked
-    #         queryset = Booking.objects.filter(Q(service__user=self.request.user) | Q(user=self.request.user))
-    #     else:
-    #         queryset = Booking.objects.filter(user=self.request.user)
-    #     status = self.request.query_params.get('status')
-    #
-    #     if status:
-    #         queryset = queryset.filter(status=status)
-    #
-    #     # Include the newly created booking
-    #     booking_id = self.request.query_params.get('id')
-    #     if booking_id:
-    #         queryset = queryset | Booking.objects.filter(id=booking_id)
-    #
-    #     return queryset
+
+class MasterCalendarLinkAPIView(APIView):
+    """
+    API endpoint that gives a master the private URL of their bookings calendar (.ics).
+
+    The URL can be added to any calendar application as a subscription. POST
+    replaces it with a new URL and revokes every URL handed out before.
+    """
+    permission_classes = (IsAuthenticated,)
+
+    def get(self, request, *args, **kwargs):
+        if not request.user.is_master:
+            raise PermissionDenied("Only masters have a bookings calendar")
+        url = request.build_absolute_uri(reverse('booking-calendar', args=[calendar_token(request.user)]))
+        return Response({'url': url})
+
+    def post(self, request, *args, **kwargs):
+        if not request.user.is_master:
+            raise PermissionDenied("Only masters have a bookings calendar")
+        rotate_calendar_key(request.user)
+        return self.get(request, *args, **kwargs)
+
+
+class MasterCalendarFeedAPIView(APIView):
+    """
+    iCalendar feed of a master's bookings, authorised by the signed token in the URL.
+
+    Supports If-None-Match and If-Modified-Since; an unchanged calendar costs one query.
+    """
+    authentication_classes = ()
+    permission_classes = (AllowAny,)
+
+    @swagger_auto_schema(auto_schema=None)
+    def get(self, request, token, *args, **kwargs):
+        payload = read_calendar_token(token)
+        state = calendar_state(*payload) if payload else None
+        if state is None:
+            raise NotFound()
+
+        master_id = payload[0]
+        etag, last_modified = state
+        last_modified = int(last_modified.timestamp()) if last_modified else None
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified) if etag else None
+        if response is None:
+            response = StreamingHttpResponse(iter_calendar(master_id, request.get_host()),
+                                             content_type=ICS_CONTENT_TYPE)
+            response['Content-Disposition'] = 'inline; filename="bookings.ics"'
+        if etag is not None:
+            response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        response['Cache-Control'] = 'private, no-cache'
+        return response
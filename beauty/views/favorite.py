@@ -5,6 +5,7 @@ from rest_framework.response import Response
 
 from beauty.models.favorite import Favorite, Saved, ShopFavorite, ShopSaved
 from beauty.models.service import Shop
+from beauty.pagination import CatalogCursorPagination
 from beauty.serializers.favorite import FavoriteSerializer, SavedSerializer, ShopFavoriteSerializer, ShopSavedSerializer
 
 
@@ -17,6 +18,7 @@ class FavoriteListCreateAPIView(ListCreateAPIView):
     queryset = Favorite.objects.all()
     serializer_class = FavoriteSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = CatalogCursorPagination
 
     def get_queryset(self):
         user = self.request.user
@@ -30,8 +32,8 @@ class FavoriteListCreateAPIView(ListCreateAPIView):
         user = request.user
         like_value = request.data.get('like', True)
 
-        if like_value is False:
-            Favorite.objects.filter(service_id=service_id, user=user).delete()
+        favorite_instance = Favorite.set_like(service_id, user, like_value)
+        if favorite_instance is None:
             return Response({
                 'id': user.id,
                 'service': service_id,
@@ -39,16 +41,6 @@ class FavoriteListCreateAPIView(ListCreateAPIView):
                 'message': 'Favorite  deleted successfully'
             })
 
-        favorite_instance, created = Favorite.objects.get_or_create(
-            service_id=service_id,
-            user=user,
-            defaults={'like': like_value}
-        )
-
-        if not created and favorite_instance.like != like_value:
-            favorite_instance.like = like_value
-            favorite_instance.save()
-
         likes_count = self.get_likes_count(service_id)
         serializer = self.get_serializer(favorite_instance)
         response_data = serializer.data
@@ -66,6 +58,7 @@ class SavedListCreateAPIView(ListCreateAPIView):
     queryset = Saved.objects.all()
     serializer_class = SavedSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = CatalogCursorPagination
 
     def get_queryset(self):
         user = self.request.user
@@ -101,6 +94,7 @@ class ShopFavoriteListCreateAPIView(ListCreateAPIView):
     queryset = ShopFavorite.objects.all()
     serializer_class = ShopFavoriteSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = CatalogCursorPagination
 
     def get_queryset(self):
         user = self.request.user
@@ -119,8 +113,8 @@ class ShopFavoriteListCreateAPIView(ListCreateAPIView):
         except Shop.DoesNotExist:
             return Response({'error': 'Shop not found'}, status=404)
 
-        if like_value is False:
-            ShopFavorite.objects.filter(product=shop, user=user).delete()
+        favorite_instance = ShopFavorite.set_like(shop.id, user, like_value)
+        if favorite_instance is None:
             return Response({
                 'id': user.id,
                 'product': product_id,
@@ -128,16 +122,6 @@ class ShopFavoriteListCreateAPIView(ListCreateAPIView):
                 'message': 'Favorite deleted successfully'
             })
 
-        favorite_instance, created = ShopFavorite.objects.get_or_create(
-            product=shop,
-            user=user,
-            defaults={'like': like_value}
-        )
-
-        if not created and favorite_instance.like != like_value:
-            favorite_instance.like = like_value
-            favorite_instance.save()
-
         likes_count = self.get_likes_count(shop)
         serializer = self.get_serializer(favorite_instance)
         response_data = serializer.data
@@ -153,6 +137,7 @@ class ShopSavedListCreateAPIView(ListCreateAPIView):
     queryset = ShopSaved.objects.all()
     serializer_class = ShopSavedSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = CatalogCursorPagination
 
     def get_queryset(self):
         user = self.request.user
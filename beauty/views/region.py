@@ -1,14 +1,22 @@
+import re
+
+from django.http import HttpResponse, HttpResponseNotModified, HttpResponseRedirect
+from django.urls import reverse
+from django.utils.cache import parse_etags, patch_cache_control, patch_vary_headers, quote_etag
 from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
 from rest_framework.generics import ListAPIView
 from rest_framework.permissions import AllowAny
+from rest_framework.views import APIView
 
+from beauty.geography import get_bundle
 from beauty.models.region import Region, District, Mahalla, Address
+from beauty.response_cache import CachedResponseMixin
 from beauty.serializers.region import RegionModelSerializer, DistrictModelSerializer, MahallaModelSerializer, \
     AddressSerializer
 
 
-class RegionListAPIView(ListAPIView):
+class RegionListAPIView(CachedResponseMixin, ListAPIView):
     """
     API view for get a regions
 
@@ -17,9 +25,11 @@ class RegionListAPIView(ListAPIView):
     queryset = Region.objects.all()
     serializer_class = RegionModelSerializer
     permission_classes = (AllowAny,)
+    cache_models = (Region,)
+    query_budget = 1
 
 
-class DistrictListAPIView(ListAPIView):
+class DistrictListAPIView(CachedResponseMixin, ListAPIView):
     """
     API view for get a districts
 
@@ -28,6 +38,8 @@ class DistrictListAPIView(ListAPIView):
     queryset = District.objects.all()
     serializer_class = DistrictModelSerializer
     permission_classes = (AllowAny,)
+    cache_models = (District,)
+    query_budget = 1
 
     @swagger_auto_schema(
         manual_parameters=[openapi.Parameter('region_id', openapi.IN_QUERY, type=openapi.TYPE_INTEGER)])
@@ -38,7 +50,7 @@ class DistrictListAPIView(ListAPIView):
         return super().get(request, *args, **kwargs)
 
 
-class MahallaListAPIView(ListAPIView):
+class MahallaListAPIView(CachedResponseMixin, ListAPIView):
     """
     API view for get a mahallas
 
@@ -47,6 +59,8 @@ class MahallaListAPIView(ListAPIView):
     queryset = Mahalla.objects.all()
     serializer_class = MahallaModelSerializer
     permission_classes = (AllowAny,)
+    cache_models = (Mahalla,)
+    query_budget = 1
 
     @swagger_auto_schema(
         manual_parameters=[openapi.Parameter('district_id', openapi.IN_QUERY, type=openapi.TYPE_INTEGER)])
@@ -57,3 +71,36 @@ class MahallaListAPIView(ListAPIView):
         return super().get(request, *args, **kwargs)
 
 
+class GeographyBundleAPIView(APIView):
+    """
+    API view for get the whole Region -> District -> Mahalla tree in one gzipped JSON document
+
+    ## geography: the current tree; its hash is the ETag and Content-Location points at the versioned copy
+    ## geography/<hash>: never changes, so it may be cached forever; an outdated hash redirects to the current one
+    """
+    permission_classes = (AllowAny,)
+    authentication_classes = ()
+    query_budget = 3  # bundle build
+    accepts_gzip = re.compile(r'\bgzip\b')
+
+    def get(self, request, content_hash=None):
+        bundle = get_bundle()
+        if content_hash is not None and content_hash != bundle.content_hash:
+            return HttpResponseRedirect(reverse('geography-bundle', args=[bundle.content_hash]))
+
+        etag = quote_etag(bundle.content_hash)
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            response = HttpResponseNotModified()
+        elif self.accepts_gzip.search(request.headers.get('Accept-Encoding', '')):
+            response = HttpResponse(bundle.compressed, content_type='application/json')
+            response['Content-Encoding'] = 'gzip'
+        else:
+            response = HttpResponse(bundle.content(), content_type='application/json')
+        response['ETag'] = etag
+        response['Content-Location'] = reverse('geography-bundle', args=[bundle.content_hash])
+        patch_vary_headers(response, ['Accept-Encoding'])
+        if content_hash is None:
+            patch_cache_control(response, no_cache=True)
+        else:
+            patch_cache_control(response, public=True, max_age=60 * 60 * 24 * 365, immutable=True)
+        return response
@@ -1,18 +1,21 @@
 from django_filters.rest_framework import DjangoFilterBackend
 from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
-from rest_framework.filters import SearchFilter
 from rest_framework.generics import RetrieveUpdateDestroyAPIView, ListAPIView, CreateAPIView, RetrieveAPIView
 from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework.permissions import AllowAny
 
+from beauty.filters import CatalogOrderingFilter, ServiceFilter
 from beauty.models.service import Category, Service, Shop, Blog
+from beauty.pagination import CatalogCursorPagination
+from beauty.response_cache import CachedResponseMixin
+from beauty.search import RankedSearchFilter
 from beauty.serializers.service import (CategoryModelSerializer, ServiceModelSerializer, ServiceListSerializer,
                                         ShopModelSerializer, BlogModelSerializer, BlogDetailModelSerializer,
                                         ShopDetailModelSerializer)
 
 
-class CategoryListCreateAPIView(ListAPIView):
+class CategoryListCreateAPIView(CachedResponseMixin, ListAPIView):
     """
     API for listing and creating a new category
 
@@ -21,6 +24,8 @@ class CategoryListCreateAPIView(ListAPIView):
     queryset = Category.objects.all()
     serializer_class = CategoryModelSerializer
     permission_classes = (AllowAny,)
+    cache_models = (Category,)
+    query_budget = 1
 
 
 class ServiceByCategoryAPIView(ListAPIView):
@@ -28,6 +33,8 @@ class ServiceByCategoryAPIView(ListAPIView):
     API for listing services by category
     """
     serializer_class = ServiceListSerializer
+    pagination_class = CatalogCursorPagination
+    query_budget = 2  # page, authentication
 
     @swagger_auto_schema(
         manual_parameters=[
@@ -46,10 +53,11 @@ class ServiceByCategoryAPIView(ListAPIView):
         """
         Filters the queryset based on category_id
         """
+        queryset = Service.objects.for_listing(self.request.user)
         category_id = self.request.query_params.get('category_id')
         if category_id:
-            return Service.objects.filter(category_id=category_id)
-        return Service.objects.all()
+            return queryset.filter(category_id=category_id)
+        return queryset
 
 
 class ServiceCreateAPIView(CreateAPIView):
@@ -70,36 +78,22 @@ class ServiceListAPIView(ListAPIView):
 
     Example Request Body:
 
-    ## search: service_name, master_full_name, category_name
+    ## search: service_name, master_full_name, category_name (results are ordered by relevance)
+    ## filters: id, user_id, category_id, price_min, price_max, duration_min, duration_max ("HH:MM")
+    ## ordering: price, -price, newest, popularity
 
     """
     queryset = Service.objects.all()
     serializer_class = ServiceListSerializer
-    filter_backends = [SearchFilter, DjangoFilterBackend]
-    search_fields = ['name', 'user__username', 'category__name']
+    pagination_class = CatalogCursorPagination
+    filter_backends = [DjangoFilterBackend, RankedSearchFilter, CatalogOrderingFilter]
+    query_budget = 3  # page, search ranking, authentication
+    filterset_class = ServiceFilter
+    ordering_fields = ['price', 'id', 'favorites_count']
+    ordering = ['id']
 
-    @swagger_auto_schema(
-        manual_parameters=[
-            openapi.Parameter('user_id', openapi.IN_QUERY, type=openapi.TYPE_INTEGER),
-            openapi.Parameter('category_id', openapi.IN_QUERY, type=openapi.TYPE_INTEGER),
-            openapi.Parameter('id', openapi.IN_QUERY, type=openapi.TYPE_INTEGER)
-        ]
-    )
-    def get(self, request, *args, **kwargs):
-        user_id = self.request.query_params.get('user_id')
-        category_id = self.request.query_params.get('category_id')
-        id = self.request.query_params.get('id')
-        if user_id and category_id:
-            self.queryset = Service.objects.filter(user_id=user_id, category_id=category_id)
-        elif user_id:
-            self.queryset = Service.objects.filter(user_id=user_id)
-        elif category_id:
-            self.queryset = Service.objects.filter(category_id=category_id)
-        elif id:
-            self.queryset = Service.objects.filter(id=id)
-        else:
-            self.queryset = Service.objects.all()
-        return super().get(request, *args, **kwargs)
+    def get_queryset(self):
+        return Service.objects.for_listing(self.request.user)
 
 
 class ServiceRetrieveUpdateDestroyAPIView(RetrieveUpdateDestroyAPIView):
@@ -146,8 +140,9 @@ class ShopListAPIView(ListAPIView):
     """
     queryset = Shop.objects.all()
     serializer_class = ShopModelSerializer
-    # filter_backends = [SearchFilter, DjangoFilterBackend]
-    # search_fields = ['name', 'user__username', 'category__name']
+    pagination_class = CatalogCursorPagination
+    filter_backends = [RankedSearchFilter]
+    query_budget = 3  # page, search ranking, authentication
 
 
 class ShopRetrieveAPIView(RetrieveAPIView):
@@ -160,7 +155,7 @@ class ShopRetrieveAPIView(RetrieveAPIView):
     def retrieve(self, request, *args, **kwargs):
         instance = self.get_object()
         instance.view += 1
-        instance.save()
+        instance.save(update_fields=['view'])
         return super().retrieve(request, *args, **kwargs)
 
 
@@ -172,6 +167,9 @@ class BlogListAPIView(ListAPIView):
     """
     queryset = Blog.objects.all()
     serializer_class = BlogModelSerializer
+    pagination_class = CatalogCursorPagination
+    filter_backends = [RankedSearchFilter]
+    query_budget = 3  # page, search ranking, authentication
 
 
 class BlogRetrieveApiView(RetrieveAPIView):
@@ -186,5 +184,5 @@ class BlogRetrieveApiView(RetrieveAPIView):
     def retrieve(self, request, *args, **kwargs):
         instance = self.get_object()
         instance.view += 1
-        instance.save()
+        instance.save(update_fields=['view'])
         return super().retrieve(request, *args, **kwargs)
@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'root.settings')
 
 application = get_asgi_application()
+
+# Workers answer their first typeahead request from a ready index.
+from beauty.suggest import suggester  # noqa: E402
+
+suggester.warm()
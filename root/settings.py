@@ -36,9 +36,11 @@ INSTALLED_APPS = [
      'django.contrib.sessions',
      'django.contrib.messages',
      'django.contrib.staticfiles',
+     'django.contrib.postgres',
  ] + MY_APPS + THIRD_PARTY_APPS
 
 MIDDLEWARE = [
+    'beauty.query_budget.QueryBudgetMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -49,6 +51,9 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Log per-view query counts and warn about views over their query_budget (beauty.query_budget).
+QUERY_BUDGET_LOG = os.getenv('QUERY_BUDGET_LOG') == 'True'
+
 ROOT_URLCONF = 'root.urls'
 
 TEMPLATES = [
@@ -161,6 +166,8 @@ REST_FRAMEWORK = {
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend'
     ],
+    'TIME_FORMAT': '%H:%M',
+    'TIME_INPUT_FORMATS': ['%H:%M', 'iso-8601'],
 }
 
 AUTH_USER_MODEL = 'users.User'
@@ -0,0 +1,8 @@
+from root.settings import *  # noqa: F401,F403
+
+# Tests run without Redis; every test process gets its own in-memory cache.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
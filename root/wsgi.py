@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'root.settings')
 
 application = get_wsgi_application()
+
+# Workers answer their first typeahead request from a ready index.
+from beauty.suggest import suggester  # noqa: E402
+
+suggester.warm()
@@ -50,6 +50,7 @@ class User(AbstractBaseUser, PermissionsMixin):
     card_cvv = models.BigIntegerField( max_length=3,blank=True, null=True, unique=True)
 
     is_master = models.BooleanField(default=False)
+    calendar_key = models.CharField(max_length=32, blank=True, default='')
     is_active = models.BooleanField(default=True)
     is_staff = models.BooleanField(default=False)
 
@@ -2,11 +2,9 @@ import random
 
 from django.conf import settings
 from django.contrib.auth.hashers import make_password
-from django.core.mail import EmailMultiAlternatives
-from django.template.loader import render_to_string
-from django.utils.html import strip_tags
 from rest_framework import serializers
 
+from beauty.models.outbox import EmailOutbox
 from beauty.models.region import Address
 from beauty.serializers.region import AddressSerializer
 from users.models import User, getKey, setKey
@@ -37,20 +35,15 @@ class UserRegisterSerializer(serializers.ModelSerializer):
             },
             timeout=1000
         )
-        subject = "Activate Your Account"
-        html_content = render_to_string('activation.html', {'user': user, 'activate_code': activate_code})
-        text_content = strip_tags(html_content)
         print(getKey(key=attrs['email']))
 
-        from_email = f"Aura Team <{settings.EMAIL_HOST_USER}>"
-        email = EmailMultiAlternatives(
-            subject=subject,
-            body=text_content,
-            from_email=from_email,
-            to=[attrs['email']]
+        EmailOutbox.enqueue(
+            subject="Activate Your Account",
+            template_name='activation.html',
+            context={'user': user, 'activate_code': activate_code},
+            to=[attrs['email']],
+            from_email=f"Aura Team <{settings.EMAIL_HOST_USER}>",
         )
-        email.attach_alternative(html_content, "text/html")
-        email.send()
 
         return super().validate(attrs)
 
@@ -165,15 +158,13 @@ class SendVerificationCodeSerializer(serializers.Serializer):
             timeout=600  # Cache for 10 minutes
         )
 
-        html_content = render_to_string('activation_payment.html',
-                                        {'activate_code': verification_code, 'user': {'full_name': 'User'}})
-        text_content = strip_tags(html_content)
-
-        subject = 'Your Verification Code'
-        from_email = 'from@example.com'
-        msg = EmailMultiAlternatives(subject, text_content, from_email, [email])
-        msg.attach_alternative(html_content, "text/html")
-        msg.send()
+        EmailOutbox.enqueue(
+            subject='Your Verification Code',
+            template_name='activation_payment.html',
+            context={'activate_code': verification_code, 'user': {'full_name': 'User'}},
+            to=[email],
+            from_email='from@example.com',
+        )
 
         return validated_data
 
@@ -1,14 +1,12 @@
 import random
 
-from django.core.mail import EmailMultiAlternatives
-from django.template.loader import render_to_string
-from django.utils.html import strip_tags
 from rest_framework import status
 from rest_framework.generics import GenericAPIView, CreateAPIView, RetrieveUpdateDestroyAPIView, RetrieveUpdateAPIView
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework_simplejwt.tokens import RefreshToken
 
+from beauty.models.outbox import EmailOutbox
 from root import settings
 from users.models import User, getKey
 from users.serializers import (UserRegisterSerializer, CheckActivationCodeSerializer, ResetPasswordSerializer,
@@ -79,19 +77,13 @@ class ResetPasswordView(CreateAPIView):
             user.save()
 
             # Send email with activation code
-            subject = "Password Reset Confirmation"
-            html_content = render_to_string('forget_password.html', {'activation_code': activation_code})
-            text_content = strip_tags(html_content)
-
-            from_email = f"Aura Team <{settings.EMAIL_HOST_USER}>"
-            email = EmailMultiAlternatives(
-                subject=subject,
-                body=text_content,
-                from_email=from_email,
-                to=[email]
+            EmailOutbox.enqueue(
+                subject="Password Reset Confirmation",
+                template_name='forget_password.html',
+                context={'activation_code': activation_code},
+                to=[email],
+                from_email=f"Aura Team <{settings.EMAIL_HOST_USER}>",
             )
-            email.attach_alternative(html_content, "text/html")
-            email.send()
 
             return Response({"detail": "Password reset code sent to your email."}, status=status.HTTP_200_OK)
         else:
@@ -188,19 +180,13 @@ class SendVerificationCodeAPIView(CreateAPIView):
             activation_code = str(random.randint(100000, 999999))
 
             # Send email with activation code
-            subject = "Activation Code"
-            html_content = render_to_string('activation_payment.html', {'activation_code': activation_code})
-            text_content = strip_tags(html_content)
-
-            from_email = f"Aura Team <{settings.EMAIL_HOST_USER}>"
-            email = EmailMultiAlternatives(
-                subject=subject,
-                body=text_content,
-                from_email=from_email,
-                to=[email]
+            EmailOutbox.enqueue(
+                subject="Activation Code",
+                template_name='activation_payment.html',
+                context={'activation_code': activation_code},
+                to=[email],
+                from_email=f"Aura Team <{settings.EMAIL_HOST_USER}>",
             )
-            email.attach_alternative(html_content, "text/html")
-            email.send()
 
             return Response({"detail": "Activation code sent to your email."}, status=status.HTTP_200_OK)
         else: